@@ -18,6 +18,14 @@ import logging.config
 
 # Import study bot specific modules
 from database.study_db import init_db, client
+from database.users_chats_db import db as users_db
+from database.topdb import topdb
+from database.user_registry import user_registry
+from database.counters import counters
+from database.sessions import session_tracker
+from database.segments import audience_segments
+from database.broadcast_jobs import broadcast_jobs
+from studybot.util.delivery import content_delivery
 from config import *
 from utils import temp
 from Script import script
@@ -65,6 +73,19 @@ async def studybot_start():
     # Initialize database
     await init_db()
     
+    # Ensure lookup and TTL indexes for expiring data
+    if users_db:
+        await users_db.ensure_indexes()
+    if topdb:
+        await topdb.ensure_indexes()
+        await topdb.load_leaderboard()
+        await topdb.load_distinct_users()
+        await topdb.load_top_messages()
+    
+    # Share the ban registry with temp so per-update checks never hit the database
+    if users_db:
+        temp.BANNED_USERS, temp.BANNED_CHATS = await users_db.load_ban_cache()
+    
     # Start study bot
     await studybot.start()
     bot_info = await studybot.get_me()
@@ -99,7 +120,11 @@ async def studybot_start():
     studybot.username = '@' + me.username
     
     # Start premium check task
-    studybot.loop.create_task(check_expired_premium(studybot))
+    studybot.loop.create_task(check_expired_premium.check_expired_premium(studybot))
+    
+    # Start analytics rollups
+    if topdb:
+        studybot.loop.create_task(topdb.rollup_loop())
     
     # Log startup
     logging.info(f"{me.first_name} with Pyrogram v{__version__} (Layer {layer}) started on {me.username}.")
@@ -125,8 +150,30 @@ async def studybot_start():
     # Start keep alive
     studybot.loop.create_task(keep_alive())
     
+    # Start batched last_active and analytics counter writes
+    if user_registry:
+        user_registry.start()
+    counters.start()
+    session_tracker.start()
+    if audience_segments:
+        audience_segments.start()
+    if broadcast_jobs:
+        broadcast_jobs.start(studybot)
+    content_delivery.start()
+    
     # Start idle
     await idle()
+    
+    # Close open study sessions and flush pending writes before exit
+    await session_tracker.stop()
+    if broadcast_jobs:
+        await broadcast_jobs.stop()
+    if audience_segments:
+        await audience_segments.stop()
+    await content_delivery.stop()
+    if user_registry:
+        await user_registry.stop()
+    await counters.stop()
 
 if __name__ == '__main__':
     loop = asyncio.get_event_loop()
@@ -246,6 +246,12 @@ STAR_PREMIUM_PLANS = {
     75: "60day",
 }
 
+# PREMIUM_EXPIRY_PRELOAD: Upcoming premium expiries kept in memory by the expiry scheduler
+PREMIUM_EXPIRY_PRELOAD = int(environ.get('PREMIUM_EXPIRY_PRELOAD', 1000))
+
+# PREMIUM_EXPIRY_BATCH: Users expired per update_many by the expiry scheduler
+PREMIUM_EXPIRY_BATCH = int(environ.get('PREMIUM_EXPIRY_BATCH', 500))
+
 # ============================
 # Study Bot Features
 # ============================
@@ -384,6 +390,123 @@ REDIS_URL = environ.get('REDIS_URL', "")
 # CACHE_EXPIRY: Cache expiry time in seconds
 CACHE_EXPIRY = int(environ.get('CACHE_EXPIRY', 3600))
 
+# USER_CACHE_SIZE: Number of known user ids kept in memory to skip registration lookups
+USER_CACHE_SIZE = int(environ.get('USER_CACHE_SIZE', 50000))
+
+# LAST_ACTIVE_FLUSH_INTERVAL: Seconds between batched last_active writes
+LAST_ACTIVE_FLUSH_INTERVAL = int(environ.get('LAST_ACTIVE_FLUSH_INTERVAL', 60))
+
+# COUNTER_FLUSH_INTERVAL: Seconds between bulk writes of buffered analytics counters
+COUNTER_FLUSH_INTERVAL = int(environ.get('COUNTER_FLUSH_INTERVAL', 30))
+
+# COUNTER_FLUSH_EVENTS: Buffered analytics events that trigger an early flush
+COUNTER_FLUSH_EVENTS = int(environ.get('COUNTER_FLUSH_EVENTS', 1000))
+
+# EXPORT_BATCH_SIZE: Rows loaded per DataFrame batch by the analytics export
+EXPORT_BATCH_SIZE = int(environ.get('EXPORT_BATCH_SIZE', 50000))
+
+# EXPORT_TOKEN: Secret required by the /export HTTP endpoint in the X-Export-Token header (disabled when empty)
+EXPORT_TOKEN = environ.get('EXPORT_TOKEN', "")
+
+# SCORING_BATCH_SIZE: Users loaded per batch when recomputing scores and achievements
+SCORING_BATCH_SIZE = int(environ.get('SCORING_BATCH_SIZE', 5000))
+
+# PROGRESS_CACHE_SIZE: Number of per-user progress documents kept in memory
+PROGRESS_CACHE_SIZE = int(environ.get('PROGRESS_CACHE_SIZE', 10000))
+
+# BROADCAST_RATE: Messages per second across all broadcasts and notices (Telegram allows about 30)
+BROADCAST_RATE = int(environ.get('BROADCAST_RATE', 25))
+
+# BROADCAST_WORKERS: Concurrent sender tasks per broadcast
+BROADCAST_WORKERS = int(environ.get('BROADCAST_WORKERS', 20))
+
+# BROADCAST_MAX_RETRIES: FloodWait retries per recipient before giving up
+BROADCAST_MAX_RETRIES = int(environ.get('BROADCAST_MAX_RETRIES', 3))
+
+# BROADCAST_CURSOR_BATCH: Recipient ids fetched per cursor batch by the broadcast job worker
+BROADCAST_CURSOR_BATCH = int(environ.get('BROADCAST_CURSOR_BATCH', 1000))
+
+# BROADCAST_CHECKPOINT_INTERVAL: Seconds between saved positions of a running broadcast job
+BROADCAST_CHECKPOINT_INTERVAL = int(environ.get('BROADCAST_CHECKPOINT_INTERVAL', 5))
+
+# BROADCAST_JOB_MAX_ERRORS: Failed runs after which a broadcast job is marked failed instead of resumed
+BROADCAST_JOB_MAX_ERRORS = int(environ.get('BROADCAST_JOB_MAX_ERRORS', 3))
+
+# NOTICE_CONCURRENCY: Concurrent sends used by the notification sender
+NOTICE_CONCURRENCY = int(environ.get('NOTICE_CONCURRENCY', 10))
+
+# SESSION_IDLE_TIMEOUT: Seconds without activity after which a study session is closed
+SESSION_IDLE_TIMEOUT = int(environ.get('SESSION_IDLE_TIMEOUT', 900))
+
+# SESSION_WHEEL_TICK: Resolution in seconds of the idle session timer wheel
+SESSION_WHEEL_TICK = int(environ.get('SESSION_WHEEL_TICK', 5))
+
+# SESSION_WHEEL_SLOTS: Number of slots in the idle session timer wheel
+SESSION_WHEEL_SLOTS = int(environ.get('SESSION_WHEEL_SLOTS', 512))
+
+# SEGMENT_REFRESH_INTERVAL: Seconds between incremental refreshes of broadcast audience segments
+SEGMENT_REFRESH_INTERVAL = int(environ.get('SEGMENT_REFRESH_INTERVAL', 600))
+
+# SEGMENT_REBUILD_INTERVAL: Seconds after which a segment is rebuilt from scratch instead of patched
+SEGMENT_REBUILD_INTERVAL = int(environ.get('SEGMENT_REBUILD_INTERVAL', 86400))
+
+# OUTBOUND_GLOBAL_RATE: Telegram API sends per second allowed per bot across every feature
+OUTBOUND_GLOBAL_RATE = int(environ.get('OUTBOUND_GLOBAL_RATE', 30))
+
+# OUTBOUND_CHAT_INTERVAL: Minimum seconds between messages to the same private chat
+OUTBOUND_CHAT_INTERVAL = int(environ.get('OUTBOUND_CHAT_INTERVAL', 1))
+
+# OUTBOUND_GROUP_PER_MINUTE: Messages per minute allowed into the same group
+OUTBOUND_GROUP_PER_MINUTE = int(environ.get('OUTBOUND_GROUP_PER_MINUTE', 20))
+
+# DELIVERY_WORKERS: Users served in parallel by the study content delivery queue
+DELIVERY_WORKERS = int(environ.get('DELIVERY_WORKERS', 8))
+
+# FILE_REF_CACHE_SIZE: File references refreshed from source messages kept in memory
+FILE_REF_CACHE_SIZE = int(environ.get('FILE_REF_CACHE_SIZE', 2000))
+
+# PREFETCH_AHEAD: Lectures after the one being delivered that are loaded ahead of the next tap
+PREFETCH_AHEAD = int(environ.get('PREFETCH_AHEAD', 3))
+
+# PREFETCH_CACHE_SIZE: Lecture lookups kept in memory by the prefetcher
+PREFETCH_CACHE_SIZE = int(environ.get('PREFETCH_CACHE_SIZE', 1000))
+
+# PREFETCH_TTL: Seconds a cached lecture lookup stays valid, so re-uploads are picked up
+PREFETCH_TTL = int(environ.get('PREFETCH_TTL', 600))
+
+# ============================
+# Data Retention
+# ============================
+# JOIN_REQUEST_TTL_DAYS: Join requests are expired by MongoDB this many days after they were approved or declined
+JOIN_REQUEST_TTL_DAYS = int(environ.get('JOIN_REQUEST_TTL_DAYS', 30))
+
+# VERIFY_ID_TTL_HOURS: Verification IDs are expired by MongoDB after this many hours
+VERIFY_ID_TTL_HOURS = int(environ.get('VERIFY_ID_TTL_HOURS', 24))
+
+# ACTIVITY_TTL_DAYS: User/chat activity events are expired after this many days
+ACTIVITY_TTL_DAYS = int(environ.get('ACTIVITY_TTL_DAYS', 30))
+
+# ACTIVITY_BUCKET_SIZE: Maximum events stored in one daily activity bucket document
+ACTIVITY_BUCKET_SIZE = int(environ.get('ACTIVITY_BUCKET_SIZE', 200))
+
+# ANALYTICS_TTL_DAYS: Raw analytics events are expired after this many days
+ANALYTICS_TTL_DAYS = int(environ.get('ANALYTICS_TTL_DAYS', 90))
+
+# NOTICE_LEDGER_TTL_DAYS: Sent notification records are expired after this many days
+NOTICE_LEDGER_TTL_DAYS = int(environ.get('NOTICE_LEDGER_TTL_DAYS', 90))
+
+# ROLLUP_INTERVAL: Seconds between hourly/daily analytics rollup runs
+ROLLUP_INTERVAL = int(environ.get('ROLLUP_INTERVAL', 900))
+
+# RAW_STATS_RETENTION_DAYS: Raw study events older than this are deleted after rollup (0 keeps them)
+RAW_STATS_RETENTION_DAYS = int(environ.get('RAW_STATS_RETENTION_DAYS', 0))
+
+# CLEANUP_BATCH_SIZE: Documents removed per batch by manual cleanup jobs
+CLEANUP_BATCH_SIZE = int(environ.get('CLEANUP_BATCH_SIZE', 500))
+
+# CLEANUP_BATCH_PAUSE: Seconds to pause between cleanup batches
+CLEANUP_BATCH_PAUSE = float(environ.get('CLEANUP_BATCH_PAUSE', 0.5))
+
 # ============================
 # Security Settings
 # ============================
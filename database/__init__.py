@@ -29,6 +29,56 @@ try:
 except Exception as e:
     print(f"Warning: Could not import ia_filterdb: {e}")
 
+try:
+    from .sketches import *
+except Exception as e:
+    print(f"Warning: Could not import sketches: {e}")
+
+try:
+    from .leaderboard import *
+except Exception as e:
+    print(f"Warning: Could not import leaderboard: {e}")
+
+try:
+    from .counters import *
+except Exception as e:
+    print(f"Warning: Could not import counters: {e}")
+
+try:
+    from .user_registry import *
+except Exception as e:
+    print(f"Warning: Could not import user_registry: {e}")
+
+try:
+    from .progress import *
+except Exception as e:
+    print(f"Warning: Could not import progress: {e}")
+
+try:
+    from .sessions import *
+except Exception as e:
+    print(f"Warning: Could not import sessions: {e}")
+
+try:
+    from .notifications import *
+except Exception as e:
+    print(f"Warning: Could not import notifications: {e}")
+
+try:
+    from .segments import *
+except Exception as e:
+    print(f"Warning: Could not import segments: {e}")
+
+try:
+    from .broadcast_jobs import *
+except Exception as e:
+    print(f"Warning: Could not import broadcast_jobs: {e}")
+
+try:
+    from .prefetch import *
+except Exception as e:
+    print(f"Warning: Could not import prefetch: {e}")
+
 try:
     from .refer import *
 except Exception as e:
@@ -40,5 +90,15 @@ __all__ = [
     'topdb',
     'users_chats_db',
     'ia_filterdb',
+    'sketches',
+    'leaderboard',
+    'counters',
+    'user_registry',
+    'progress',
+    'sessions',
+    'notifications',
+    'segments',
+    'broadcast_jobs',
+    'prefetch',
     'refer'
 ]
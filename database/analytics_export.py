@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Try to import pandas/numpy with error handling
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError as e:
+    print(f"Warning: Could not import pandas/numpy in analytics_export.py: {e}")
+    np = None
+    pd = None
+
+try:
+    from config import EXPORT_BATCH_SIZE
+except ImportError:
+    # Fallback configuration values
+    EXPORT_BATCH_SIZE = 50000
+
+from database.study_db import StudySessions, ContentAnalytics
+from database.topdb import topdb
+
+logger = logging.getLogger(__name__)
+
+SESSION_FIELDS = ["user_id", "batch_name", "subject", "chapter_no", "start_time", "end_time", "duration_minutes"]
+ANALYTICS_FIELDS = ["file_id", "batch_name", "subject", "chapter_no", "content_type", "views", "downloads"]
+STATS_FIELDS = ["user_id", "subject", "chapter", "content_type", "duration", "timestamp"]
+
+
+async def iter_frames(collection, fields: List[str], query: Dict = None, batch_size: int = None):
+    """Stream a collection as DataFrames of at most batch_size rows"""
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    projection = {field: 1 for field in fields}
+    projection["_id"] = 0
+    cursor = collection.find(query or {}, projection).batch_size(min(batch_size, 10000))
+
+    rows = []
+    async for doc in cursor:
+        rows.append(doc)
+        if len(rows) >= batch_size:
+            yield pd.DataFrame.from_records(rows, columns=fields)
+            rows = []
+    if rows:
+        yield pd.DataFrame.from_records(rows, columns=fields)
+
+
+def _dedup(frames: List["pd.DataFrame"]) -> "pd.DataFrame":
+    """Concatenate partial frames and drop duplicate rows"""
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True).drop_duplicates()
+
+
+def _add(total: Optional["pd.DataFrame"], part: "pd.DataFrame") -> "pd.DataFrame":
+    """Add grouped partial sums into a running total"""
+    return part if total is None else total.add(part, fill_value=0)
+
+
+class AnalyticsExport:
+    """Builds engagement metrics and compressed exports in bounded memory"""
+
+    def __init__(self, fmt: str = "csv", batch_size: int = None):
+        if pd is None:
+            raise ImportError("pandas and numpy are required for analytics export")
+        self.fmt = fmt if fmt in ("csv", "feather") else "csv"
+        self.batch_size = batch_size or EXPORT_BATCH_SIZE
+        self.workdir = tempfile.mkdtemp(prefix="studybot_export_")
+        # Distinct (day, user_id) and (chapter, user_id) pairs, compacted as they grow
+        self._active_pairs: List["pd.DataFrame"] = []
+        self._chapter_users: List["pd.DataFrame"] = []
+        self._chapter_totals: Optional["pd.DataFrame"] = None
+        self._content_totals: Optional["pd.DataFrame"] = None
+        self._study_totals: Optional["pd.DataFrame"] = None
+        self.rows = {"sessions": 0, "content": 0, "stats": 0}
+
+    def _path(self, name: str, fmt: str = None) -> str:
+        """Output path for a named table"""
+        ext = "feather" if (fmt or self.fmt) == "feather" else "csv.gz"
+        return os.path.join(self.workdir, f"{name}.{ext}")
+
+    def _append_raw(self, name: str, frame: "pd.DataFrame", first: bool):
+        """Append a batch to a gzip CSV; gzip members concatenate into one valid file"""
+        frame.to_csv(self._path(name, "csv"), mode="w" if first else "a", header=first, index=False, compression="gzip")
+
+    def _compact(self, frames: List["pd.DataFrame"]) -> List["pd.DataFrame"]:
+        """Collapse accumulated pair frames once a batch worth of new rows has piled up"""
+        if sum(len(f) for f in frames[1:]) > self.batch_size:
+            return [_dedup(frames)]
+        return frames
+
+    def _consume_sessions(self, frame: "pd.DataFrame"):
+        """Fold one batch of study sessions into the running metrics"""
+        start = pd.to_datetime(frame["start_time"], utc=True, errors="coerce")
+        frame = frame.assign(day=start.dt.floor("D")).dropna(subset=["user_id", "day"])
+
+        self._active_pairs.append(frame[["day", "user_id"]].drop_duplicates())
+        self._active_pairs = self._compact(self._active_pairs)
+
+        keys = ["batch_name", "subject", "chapter_no"]
+        chapters = frame.fillna({"chapter_no": "", "duration_minutes": 0})
+        self._chapter_users.append(chapters[keys + ["user_id"]].drop_duplicates())
+        self._chapter_users = self._compact(self._chapter_users)
+
+        grouped = chapters.assign(
+            completed=chapters["end_time"].notna().astype(np.int64),
+            started=np.int64(1)
+        ).groupby(keys)[["started", "completed", "duration_minutes"]].sum()
+        self._chapter_totals = _add(self._chapter_totals, grouped)
+
+    def _consume_content(self, frame: "pd.DataFrame"):
+        """Fold one batch of content analytics into the running metrics"""
+        frame = frame.fillna({"chapter_no": "", "views": 0, "downloads": 0})
+        grouped = frame.groupby(["batch_name", "subject", "content_type"])[["views", "downloads"]].sum()
+        self._content_totals = _add(self._content_totals, grouped)
+
+    def _consume_stats(self, frame: "pd.DataFrame"):
+        """Fold one batch of raw study stats into the running metrics"""
+        timestamp = pd.to_datetime(frame["timestamp"], utc=True, errors="coerce")
+        frame = frame.assign(day=timestamp.dt.floor("D")).dropna(subset=["day"]).fillna({"duration": 0})
+        grouped = frame.assign(events=np.int64(1)).groupby(["day", "subject"])[["duration", "events"]].sum()
+        self._study_totals = _add(self._study_totals, grouped)
+
+    async def _stream(self, name, collection, fields, consume):
+        """Stream a collection into the raw export and the metric accumulators"""
+        first = True
+        async for frame in iter_frames(collection, fields, batch_size=self.batch_size):
+            self.rows[name] += len(frame)
+            self._append_raw(name, frame, first)
+            consume(frame)
+            first = False
+            # Let other tasks run between batches
+            await asyncio.sleep(0)
+
+    def _engagement(self) -> Dict[str, "pd.DataFrame"]:
+        """Compute DAU, WAU and weekly retention cohorts from distinct active pairs"""
+        pairs = _dedup(self._active_pairs)
+        if pairs.empty:
+            return {}
+
+        dau = pairs.groupby("day")["user_id"].nunique().rename("dau").to_frame()
+
+        pairs = pairs.assign(week=pairs["day"] - pd.to_timedelta(pairs["day"].dt.dayofweek, unit="D"))
+        wau = pairs.groupby("week")["user_id"].nunique().rename("wau").to_frame()
+
+        weekly = pairs[["week", "user_id"]].drop_duplicates()
+        cohort = weekly.groupby("user_id")["week"].transform("min")
+        weekly = weekly.assign(cohort=cohort, week_offset=((weekly["week"] - cohort).dt.days // 7).astype(np.int64))
+        counts = weekly.pivot_table(index="cohort", columns="week_offset", values="user_id", aggfunc="count", fill_value=0)
+        retention = counts.div(counts[0], axis=0).round(4)
+        retention.insert(0, "cohort_size", counts[0])
+        retention.columns = [str(c) for c in retention.columns]
+
+        return {"dau": dau, "wau": wau, "retention": retention}
+
+    def _chapter_completion(self) -> Optional["pd.DataFrame"]:
+        """Per-chapter students, started/completed sessions and completion rate"""
+        if self._chapter_totals is None:
+            return None
+        keys = ["batch_name", "subject", "chapter_no"]
+        students = _dedup(self._chapter_users).groupby(keys)["user_id"].nunique().rename("students")
+        table = self._chapter_totals.join(students)
+        table["completion_rate"] = (table["completed"] / table["started"]).round(4)
+        return table.sort_values("students", ascending=False)
+
+    def _write_table(self, name: str, table: "pd.DataFrame") -> str:
+        """Write a metric table in the chosen format"""
+        path = self._path(name)
+        table = table.reset_index()
+        if self.fmt == "feather":
+            try:
+                table.to_feather(path, compression="zstd")
+                return path
+            except ImportError:
+                path = self._path(name, "csv")
+        table.to_csv(path, index=False, compression="gzip")
+        return path
+
+    async def run(self) -> List[str]:
+        """Stream all sources and return the written file paths"""
+        await self._stream("sessions", StudySessions.collection, SESSION_FIELDS, self._consume_sessions)
+        await self._stream("content", ContentAnalytics.collection, ANALYTICS_FIELDS, self._consume_content)
+        if topdb:
+            await self._stream("stats", topdb.stats, STATS_FIELDS, self._consume_stats)
+
+        def finish():
+            tables = self._engagement()
+            completion = self._chapter_completion()
+            if completion is not None:
+                tables["chapter_completion"] = completion
+            if self._content_totals is not None:
+                tables["content_totals"] = self._content_totals
+            if self._study_totals is not None:
+                tables["daily_study"] = self._study_totals
+            return [self._write_table(name, table) for name, table in tables.items()]
+
+        # Final aggregation is CPU bound, keep it off the event loop
+        paths = await asyncio.get_event_loop().run_in_executor(None, finish)
+        raw = [self._path(name, "csv") for name, count in self.rows.items() if count]
+        return paths + raw
+
+    def bundle(self, paths: List[str]) -> str:
+        """Pack exported files into a single zip archive"""
+        archive = os.path.join(self.workdir, f"analytics_{datetime.utcnow():%Y%m%d_%H%M%S}.zip")
+        with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_STORED) as zf:
+            for path in paths:
+                zf.write(path, os.path.basename(path))
+        return archive
+
+
+async def export_analytics(fmt: str = "csv") -> Optional[str]:
+    """Run a full analytics export and return the path of the zip archive"""
+    exporter = None
+    try:
+        exporter = AnalyticsExport(fmt)
+        paths = await exporter.run()
+        archive = exporter.bundle(paths)
+        logger.info(f"Analytics export written to {archive}: {exporter.rows}")
+        return archive
+    except Exception as e:
+        logger.error(f"Error exporting analytics: {e}")
+        # Do not leave partial exports behind in the temp directory
+        if exporter is not None:
+            shutil.rmtree(exporter.workdir, ignore_errors=True)
+        return None
+
+
+def remove_export(archive: str):
+    """Delete an export archive and its working directory"""
+    shutil.rmtree(os.path.dirname(archive), ignore_errors=True)
@@ -0,0 +1,422 @@
+import asyncio
+import logging
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+# Try to import pymongo with error handling
+try:
+    from pymongo import ReturnDocument
+except ImportError:
+    ReturnDocument = None
+
+try:
+    from config import BROADCAST_CURSOR_BATCH, BROADCAST_CHECKPOINT_INTERVAL, BROADCAST_JOB_MAX_ERRORS
+except ImportError:
+    # Fallback configuration values
+    BROADCAST_CURSOR_BATCH = 1000
+    BROADCAST_CHECKPOINT_INTERVAL = 5
+    BROADCAST_JOB_MAX_ERRORS = 3
+
+from database.study_db import db as study_db
+from database.user_registry import user_registry
+from database.segments import audience_segments
+from studybot.util.broadcast import BroadcastResult, DEAD_CLASSES
+from studybot.Bot.clients import client_pool, pool_engine
+
+logger = logging.getLogger(__name__)
+
+# Recipient collections walked for each target, in order
+TARGET_STAGES = {
+    "pm": ["users"],
+    "groups": ["groups"],
+    "all": ["users", "groups"],
+    "specific": ["specific"],
+    "segment": ["segment"],
+}
+
+# Field holding the chat id in each recipient collection; groups saved by users_db.add_chat key on id
+STAGE_KEYS = {"users": "_id", "groups": "id"}
+
+# Reachable recipients; None also matches documents written before the flag existed
+ACTIVE = {"is_active": {"$in": [True, None]}}
+
+
+class _Watermark:
+    """Tracks the last recipient id below which every send has finished"""
+
+    def __init__(self, last_id):
+        self.last_id = last_id
+        # Sequence number -> recipient id, only for sends not yet below the watermark
+        self.ids: Dict[int, int] = {}
+        self._done = set()
+        self._next = 0
+        self._low = 0
+
+    def issue(self, chat_id: int) -> int:
+        """Number a recipient in stream order"""
+        seq = self._next
+        self.ids[seq] = chat_id
+        self._next += 1
+        return seq
+
+    def complete(self, seq: int):
+        """Mark a send finished and advance past the completed prefix"""
+        self._done.add(seq)
+        while self._low in self._done:
+            self._done.remove(self._low)
+            self.last_id = self.ids.pop(self._low)
+            self._low += 1
+
+
+class BroadcastJobs:
+    """Persistent broadcast queue; each job streams recipients in id order and checkpoints its position"""
+
+    def __init__(self, database, batch_size: int = BROADCAST_CURSOR_BATCH,
+                 checkpoint_interval: float = BROADCAST_CHECKPOINT_INTERVAL, max_errors: int = BROADCAST_JOB_MAX_ERRORS):
+        self.db = database
+        self.col = database.broadcast_jobs
+        self.batch_size = batch_size
+        self.checkpoint_interval = checkpoint_interval
+        self.max_errors = max_errors
+        self.bot = None
+        self._cancelled = set()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self):
+        """Index jobs for queue order and recipients for active-only _id scans"""
+        try:
+            await self.col.create_index([("status", 1), ("created_at", 1)])
+            for stage, key in STAGE_KEYS.items():
+                await getattr(self.db, stage).create_index([("is_active", 1), (key, 1)])
+        except Exception as e:
+            logger.error(f"Error creating broadcast job indexes: {e}")
+
+    async def enqueue(self, created_by: int, target: str, payload: Dict, recipients: List[int] = None,
+                      segment: str = None) -> Optional[str]:
+        """Queue a broadcast and return its job id"""
+        try:
+            job_id = uuid.uuid4().hex[:10]
+            stages = TARGET_STAGES.get(target, ["users"])
+            await self.col.insert_one({
+                "_id": job_id,
+                "status": "queued",
+                "created_by": created_by,
+                "created_at": datetime.utcnow(),
+                "target": target,
+                "payload": payload,
+                "recipients": sorted(set(recipients or [])),
+                "segment": segment,
+                "stages": stages,
+                "cursor": {"stage": 0, "last_id": None},
+                "counts": {}
+            })
+            self._wake.set()
+            return job_id
+        except Exception as e:
+            logger.error(f"Error queueing broadcast: {e}")
+            return None
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job"""
+        result = await self.col.update_one(
+            {"_id": job_id, "status": {"$in": ["queued", "running"]}},
+            {"$set": {"status": "cancelled", "finished_at": datetime.utcnow()}}
+        )
+        if result.modified_count:
+            self._cancelled.add(job_id)
+            return True
+        return False
+
+    async def list_jobs(self, limit: int = 10) -> List[Dict]:
+        """Most recent jobs, newest first"""
+        cursor = self.col.find({}, {"payload": 0, "recipients": 0}).sort("created_at", -1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def _unique(self, batch: List[int], skip_users: bool) -> List[int]:
+        """Drop private chat ids already covered by the users stage"""
+        private = [chat_id for chat_id in batch if chat_id > 0]
+        if not skip_users or not private:
+            return batch
+        cursor = self.db.users.find({"_id": {"$in": private}}, {"_id": 1})
+        known = {doc["_id"] async for doc in cursor}
+        return [chat_id for chat_id in batch if chat_id not in known]
+
+    async def _learn_routes(self, batch: List[int], active_only: bool = False) -> List[int]:
+        """Load which bots each user in a batch has started, for sticky client routing"""
+        private = [chat_id for chat_id in batch if chat_id > 0]
+        inactive = set()
+        if private:
+            cursor = self.db.users.find({"_id": {"$in": private}}, {"bots": 1, "is_active": 1})
+            async for doc in cursor:
+                if doc.get("bots"):
+                    client_pool.learn(doc["_id"], doc["bots"])
+                if doc.get("is_active") is False:
+                    inactive.add(doc["_id"])
+        if active_only and inactive:
+            return [chat_id for chat_id in batch if chat_id not in inactive]
+        return batch
+
+    async def _listed(self, ids: List[int], active_only: bool = False) -> AsyncIterator[int]:
+        """Yield an already sorted id list in batches, loading routes ahead of each batch"""
+        for start in range(0, len(ids), self.batch_size):
+            for chat_id in await self._learn_routes(ids[start:start + self.batch_size], active_only):
+                yield chat_id
+
+    async def _recipients(self, job: Dict, stage: str, last_id) -> AsyncIterator[int]:
+        """Stream recipient ids after last_id in id order, reading only the id and bots fields"""
+        if stage == "specific":
+            ids = [chat_id for chat_id in job.get("recipients", []) if last_id is None or chat_id > last_id]
+            async for chat_id in self._listed(ids):
+                yield chat_id
+            return
+        if stage == "segment":
+            # Members are already sorted, so a resumed job skips straight past last_id. Users pruned since the
+            # segment was last refreshed are still members, so they are filtered against is_active here
+            members = await audience_segments.members(job["segment"], after=last_id)
+            async for chat_id in self._listed(members, active_only=True):
+                yield chat_id
+            return
+
+        key = STAGE_KEYS[stage]
+        query = dict(ACTIVE) if last_id is None else {**ACTIVE, key: {"$gt": last_id}}
+        cursor = getattr(self.db, stage).find(query, {key: 1, "bots": 1}).sort(key, 1).batch_size(self.batch_size)
+        skip_users = stage == "groups" and "users" in job["stages"]
+        batch = []
+        async for doc in cursor:
+            batch.append(doc[key])
+            if doc.get("bots"):
+                client_pool.learn(doc[key], doc["bots"])
+            if len(batch) >= self.batch_size:
+                for chat_id in await self._unique(batch, skip_users):
+                    yield chat_id
+                batch = []
+        for chat_id in await self._unique(batch, skip_users):
+            yield chat_id
+
+    async def _count_inactive(self, job: Dict) -> int:
+        """Recipients of a job skipped because earlier broadcasts found them unreachable"""
+        skipped = 0
+        for stage in job["stages"]:
+            if stage in STAGE_KEYS:
+                skipped += await getattr(self.db, stage).count_documents({"is_active": False})
+        return skipped
+
+    async def _prune(self, dead: List[tuple]):
+        """Bulk-mark unreachable recipients inactive so later broadcasts skip them"""
+        now = datetime.utcnow()
+        by_reason: Dict[tuple, List[int]] = {}
+        for chat_id, outcome in dead:
+            stage = "users" if chat_id > 0 else "groups"
+            by_reason.setdefault((stage, outcome), []).append(chat_id)
+        for (stage, outcome), ids in by_reason.items():
+            await getattr(self.db, stage).update_many(
+                {STAGE_KEYS[stage]: {"$in": ids}},
+                {"$set": {"is_active": False, "inactive_reason": outcome, "inactive_at": now}}
+            )
+            if stage == "users" and user_registry:
+                for user_id in ids:
+                    user_registry.forget(user_id)
+        logger.info(f"Marked {len(dead)} unreachable recipients inactive")
+
+    async def _prune_routes(self, unreachable: List[tuple]):
+        """Remove bots from users' bots arrays after they failed to reach a user another bot still reached"""
+        by_bot: Dict[str, List[int]] = {}
+        for chat_id, bot in unreachable:
+            if chat_id > 0:
+                by_bot.setdefault(bot, []).append(chat_id)
+        for bot, ids in by_bot.items():
+            if user_registry:
+                await user_registry.drop_bots(ids, bot)
+            else:
+                await self.db.users.update_many({"_id": {"$in": ids}}, {"$pull": {"bots": bot}})
+
+    def _sender(self, payload: Dict):
+        """Build the send coroutine for a job payload, routed through the client pool"""
+        if payload.get("type") == "copy":
+            # The source message lives in a chat with the main bot, so only it can copy from there
+            return lambda chat_id: client_pool.call(chat_id, "copy_message", payload["chat_id"], payload["message_id"], bots=["main"])
+        return lambda chat_id: client_pool.call(chat_id, "send_message", payload["text"])
+
+    async def _checkpoint(self, job_id: str, stage: int, last_id, counts: Counter):
+        """Persist the cursor and running counts"""
+        await self.col.update_one(
+            {"_id": job_id, "status": "running"},
+            {"$set": {"cursor": {"stage": stage, "last_id": last_id}, "counts": dict(counts), "updated_at": datetime.utcnow()}}
+        )
+
+    async def _run_job(self, job: Dict) -> Counter:
+        """Deliver a job from its saved cursor, checkpointing the contiguous completed prefix"""
+        job_id = job["_id"]
+        send = self._sender(job["payload"])
+        counts = Counter(job.get("counts") or {})
+        stage_index = job["cursor"]["stage"]
+        progress = _Watermark(job["cursor"]["last_id"])
+        dead: List[tuple] = []
+
+        if "skipped_inactive" not in job:
+            job["skipped_inactive"] = await self._count_inactive(job)
+            await self.col.update_one({"_id": job_id}, {"$set": {"skipped_inactive": job["skipped_inactive"]}})
+
+        async def flush_dead():
+            if dead:
+                batch = dead[:]
+                dead.clear()
+                try:
+                    await self._prune(batch)
+                except Exception as e:
+                    logger.error(f"Error marking recipients inactive: {e}")
+            unreachable = client_pool.take_unreachable()
+            if unreachable:
+                try:
+                    await self._prune_routes(unreachable)
+                except Exception as e:
+                    logger.error(f"Error removing unreachable bots: {e}")
+
+        async def periodic():
+            while True:
+                await asyncio.sleep(self.checkpoint_interval)
+                await flush_dead()
+                await self._checkpoint(job_id, stage_index, progress.last_id, counts)
+
+        def on_result(seq, outcome):
+            if outcome in DEAD_CLASSES:
+                dead.append((progress.ids[seq], outcome))
+            progress.complete(seq)
+            counts[outcome] += 1
+
+        ticker = asyncio.get_event_loop().create_task(periodic())
+        try:
+            while stage_index < len(job["stages"]) and job_id not in self._cancelled:
+                recipients = self._recipients(job, job["stages"][stage_index], progress.last_id)
+                await pool_engine.run(
+                    (progress.issue(chat_id) async for chat_id in recipients),
+                    lambda seq: send(progress.ids[seq]),
+                    on_result,
+                    cancelled=lambda: job_id in self._cancelled
+                )
+                if job_id in self._cancelled:
+                    break
+                stage_index, progress = stage_index + 1, _Watermark(None)
+                await self._checkpoint(job_id, stage_index, None, counts)
+        finally:
+            ticker.cancel()
+            await flush_dead()
+            await self._checkpoint(job_id, stage_index, progress.last_id, counts)
+        return counts
+
+    async def _finish(self, job: Dict, counts: Counter):
+        """Mark a job done and report to its creator"""
+        cancelled = job["_id"] in self._cancelled
+        self._cancelled.discard(job["_id"])
+        if not cancelled:
+            await self.col.update_one(
+                {"_id": job["_id"], "status": "running"},
+                {"$set": {"status": "done", "finished_at": datetime.utcnow(), "counts": dict(counts)}}
+            )
+
+        result = BroadcastResult()
+        result.counts.update(counts)
+        text = f"📢 **Broadcast {'Cancelled' if cancelled else 'Completed'}!**\n\n"
+        text += f"🆔 Job: `{job['_id']}`\n"
+        text += f"✅ Successfully sent: {result.success}\n"
+        text += f"❌ Failed: {result.failed}\n"
+        if result.failed:
+            text += f"{result.breakdown()}\n"
+        pruned = sum(count for outcome, count in counts.items() if outcome in DEAD_CLASSES)
+        if pruned:
+            text += f"🧹 Marked inactive: {pruned}\n"
+        if job.get("skipped_inactive"):
+            text += f"💾 Sends saved by skipping inactive recipients: {job['skipped_inactive']}\n"
+        text += f"🎯 Target: {job.get('segment') or job['target'].title()}"
+        try:
+            await self.bot.send_message(job["created_by"], text)
+        except Exception as e:
+            logger.error(f"Failed to report broadcast {job['_id']}: {e}")
+
+    async def _record_error(self, job: Dict, error: Exception):
+        """Count a failed run of a job, failing it for good after max_errors"""
+        try:
+            job = await self.col.find_one_and_update(
+                {"_id": job["_id"], "status": "running"},
+                {"$inc": {"errors": 1}, "$set": {"last_error": str(error), "updated_at": datetime.utcnow()}},
+                return_document=ReturnDocument.AFTER
+            )
+            if not job or job["errors"] < self.max_errors:
+                return
+            await self.col.update_one(
+                {"_id": job["_id"], "status": "running"},
+                {"$set": {"status": "failed", "finished_at": datetime.utcnow()}}
+            )
+            logger.error(f"Broadcast {job['_id']} failed after {job['errors']} errors: {error}")
+            await self.bot.send_message(
+                job["created_by"],
+                f"❌ **Broadcast Failed!**\n\n🆔 Job: `{job['_id']}`\n"
+                f"⚠️ Stopped after {job['errors']} errors, last: {error}"
+            )
+        except Exception as e:
+            logger.error(f"Error recording broadcast failure: {e}")
+
+    async def _next_job(self) -> Optional[Dict]:
+        """Resume a job interrupted by a restart, or claim the oldest queued one"""
+        job = await self.col.find_one({"status": "running"}, sort=[("created_at", 1)])
+        if job:
+            logger.info(f"Resuming broadcast {job['_id']} from {job['cursor']}")
+            return job
+        return await self.col.find_one_and_update(
+            {"status": "queued"},
+            {"$set": {"status": "running", "started_at": datetime.utcnow()}},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _worker(self):
+        """Run queued jobs one after another; they share one global rate limit"""
+        await self.ensure_indexes()
+        while True:
+            job = None
+            try:
+                job = await self._next_job()
+                if not job:
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout=60)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                counts = await self._run_job(job)
+                await self._finish(job, counts)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in broadcast worker: {e}")
+                if job:
+                    # The job stays running and is resumed from its checkpoint until it errors too often
+                    await self._record_error(job, e)
+                await asyncio.sleep(30)
+
+    def start(self, bot):
+        """Start the background broadcast worker"""
+        self.bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self._worker())
+
+    async def stop(self):
+        """Stop the worker; a running job keeps its checkpoint and resumes on next start"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Create global broadcast job queue instance
+try:
+    broadcast_jobs = BroadcastJobs(study_db) if study_db is not None else None
+except Exception as e:
+    print(f"Warning: Could not initialize broadcast jobs: {e}")
+    broadcast_jobs = None
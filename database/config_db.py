@@ -9,6 +9,8 @@ except ImportError as e:
     print(f"Warning: Could not import motor in config_db.py: {e}")
     AsyncIOMotorClient = None
 
+from database.maintenance import delete_in_chunks
+
 logger = logging.getLogger(__name__)
 
 class Database:
@@ -437,14 +439,14 @@ class Database:
         try:
             cutoff_date = datetime.utcnow() - timedelta(days=days_old)
             
-            # Clean old backups
-            old_backups = await self.col.delete_many({
+            # Clean old backups in small batches
+            deleted = await delete_in_chunks(self.col, {
                 "key": {"$regex": "^config_backup_"},
                 "value.timestamp": {"$lt": cutoff_date}
             })
             
-            logger.info(f"Cleaned up {old_backups.deleted_count} old config backups")
-            return old_backups.deleted_count
+            logger.info(f"Cleaned up {deleted} old config backups")
+            return deleted
             
         except Exception as e:
             logger.error(f"Error cleaning up old configs: {e}")
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, Optional
+
+# Try to import pymongo with error handling
+try:
+    from pymongo import UpdateOne, InsertOne
+    from pymongo.errors import BulkWriteError
+except ImportError:
+    UpdateOne = None
+    InsertOne = None
+    BulkWriteError = None
+
+try:
+    from config import COUNTER_FLUSH_INTERVAL, COUNTER_FLUSH_EVENTS
+except ImportError:
+    # Fallback configuration values
+    COUNTER_FLUSH_INTERVAL = 30
+    COUNTER_FLUSH_EVENTS = 1000
+
+logger = logging.getLogger(__name__)
+
+# MongoDB error code for a duplicate _id
+DUPLICATE_KEY = 11000
+
+
+class CounterBuffer:
+    """Accumulates $inc deltas and inserts in memory and writes them in bulk"""
+
+    def __init__(self, flush_interval: float = COUNTER_FLUSH_INTERVAL, flush_events: int = COUNTER_FLUSH_EVENTS):
+        self.flush_interval = flush_interval
+        self.flush_events = flush_events
+        self._collections = {}
+        # collection name -> (_id, upsert) -> field -> delta
+        self._deltas: Dict[str, Dict[tuple, Dict[str, float]]] = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+        # collection name -> (_id, upsert) -> fields set when the upsert inserts
+        self._on_insert: Dict[str, Dict[tuple, Dict]] = defaultdict(dict)
+        # collection name -> documents waiting to be inserted
+        self._inserts: Dict[str, list] = defaultdict(list)
+        self._events = 0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_pending = False
+        # Extra coroutines run on every flush, e.g. sketch persistence
+        self._hooks = []
+
+    def add_flush_hook(self, hook):
+        """Register a coroutine function to run on every periodic and shutdown flush"""
+        if hook not in self._hooks:
+            self._hooks.append(hook)
+
+    async def _run_hooks(self):
+        """Run registered flush hooks, logging failures"""
+        for hook in self._hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logger.error(f"Error in counter flush hook {getattr(hook, '__name__', hook)}: {e}")
+
+    def _track(self, collection):
+        """Remember the collection object so flush can reach it by name"""
+        name = getattr(collection, 'full_name', None) or collection.name
+        self._collections.setdefault(name, collection)
+        return name
+
+    def incr(self, collection, doc_id, fields: Dict[str, float], upsert: bool = True, on_insert: Dict = None):
+        """Queue $inc deltas for one document"""
+        name = self._track(collection)
+        bucket = self._deltas[name][(doc_id, upsert)]
+        for field, amount in fields.items():
+            bucket[field] += amount
+        if on_insert:
+            self._on_insert[name][(doc_id, upsert)] = on_insert
+        self._count_event()
+
+    def insert(self, collection, document: Dict):
+        """Queue a document for a batched insert"""
+        name = self._track(collection)
+        self._inserts[name].append(document)
+        self._count_event()
+
+    def _count_event(self):
+        """Trigger an early flush once enough events are buffered"""
+        self._events += 1
+        if self._events >= self.flush_events and not self._flush_pending:
+            self._flush_pending = True
+            try:
+                asyncio.get_event_loop().create_task(self.flush())
+            except RuntimeError:
+                self._flush_pending = False
+
+    @property
+    def pending(self) -> int:
+        """Number of buffered events not yet written"""
+        return self._events
+
+    async def flush(self) -> int:
+        """Write all buffered deltas and inserts, one bulk_write per collection"""
+        async with self._lock:
+            self._flush_pending = False
+            if not self._events or UpdateOne is None:
+                return 0
+
+            deltas, self._deltas = self._deltas, defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+            on_insert, self._on_insert = self._on_insert, defaultdict(dict)
+            inserts, self._inserts = self._inserts, defaultdict(list)
+            self._events = 0
+
+            written = 0
+            for name in set(deltas) | set(inserts):
+                operations = []
+                # Parallel to operations: ('inc', key, fields) or ('insert', document)
+                sources = []
+                for key, fields in deltas.get(name, {}).items():
+                    doc_id, upsert = key
+                    update = {'$inc': dict(fields)}
+                    if key in on_insert.get(name, {}):
+                        update['$setOnInsert'] = on_insert[name][key]
+                    operations.append(UpdateOne({'_id': doc_id}, update, upsert=upsert))
+                    sources.append(('inc', key, fields))
+                for doc in inserts.get(name, []):
+                    operations.append(InsertOne(doc))
+                    sources.append(('insert', doc))
+                if not operations:
+                    continue
+                try:
+                    await self._collections[name].bulk_write(operations, ordered=False)
+                    written += len(operations)
+                except BulkWriteError as e:
+                    # Unordered writes apply everything except the listed failures
+                    errors = e.details.get('writeErrors', [])
+                    logger.error(f"Error flushing counters for {name}: {len(errors)} of {len(operations)} writes failed")
+                    written += len(operations) - len(errors)
+                    for error in errors:
+                        source = sources[error['index']]
+                        if source[0] == 'insert' and error.get('code') == DUPLICATE_KEY:
+                            # Already stored by an earlier attempt, retrying would fail forever
+                            continue
+                        self._requeue(name, source, on_insert.get(name, {}))
+                except Exception as e:
+                    # Nothing is known to have been written, so retry the whole batch
+                    logger.error(f"Error flushing counters for {name}: {e}")
+                    for source in sources:
+                        self._requeue(name, source, on_insert.get(name, {}))
+            return written
+
+    def _requeue(self, name, source, on_insert):
+        """Put one failed write back so it is retried on the next flush"""
+        if source[0] == 'insert':
+            self._inserts[name].append(source[1])
+        else:
+            _, key, fields = source
+            bucket = self._deltas[name][key]
+            for field, amount in fields.items():
+                bucket[field] += amount
+            if key in on_insert:
+                self._on_insert[name].setdefault(key, on_insert[key])
+        self._events += 1
+
+    async def _flush_loop(self):
+        """Periodically flush buffered counters"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            await self._run_hooks()
+
+    def start(self):
+        """Start the background flush task"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the background flush task and write what is left"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        await self._run_hooks()
+
+
+# Create global counter buffer instance
+counters = CounterBuffer()
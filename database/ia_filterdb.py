@@ -10,6 +10,7 @@ from umongo import Instance, Document, fields
 from marshmallow import ValidationError
 from datetime import datetime, timedelta
 import logging
+from database.maintenance import delete_in_chunks
 
 # Try to import motor with error handling
 try:
@@ -111,9 +112,13 @@ if instance:
         file_type = fields.StringField(allow_none=True)
         mime_type = fields.StringField(allow_none=True)
         caption = fields.StringField(allow_none=True)
+        # Message the file was indexed from, used to copy it or refresh an expired file reference
+        chat_id = fields.IntegerField(allow_none=True)
+        message_id = fields.IntegerField(allow_none=True)
+        indexed_at = fields.DateTimeField(default_factory=datetime.utcnow)
 
         class Meta:
-            indexes = ("$file_name",)
+            indexes = ("$file_name", "indexed_at")
             collection_name = COLLECTION_NAME
 else:
     class Media:
@@ -130,9 +135,13 @@ if instance2:
         file_type = fields.StringField(allow_none=True)
         mime_type = fields.StringField(allow_none=True)
         caption = fields.StringField(allow_none=True)
+        # Message the file was indexed from, used to copy it or refresh an expired file reference
+        chat_id = fields.IntegerField(allow_none=True)
+        message_id = fields.IntegerField(allow_none=True)
+        indexed_at = fields.DateTimeField(default_factory=datetime.utcnow)
 
         class Meta:
-            indexes = ("$file_name",)
+            indexes = ("$file_name", "indexed_at")
             collection_name = COLLECTION_NAME
 else:
     class Media2:
@@ -170,8 +179,8 @@ def unpack_new_file_id(file_id):
     file_reference = decoded.file_reference
     return media_id, file_reference
 
-async def save_file(media):
-    """Save file in database, with detailed logging."""
+async def save_file(media, chat_id=None, message_id=None):
+    """Save file in database with the chat and message it came from, with detailed logging."""
     try:
         file_id, file_ref = unpack_new_file_id(media.file_id)
         file_name = re.sub(
@@ -202,8 +211,10 @@ async def save_file(media):
             "file_name": file_name,
             "file_size": media.file_size,
             "file_type": media.file_type,
-            "mime_type": media.mime_type,
-            "caption": media.caption if hasattr(media, 'caption') else None
+            "mime_type": getattr(media, 'mime_type', None),
+            "caption": media.caption if hasattr(media, 'caption') else None,
+            "chat_id": chat_id,
+            "message_id": message_id
         }
         
         try:
@@ -323,19 +334,20 @@ async def get_file_stats():
         return {}
 
 async def cleanup_old_files(days_old=30):
-    """Clean up old files from database"""
+    """Clean up old files from database in rate-limited batches"""
     try:
         cutoff_date = datetime.utcnow() - timedelta(days=days_old)
         
+        # Files indexed before indexed_at existed have no timestamp and are kept
+        old_query = {"indexed_at": {"$lt": cutoff_date}}
+        
         # Clean primary DB
-        primary_result = await Media.delete_many({"uploaded_at": {"$lt": cutoff_date}})
-        primary_deleted = primary_result.deleted_count
+        primary_deleted = await delete_in_chunks(Media.collection, old_query)
         
         # Clean secondary DB if enabled
         secondary_deleted = 0
         if MULTIPLE_DB:
-            secondary_result = await Media2.delete_many({"uploaded_at": {"$lt": cutoff_date}})
-            secondary_deleted = secondary_result.deleted_count
+            secondary_deleted = await delete_in_chunks(Media2.collection, old_query)
         
         total_deleted = primary_deleted + secondary_deleted
         
@@ -0,0 +1,105 @@
+import bisect
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RollingLeaderboard:
+    """In-memory daily/weekly/monthly leaderboards kept sorted as events arrive"""
+
+    def __init__(self, windows: Tuple[int, ...] = (1, 7, 30)):
+        self.windows = tuple(sorted(windows))
+        self.current_day: Optional[datetime] = None
+        # day -> user_id -> [duration, sessions]
+        self.days: Dict[datetime, Dict[int, List[float]]] = {}
+        # window -> user_id -> [duration, sessions]
+        self.totals: Dict[int, Dict[int, List[float]]] = {w: {} for w in self.windows}
+        # window -> ascending list of (-duration, user_id)
+        self.ranked: Dict[int, List[Tuple[float, int]]] = {w: [] for w in self.windows}
+
+    @staticmethod
+    def _day(timestamp: datetime) -> datetime:
+        """Truncate a timestamp to its day"""
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def _apply(self, window: int, user_id: int, duration: float, sessions: int):
+        """Change a user's totals in one window and keep the ranked list sorted"""
+        totals = self.totals[window]
+        ranked = self.ranked[window]
+        entry = totals.get(user_id)
+        if entry is not None:
+            index = bisect.bisect_left(ranked, (-entry[0], user_id))
+            if index < len(ranked) and ranked[index] == (-entry[0], user_id):
+                ranked.pop(index)
+        else:
+            entry = totals[user_id] = [0, 0]
+
+        entry[0] += duration
+        entry[1] += sessions
+        if entry[1] <= 0 and entry[0] <= 0:
+            del totals[user_id]
+            return
+        bisect.insort(ranked, (-entry[0], user_id))
+
+    def _advance(self, today: datetime):
+        """Move the windows forward, dropping days that fell out of each one"""
+        if self.current_day is None:
+            self.current_day = today
+            return
+        while self.current_day < today:
+            self.current_day += timedelta(days=1)
+            for window in self.windows:
+                expired = self.days.get(self.current_day - timedelta(days=window))
+                if not expired:
+                    continue
+                for user_id, (duration, sessions) in expired.items():
+                    self._apply(window, user_id, -duration, -sessions)
+        oldest = self.current_day - timedelta(days=self.windows[-1])
+        for day in [d for d in self.days if d <= oldest]:
+            del self.days[day]
+
+    def add(self, user_id: int, duration: float, timestamp: datetime, sessions: int = 1):
+        """Record study time for a user at a given time"""
+        day = self._day(timestamp)
+        self._advance(max(day, self._day(datetime.utcnow())))
+        age = (self.current_day - day).days
+        if age >= self.windows[-1]:
+            return
+
+        entry = self.days.setdefault(day, {}).setdefault(user_id, [0, 0])
+        entry[0] += duration
+        entry[1] += sessions
+        for window in self.windows:
+            if age < window:
+                self._apply(window, user_id, duration, sessions)
+
+    def top(self, window: int, k: int = 10) -> List[Dict]:
+        """Return the top k users of a window, highest study time first"""
+        self._advance(self._day(datetime.utcnow()))
+        totals = self.totals[window]
+        return [
+            {"_id": user_id, "total_duration": totals[user_id][0], "total_sessions": totals[user_id][1]}
+            for _, user_id in self.ranked[window][:k]
+        ]
+
+    def rank(self, window: int, user_id: int) -> Optional[int]:
+        """Return a user's 1-based rank in a window, or None if they have no time"""
+        self._advance(self._day(datetime.utcnow()))
+        entry = self.totals[window].get(user_id)
+        if entry is None:
+            return None
+        return bisect.bisect_left(self.ranked[window], (-entry[0], user_id)) + 1
+
+    def size(self, window: int) -> int:
+        """Number of ranked users in a window"""
+        return len(self.ranked[window])
+
+    def clear(self):
+        """Drop all state"""
+        self.current_day = None
+        self.days.clear()
+        for window in self.windows:
+            self.totals[window].clear()
+            self.ranked[window].clear()
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+# Try to import pymongo with error handling
+try:
+    from pymongo.errors import OperationFailure
+except ImportError:
+    OperationFailure = Exception
+
+try:
+    from config import CLEANUP_BATCH_SIZE, CLEANUP_BATCH_PAUSE
+except ImportError:
+    # Fallback configuration values
+    CLEANUP_BATCH_SIZE = 500
+    CLEANUP_BATCH_PAUSE = 0.5
+
+logger = logging.getLogger(__name__)
+
+# MongoDB error code for an index that exists with different options
+INDEX_OPTIONS_CONFLICT = 85
+# MongoDB error code for dropping an index that does not exist
+INDEX_NOT_FOUND = 27
+
+
+async def ensure_ttl_index(collection, field: str, expire_after_seconds: int, name: Optional[str] = None,
+                           partial_filter: Optional[Dict] = None):
+    """Create a TTL index on a date field, replacing it if the expiry or filter changed"""
+    index_name = name or f"{field}_ttl"
+    options = {"partialFilterExpression": partial_filter} if partial_filter else {}
+    try:
+        await collection.create_index(
+            [(field, 1)],
+            name=index_name,
+            expireAfterSeconds=int(expire_after_seconds),
+            **options
+        )
+        return True
+    except OperationFailure as e:
+        if getattr(e, "code", None) != INDEX_OPTIONS_CONFLICT:
+            logger.error(f"Error creating TTL index {index_name}: {e}")
+            return False
+
+    # Expiry or filter changed since the index was created - rebuild it
+    try:
+        await collection.drop_index(index_name)
+        await collection.create_index(
+            [(field, 1)],
+            name=index_name,
+            expireAfterSeconds=int(expire_after_seconds),
+            **options
+        )
+        logger.info(f"Recreated TTL index {index_name} with expiry {expire_after_seconds}s")
+        return True
+    except Exception as e:
+        logger.error(f"Error recreating TTL index {index_name}: {e}")
+        return False
+
+
+async def drop_index_if_exists(collection, name: str):
+    """Drop an index that was replaced by another, ignoring it if it is already gone"""
+    try:
+        await collection.drop_index(name)
+        logger.info(f"Dropped index {name}")
+        return True
+    except OperationFailure as e:
+        if getattr(e, "code", None) != INDEX_NOT_FOUND:
+            logger.error(f"Error dropping index {name}: {e}")
+        return False
+
+
+async def _iter_id_batches(collection, query: Dict, batch_size: int):
+    """Yield lists of matching _ids in ascending order, one batch at a time"""
+    last_id = None
+    while True:
+        page_query = query if last_id is None else {"$and": [query, {"_id": {"$gt": last_id}}]}
+        cursor = collection.find(page_query, {"_id": 1}).sort("_id", 1).limit(batch_size)
+        ids = [doc["_id"] async for doc in cursor]
+        if not ids:
+            return
+        yield ids
+        if len(ids) < batch_size:
+            return
+        last_id = ids[-1]
+
+
+async def delete_in_chunks(collection, query: Dict, batch_size: int = None, pause: float = None):
+    """Delete matching documents in small _id batches with a pause between them"""
+    batch_size = batch_size or CLEANUP_BATCH_SIZE
+    pause = CLEANUP_BATCH_PAUSE if pause is None else pause
+    deleted = 0
+    async for ids in _iter_id_batches(collection, query, batch_size):
+        result = await collection.delete_many({"_id": {"$in": ids}})
+        deleted += result.deleted_count
+        if pause:
+            await asyncio.sleep(pause)
+    return deleted
+
+
+async def update_in_chunks(collection, query: Dict, update: Dict, batch_size: int = None, pause: float = None):
+    """Apply an update to matching documents in small _id batches with a pause between them"""
+    batch_size = batch_size or CLEANUP_BATCH_SIZE
+    pause = CLEANUP_BATCH_PAUSE if pause is None else pause
+    modified = 0
+    async for ids in _iter_id_batches(collection, query, batch_size):
+        result = await collection.update_many({"_id": {"$in": ids}}, update)
+        modified += result.modified_count
+        if pause:
+            await asyncio.sleep(pause)
+    return modified
@@ -0,0 +1,110 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+# Try to import pymongo with error handling
+try:
+    from pymongo.errors import BulkWriteError
+except ImportError:
+    BulkWriteError = Exception
+
+try:
+    from config import NOTICE_CONCURRENCY, NOTICE_LEDGER_TTL_DAYS
+except ImportError:
+    # Fallback configuration values
+    NOTICE_CONCURRENCY = 10
+    NOTICE_LEDGER_TTL_DAYS = 90
+
+from database.study_db import db as study_db
+from database.maintenance import ensure_ttl_index
+from studybot.util.broadcast import BroadcastEngine, DEAD_CLASSES
+
+logger = logging.getLogger(__name__)
+
+# MongoDB duplicate key error code
+DUPLICATE_KEY = 11000
+
+# (user_id, notice_type, period, text)
+Notice = Tuple[int, str, str, str]
+
+
+class NotificationLedger:
+    """Records which notices were sent so each (user, notice_type, period) goes out once"""
+
+    def __init__(self, collection, engine: BroadcastEngine = None):
+        self.col = collection
+        # Shares the global broadcast rate limit, with fewer workers of its own
+        self.engine = engine or BroadcastEngine(workers=NOTICE_CONCURRENCY)
+
+    @staticmethod
+    def _key(user_id: int, notice_type: str, period: str) -> str:
+        """Ledger _id for a notice"""
+        return f"{user_id}:{notice_type}:{period}"
+
+    async def ensure_indexes(self):
+        """Expire old ledger entries"""
+        await ensure_ttl_index(self.col, "sent_at", NOTICE_LEDGER_TTL_DAYS * 86400)
+
+    async def claim(self, notices: List[Notice]) -> List[Notice]:
+        """Record notices as sent, returning only those not recorded before"""
+        if not notices:
+            return []
+        now = datetime.utcnow()
+        docs = [
+            {"_id": self._key(user_id, notice_type, period), "user_id": user_id,
+             "notice_type": notice_type, "period": period, "sent_at": now}
+            for user_id, notice_type, period, _ in notices
+        ]
+        try:
+            await self.col.insert_many(docs, ordered=False)
+            return list(notices)
+        except BulkWriteError as e:
+            details = getattr(e, "details", None) or {}
+            duplicates = {err["index"] for err in details.get("writeErrors", []) if err.get("code") == DUPLICATE_KEY}
+            if len(duplicates) != len(details.get("writeErrors", [])):
+                logger.error(f"Error recording notices in ledger: {e}")
+            return [notice for i, notice in enumerate(notices) if i not in duplicates]
+
+    async def release(self, notices: List[Notice]):
+        """Forget notices that could not be delivered so a later run retries them"""
+        if notices:
+            keys = [self._key(user_id, notice_type, period) for user_id, notice_type, period, _ in notices]
+            await self.col.delete_many({"_id": {"$in": keys}})
+
+    async def deliver(self, bot, notices: List[Notice]) -> Dict[str, int]:
+        """Send every notice not already in the ledger, returning outcome counts"""
+        counts = {"sent": 0, "dead": 0, "failed": 0, "skipped": 0}
+        try:
+            fresh = await self.claim(notices)
+        except Exception as e:
+            logger.error(f"Error claiming notices: {e}")
+            return counts
+        counts["skipped"] = len(notices) - len(fresh)
+
+        failed = []
+
+        def on_result(notice, outcome):
+            if outcome == "success":
+                counts["sent"] += 1
+            elif outcome in DEAD_CLASSES:
+                counts["dead"] += 1
+            else:
+                counts["failed"] += 1
+                failed.append(notice)
+
+        await self.engine.run(fresh, lambda notice: bot.send_message(chat_id=notice[0], text=notice[3]), on_result)
+
+        # Unreachable users keep their entry; transient failures are retried later
+        try:
+            await self.release(failed)
+        except Exception as e:
+            logger.error(f"Error releasing failed notices: {e}")
+        return counts
+
+
+# Create global notification ledger instance
+try:
+    notification_ledger = NotificationLedger(study_db.notification_ledger) if study_db is not None else None
+except Exception as e:
+    print(f"Warning: Could not initialize notification ledger: {e}")
+    notification_ledger = None
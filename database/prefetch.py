@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+try:
+    from config import PREFETCH_AHEAD, PREFETCH_CACHE_SIZE, PREFETCH_TTL
+except ImportError:
+    # Fallback configuration values
+    PREFETCH_AHEAD = 3
+    PREFETCH_CACHE_SIZE = 1000
+    PREFETCH_TTL = 600
+
+from database.study_db import StudyFiles
+from studybot.util.file_refs import file_refs
+
+logger = logging.getLogger(__name__)
+
+# (batch_name, subject, teacher, chapter, lecture_num)
+LectureKey = Tuple[str, str, str, str, str]
+
+
+def next_lectures(lecture_num: str, count: int) -> List[str]:
+    """Lecture numbers following lecture_num, keeping its prefix and zero padding (L01 -> L02, L03)"""
+    match = re.match(r"^(.*?)(\d+)$", lecture_num)
+    if not match:
+        return []
+    prefix, digits = match.groups()
+    return [f"{prefix}{int(digits) + step:0{len(digits)}d}" for step in range(1, count + 1)]
+
+
+def lecture_pattern(lecture_num: str) -> str:
+    """Regex matching a lecture number in a file name literally, so L1 does not also match L10 or L11"""
+    return rf"(?<!\d){re.escape(lecture_num)}(?!\d)"
+
+
+class LecturePrefetcher:
+    """Caches lecture files and warms the next few lectures of a chapter while the current one is delivered"""
+
+    def __init__(self, ahead: int = PREFETCH_AHEAD, max_cached: int = PREFETCH_CACHE_SIZE, ttl: float = PREFETCH_TTL):
+        self.ahead = ahead
+        self.max_cached = max_cached
+        self.ttl = ttl
+        # LRU of lecture key -> (expires at, file document or None when there is no such lecture)
+        self._cache: "OrderedDict[LectureKey, Tuple[float, object]]" = OrderedDict()
+        # Lecture keys being prefetched -> task loading them
+        self._pending: Dict[LectureKey, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+
+    @staticmethod
+    def _query(batch_name: str, subject: str, teacher: str, chapter: str) -> Dict:
+        """Lecture files of a chapter"""
+        return {
+            "batch_name": batch_name,
+            "subject": subject,
+            "teacher": teacher,
+            "chapter_no": chapter,
+            "content_type": "Lectures"
+        }
+
+    def _store(self, key: LectureKey, study_file):
+        self._cache[key] = (time.monotonic() + self.ttl, study_file)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    def _cached(self, key: LectureKey):
+        """Cached entry as a one-item tuple, or None on a miss"""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return (entry[1],)
+
+    async def get(self, batch_name: str, subject: str, teacher: str, chapter: str, lecture_num: str):
+        """Lecture file for a tap, from memory when it was prefetched"""
+        key = (batch_name, subject, teacher, chapter, lecture_num)
+        pending = self._pending.get(key)
+        if pending:
+            # A tap that races its own prefetch waits for it instead of querying twice
+            await asyncio.wait([pending])
+        cached = self._cached(key)
+        if cached is not None:
+            self.hits += 1
+            return cached[0]
+
+        self.misses += 1
+        study_file = await StudyFiles.find_one({
+            **self._query(batch_name, subject, teacher, chapter),
+            "file_name": {"$regex": lecture_pattern(lecture_num), "$options": "i"}
+        })
+        self._store(key, study_file)
+        return study_file
+
+    async def _load(self, client, batch_name: str, subject: str, teacher: str, chapter: str, lectures: List[str]):
+        """Fetch several lectures in one query and refresh their file references in one batch"""
+        patterns = {lecture: re.compile(lecture_pattern(lecture), re.IGNORECASE) for lecture in lectures}
+        files = await StudyFiles.find({
+            **self._query(batch_name, subject, teacher, chapter),
+            "file_name": {"$in": list(patterns.values())}
+        }).to_list(length=len(lectures) * 10)
+
+        found = []
+        for lecture in lectures:
+            study_file = next((f for f in files if patterns[lecture].search(f.file_name)), None)
+            self._store((batch_name, subject, teacher, chapter, lecture), study_file)
+            if study_file is not None:
+                found.append(study_file)
+        self.prefetched += len(found)
+
+        if client is not None and found:
+            await file_refs.refresh(client, found)
+
+    def prefetch(self, client, batch_name: str, subject: str, teacher: str, chapter: str, lecture_num: str):
+        """Start loading the lectures after lecture_num in the background"""
+        lectures = [
+            lecture for lecture in next_lectures(lecture_num, self.ahead)
+            if (batch_name, subject, teacher, chapter, lecture) not in self._pending
+            and self._cached((batch_name, subject, teacher, chapter, lecture)) is None
+        ]
+        if not lectures:
+            return
+
+        keys = [(batch_name, subject, teacher, chapter, lecture) for lecture in lectures]
+        task = asyncio.get_event_loop().create_task(self._load(client, batch_name, subject, teacher, chapter, lectures))
+        for key in keys:
+            self._pending[key] = task
+
+        def done(finished: asyncio.Task):
+            for key in keys:
+                if self._pending.get(key) is finished:
+                    del self._pending[key]
+            if not finished.cancelled() and finished.exception():
+                logger.error(f"Error prefetching lectures {lectures} of {batch_name} - {subject} - {chapter}: {finished.exception()}")
+
+        task.add_done_callback(done)
+
+    def stats(self) -> Dict:
+        """Cache hit rate and prefetch counts"""
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 3) if requests else 0,
+            "prefetched": self.prefetched,
+            "cached": len(self._cache)
+        }
+
+
+# Create global lecture prefetcher instance
+lecture_prefetcher = LecturePrefetcher()
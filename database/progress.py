@@ -0,0 +1,232 @@
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+try:
+    from config import PROGRESS_CACHE_SIZE
+except ImportError:
+    # Fallback configuration values
+    PROGRESS_CACHE_SIZE = 10000
+
+from database.study_db import db as study_db
+from utils import (
+    progress_key, score_from_metrics, achievement_mask, achievement_titles,
+    get_study_level, get_readable_time
+)
+
+logger = logging.getLogger(__name__)
+
+# Number of sessions kept in the recent activity list
+RECENT_SESSIONS = 5
+
+
+class ProgressTracker:
+    """Keeps per-user study aggregates up to date as sessions and downloads are recorded"""
+
+    def __init__(self, collection, users_collection=None, max_cached: int = PROGRESS_CACHE_SIZE):
+        self.col = collection
+        self.users = users_collection
+        self.max_cached = max_cached
+        # LRU of user_id -> progress document
+        self._docs: "OrderedDict[int, Dict]" = OrderedDict()
+        # user_id -> rendered summary, dropped whenever the user's aggregates change
+        self._summaries: Dict[int, str] = {}
+
+    @staticmethod
+    def _empty(user_id: int) -> Dict:
+        """A fresh progress document"""
+        return {
+            '_id': user_id,
+            'total_time_spent': 0,
+            'total_sessions': 0,
+            'total_downloads': 0,
+            'subjects': [],
+            'last_study_day': None,
+            'streak': 0,
+            'best_streak': 0,
+            'score': 0,
+            'level': get_study_level(0),
+            'achievements': 0,
+            'recent': []
+        }
+
+    async def _seed(self, user_id: int) -> Dict:
+        """Build a first progress document from the counters already on the user"""
+        doc = self._empty(user_id)
+        if self.users is None:
+            return doc
+        user = await self.users.find_one(
+            {'_id': user_id},
+            {'total_downloads': 1, 'total_time_spent': 1, 'study_progress': 1}
+        )
+        if user:
+            doc['total_downloads'] = user.get('total_downloads', 0)
+            doc['total_time_spent'] = user.get('total_time_spent', 0)
+            doc['subjects'] = list(user.get('study_progress') or {})
+            self._rescore(doc, active=False)
+        return doc
+
+    async def _get(self, user_id: int) -> Dict:
+        """Return the cached progress document, loading or seeding it on a miss"""
+        doc = self._docs.get(user_id)
+        if doc is not None:
+            self._docs.move_to_end(user_id)
+            return doc
+
+        loaded = await self.col.find_one({'_id': user_id})
+        if loaded is None:
+            loaded = await self._seed(user_id)
+
+        # Another event may have loaded the same user while we were waiting
+        doc = self._docs.get(user_id)
+        if doc is not None:
+            return doc
+
+        self._docs[user_id] = loaded
+        while len(self._docs) > self.max_cached:
+            evicted, _ = self._docs.popitem(last=False)
+            self._summaries.pop(evicted, None)
+        return loaded
+
+    @staticmethod
+    def _rescore(doc: Dict, active: bool = True) -> List[str]:
+        """Refresh score, level and achievements, returning newly unlocked titles"""
+        metrics = {
+            'total_time_spent': doc['total_time_spent'],
+            'total_downloads': doc['total_downloads'],
+            'subjects': len(doc['subjects'])
+        }
+        doc['score'] = score_from_metrics(metrics, active)
+        doc['level'] = get_study_level(doc['score'])
+        mask = achievement_mask(metrics)
+        unlocked = mask & ~doc['achievements']
+        doc['achievements'] |= mask
+        return achievement_titles(unlocked)
+
+    @staticmethod
+    def _mark_day(doc: Dict, when: datetime):
+        """Advance the daily streak for activity at the given time"""
+        day = when.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        last = doc.get('last_study_day')
+        if last is not None and last.tzinfo is not None:
+            last = last.replace(tzinfo=None)
+        if last is not None and day <= last:
+            return
+        if last is not None and day - last == timedelta(days=1):
+            doc['streak'] += 1
+        else:
+            doc['streak'] = 1
+        doc['best_streak'] = max(doc['best_streak'], doc['streak'])
+        doc['last_study_day'] = day
+
+    async def _save(self, user_id: int, doc: Dict):
+        """Persist a progress document and drop its cached summary"""
+        self._summaries.pop(user_id, None)
+        doc['updated_at'] = datetime.now(timezone.utc)
+        await self.col.replace_one({'_id': user_id}, doc, upsert=True)
+
+    async def record_session(self, user_id: int, duration_minutes: float, ended_at: datetime = None,
+                             batch_name: str = None, subject: str = None, chapter: str = None) -> List[str]:
+        """Fold a finished study session into the user's aggregates"""
+        try:
+            user_id = int(user_id)
+            ended_at = ended_at or datetime.now(timezone.utc)
+            doc = await self._get(user_id)
+
+            doc['total_time_spent'] += int(duration_minutes)
+            doc['total_sessions'] += 1
+            if subject:
+                key = progress_key(batch_name or '', subject, chapter or '')
+                if key not in doc['subjects']:
+                    doc['subjects'].append(key)
+            self._mark_day(doc, ended_at)
+            doc['recent'] = ([{'duration': int(duration_minutes), 'subject': subject, 'ended_at': ended_at}]
+                             + doc['recent'])[:RECENT_SESSIONS]
+
+            unlocked = self._rescore(doc)
+            await self._save(user_id, doc)
+            return unlocked
+        except Exception as e:
+            logger.error(f"Error recording session progress for {user_id}: {e}")
+            return []
+
+    async def record_download(self, user_id: int, batch_name: str, subject: str, chapter: str) -> List[str]:
+        """Fold a content download into the user's aggregates"""
+        try:
+            user_id = int(user_id)
+            doc = await self._get(user_id)
+
+            doc['total_downloads'] += 1
+            key = progress_key(batch_name, subject, chapter)
+            if key not in doc['subjects']:
+                doc['subjects'].append(key)
+            self._mark_day(doc, datetime.now(timezone.utc))
+
+            unlocked = self._rescore(doc)
+            await self._save(user_id, doc)
+            return unlocked
+        except Exception as e:
+            logger.error(f"Error recording download progress for {user_id}: {e}")
+            return []
+
+    def _render(self, doc: Dict) -> str:
+        """Render the progress summary shown to the user"""
+        sessions = doc['total_sessions']
+        minutes = doc['total_time_spent']
+        average = minutes / sessions if sessions else 0
+        titles = achievement_titles(doc['achievements'])
+
+        text = "📊 **Your Progress**\n\n"
+        text += f"🏆 **Level:** {doc['level']}\n"
+        text += f"⭐ **Score:** {doc['score']} points\n"
+        text += f"📚 **Total Study Sessions:** {sessions}\n"
+        text += f"⏱️ **Total Study Time:** {get_readable_time(minutes * 60)}\n"
+        text += f"📈 **Average Session:** {get_readable_time(int(average * 60))}\n"
+        text += f"📥 **Downloads:** {doc['total_downloads']}\n"
+        text += f"🧪 **Chapters Studied:** {len(doc['subjects'])}\n"
+        text += f"🎯 **Current Streak:** {doc['streak']} days (best {doc['best_streak']})\n"
+        text += f"🏅 **Achievements:** {len(titles)}"
+        if titles:
+            text += "\n" + "\n".join(f"• {title}" for title in titles)
+
+        if doc['recent']:
+            text += "\n\n📝 **Recent Activity:**\n"
+            for i, session in enumerate(doc['recent'], 1):
+                ended_at = session.get('ended_at')
+                date = ended_at.strftime('%d %b %Y') if isinstance(ended_at, datetime) else ''
+                text += f"{i}. {get_readable_time(session.get('duration', 0) * 60)} {session.get('subject') or ''} - {date}\n"
+        return text
+
+    async def get_summary(self, user_id: int) -> Optional[str]:
+        """Return the rendered progress summary, reusing it until the next event"""
+        user_id = int(user_id)
+        summary = self._summaries.get(user_id)
+        if summary is not None:
+            return summary
+        try:
+            doc = await self._get(user_id)
+        except Exception as e:
+            logger.error(f"Error loading progress for {user_id}: {e}")
+            return None
+        if not doc['total_sessions'] and not doc['total_downloads']:
+            return None
+        summary = self._summaries[user_id] = self._render(doc)
+        return summary
+
+    async def get_progress(self, user_id: int) -> Dict:
+        """Return a copy of the user's aggregates"""
+        return dict(await self._get(int(user_id)))
+
+    def forget(self, user_id: int):
+        """Drop cached state for a user, e.g. after the user was deleted"""
+        self._docs.pop(int(user_id), None)
+        self._summaries.pop(int(user_id), None)
+
+
+# Create global progress tracker instance
+try:
+    progress_tracker = ProgressTracker(study_db.user_progress, study_db.users) if study_db is not None else None
+except Exception as e:
+    print(f"Warning: Could not initialize progress tracker: {e}")
+    progress_tracker = None
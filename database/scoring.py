@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+
+# Try to import numpy with error handling
+try:
+    import numpy as np
+except ImportError as e:
+    print(f"Warning: Could not import numpy in scoring.py: {e}")
+    np = None
+
+# Try to import pymongo with error handling
+try:
+    from pymongo import UpdateOne
+except ImportError:
+    UpdateOne = None
+
+try:
+    from config import SCORING_BATCH_SIZE
+except ImportError:
+    # Fallback configuration values
+    SCORING_BATCH_SIZE = 5000
+
+from database.progress import progress_tracker
+from utils import ACHIEVEMENTS, STUDY_LEVELS, SCORE_WEIGHTS, ACTIVE_BONUS
+
+logger = logging.getLogger(__name__)
+
+# Column order of the metric matrix, matching the metric names used in ACHIEVEMENTS
+METRICS = ['total_time_spent', 'total_downloads', 'subjects']
+
+
+def score_batch(metrics: "np.ndarray", active: "np.ndarray"):
+    """Compute scores, level indexes and achievement masks for a batch of users"""
+    # metrics is an (n, 3) matrix in METRICS order, active flags users seen in the last 7 days
+    weights = np.array([SCORE_WEIGHTS[metric] for metric in METRICS], dtype=np.int64)
+    scores = metrics @ weights + active.astype(np.int64) * ACTIVE_BONUS
+
+    minimums = np.array([minimum for minimum, _ in STUDY_LEVELS[1:]], dtype=np.int64)
+    levels = np.searchsorted(minimums, scores, side='right')
+
+    columns = np.array([METRICS.index(metric) for metric, _, _ in ACHIEVEMENTS])
+    thresholds = np.array([threshold for _, threshold, _ in ACHIEVEMENTS], dtype=np.int64)
+    bits = np.left_shift(np.int64(1), np.arange(len(ACHIEVEMENTS), dtype=np.int64))
+    unlocked = metrics[:, columns] >= thresholds
+    masks = (unlocked * bits).sum(axis=1)
+
+    return scores, levels, masks
+
+
+def _timestamp(value) -> float:
+    """POSIX timestamp of a stored datetime, treating naive values as UTC"""
+    if not isinstance(value, datetime):
+        return 0.0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+async def _load_batch(collection, last_id, batch_size: int):
+    """Load the next batch of progress documents with the fields needed for scoring"""
+    match = {} if last_id is None else {'_id': {'$gt': last_id}}
+    pipeline = [
+        {'$match': match},
+        {'$sort': {'_id': 1}},
+        {'$limit': batch_size},
+        {'$project': {
+            'total_time_spent': {'$ifNull': ['$total_time_spent', 0]},
+            'total_downloads': {'$ifNull': ['$total_downloads', 0]},
+            'subjects': {'$size': {'$ifNull': ['$subjects', []]}},
+            'last_study_day': 1,
+            'score': {'$ifNull': ['$score', 0]},
+            'level': {'$ifNull': ['$level', '']},
+            'achievements': {'$ifNull': ['$achievements', 0]}
+        }}
+    ]
+    return await collection.aggregate(pipeline).to_list(length=batch_size)
+
+
+async def recompute_scores(batch_size: int = None) -> Dict:
+    """Recompute scores, levels and achievements for all users, writing only changes"""
+    if np is None or UpdateOne is None:
+        logger.warning("numpy/pymongo not available - cannot recompute scores")
+        return {}
+    if progress_tracker is None:
+        logger.warning("Progress tracker not available - cannot recompute scores")
+        return {}
+
+    # user_progress is the only store of scores; the tracker updates it live and this pass re-derives it in bulk
+    collection = progress_tracker.col
+    batch_size = batch_size or SCORING_BATCH_SIZE
+    level_names = np.array([name for _, name in STUDY_LEVELS], dtype=object)
+    active_cutoff = datetime.now(timezone.utc) - timedelta(days=7)
+    summary = {'users': 0, 'updated': 0, 'new_achievements': 0}
+    last_id = None
+
+    while True:
+        users = await _load_batch(collection, last_id, batch_size)
+        if not users:
+            break
+        last_id = users[-1]['_id']
+
+        ids = np.array([u['_id'] for u in users], dtype=np.int64)
+        metrics = np.array([
+            [u['total_time_spent'], u['total_downloads'], u['subjects']]
+            for u in users
+        ], dtype=np.int64)
+        last_active = np.array([_timestamp(u.get('last_study_day')) for u in users])
+        # last_study_day is truncated to the day, so compare against the start of the cutoff day
+        active = last_active >= active_cutoff.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+        scores, levels, masks = score_batch(metrics, active)
+        names = level_names[levels]
+
+        old_scores = np.array([u['score'] for u in users], dtype=np.int64)
+        old_masks = np.array([u['achievements'] for u in users], dtype=np.int64)
+        old_levels = np.array([u['level'] for u in users], dtype=object)
+
+        # Achievements stay unlocked once earned, as in the live tracker
+        masks = masks | old_masks
+        changed = (scores != old_scores) | (masks != old_masks) | (names != old_levels)
+        newly_unlocked = masks & ~old_masks
+
+        operations = [
+            UpdateOne({'_id': int(ids[i])}, {'$set': {
+                'score': int(scores[i]),
+                'level': names[i],
+                'achievements': int(masks[i])
+            }})
+            for i in np.flatnonzero(changed)
+        ]
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+            # Cached documents would overwrite the new values on their next save
+            for i in np.flatnonzero(changed):
+                progress_tracker.forget(int(ids[i]))
+
+        summary['users'] += len(users)
+        summary['updated'] += len(operations)
+        summary['new_achievements'] += sum(bin(int(mask)).count("1") for mask in newly_unlocked[newly_unlocked > 0])
+
+        if len(users) < batch_size:
+            break
+        # Yield to handlers between batches
+        await asyncio.sleep(0)
+
+    logger.info(f"Score recompute finished: {summary}")
+    return summary
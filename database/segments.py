@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import re
+import zlib
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+try:
+    from config import SEGMENT_REFRESH_INTERVAL, SEGMENT_REBUILD_INTERVAL, BROADCAST_CURSOR_BATCH
+except ImportError:
+    # Fallback configuration values
+    SEGMENT_REFRESH_INTERVAL = 600
+    SEGMENT_REBUILD_INTERVAL = 86400
+    BROADCAST_CURSOR_BATCH = 1000
+
+from database.study_db import db as study_db
+
+logger = logging.getLogger(__name__)
+
+# Reachable users; broadcasts mark dead recipients is_active=False
+ACTIVE_USERS = {"is_active": {"$ne": False}}
+
+# Built-in segments. "query" segments are re-read in full through an index on every refresh,
+# "window_days" segments track last_active incrementally
+SEGMENTS = {
+    "premium": {"collection": "users", "query": {"is_premium": True}},
+    "active_7d": {"collection": "users", "window_days": 7},
+    "active_30d": {"collection": "users", "window_days": 30},
+}
+
+# Dynamic segments named "batch:<batch name>" come from user_progress, whose chapter keys start with the batch
+BATCH_PREFIX = "batch:"
+
+
+def encode_ids(ids: Iterable[int]) -> bytes:
+    """Compress sorted ids as zlib'd zigzag varint deltas"""
+    out = bytearray()
+    previous = 0
+    for value in ids:
+        delta = value - previous
+        previous = value
+        zigzag = delta << 1 if delta >= 0 else ((-delta) << 1) - 1
+        while zigzag >= 0x80:
+            out.append((zigzag & 0x7F) | 0x80)
+            zigzag >>= 7
+        out.append(zigzag)
+    return zlib.compress(bytes(out))
+
+
+def decode_ids(blob: bytes) -> List[int]:
+    """Inverse of encode_ids"""
+    ids = []
+    previous = shift = zigzag = 0
+    for byte in zlib.decompress(blob) if blob else b"":
+        zigzag |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += zigzag >> 1 if not zigzag & 1 else -((zigzag + 1) >> 1)
+        ids.append(previous)
+        shift = zigzag = 0
+    return ids
+
+
+def _utc(value: datetime) -> datetime:
+    """MongoDB returns naive UTC datetimes"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+class AudienceSegments:
+    """Named recipient sets stored as compressed sorted id arrays and refreshed incrementally"""
+
+    def __init__(self, database, refresh_interval: float = SEGMENT_REFRESH_INTERVAL,
+                 rebuild_interval: float = SEGMENT_REBUILD_INTERVAL, batch_size: int = BROADCAST_CURSOR_BATCH):
+        self.db = database
+        self.col = database.segments
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.batch_size = batch_size
+        # name -> stored segment document
+        self._state: Dict[str, Dict] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self):
+        """Index the fields segment queries filter on"""
+        try:
+            await self.db.users.create_index([("last_active", 1)])
+            await self.db.user_progress.create_index([("subjects", 1)])
+            await self.db.user_progress.create_index([("updated_at", 1)])
+        except Exception as e:
+            logger.error(f"Error creating segment indexes: {e}")
+
+    @staticmethod
+    def _spec(name: str) -> Optional[Dict]:
+        """Definition of a segment, or None for unknown names"""
+        if name in SEGMENTS:
+            return SEGMENTS[name]
+        if name.startswith(BATCH_PREFIX) and len(name) > len(BATCH_PREFIX):
+            batch_name = name[len(BATCH_PREFIX):].replace('.', '_')
+            return {
+                "collection": "user_progress",
+                "query": {"subjects": {"$regex": f"^{re.escape(batch_name)}:"}},
+                # Chapters are only ever added to a user's progress, so members never leave
+                "since_field": "updated_at"
+            }
+        return None
+
+    async def _ids(self, collection: str, query: Dict) -> List[int]:
+        """Matching _ids in ascending order, reading only the _id field"""
+        cursor = getattr(self.db, collection).find(query, {"_id": 1}).sort("_id", 1).batch_size(self.batch_size)
+        return [doc["_id"] async for doc in cursor]
+
+    async def _load(self, name: str) -> Optional[Dict]:
+        """Cached segment document, loading it from MongoDB on first use"""
+        state = self._state.get(name)
+        if state is None:
+            state = await self.col.find_one({"_id": name})
+            if state:
+                state["refreshed_at"] = _utc(state["refreshed_at"])
+                state["rebuilt_at"] = _utc(state["rebuilt_at"])
+                self._state[name] = state
+        return state
+
+    async def refresh(self, name: str, rebuild: bool = False) -> Optional[Dict]:
+        """Bring a segment up to date, applying only changes since its last refresh where possible"""
+        spec = self._spec(name)
+        if spec is None:
+            return None
+
+        async with self._locks.setdefault(name, asyncio.Lock()):
+            state = await self._load(name)
+            now = datetime.now(timezone.utc)
+            incremental = "window_days" in spec or "since_field" in spec
+            if (rebuild or not incremental or state is None
+                    or (now - state["rebuilt_at"]).total_seconds() >= self.rebuild_interval):
+                if "window_days" in spec:
+                    query = {"last_active": {"$gte": now - timedelta(days=spec["window_days"])}}
+                else:
+                    query = dict(spec["query"])
+                if spec["collection"] == "users":
+                    query.update(ACTIVE_USERS)
+                ids = await self._ids(spec["collection"], query)
+                rebuilt_at = now
+            else:
+                since = state["refreshed_at"]
+                members = set(decode_ids(state["ids"]))
+                if "window_days" in spec:
+                    window = timedelta(days=spec["window_days"])
+                    # last_active only moves forward, so users whose last activity fell out of the window leave
+                    left = await self._ids(spec["collection"], {"last_active": {"$gte": since - window, "$lt": now - window}})
+                    members.difference_update(left)
+                    joined = await self._ids(spec["collection"], {"last_active": {"$gte": since}, **ACTIVE_USERS})
+                else:
+                    joined = await self._ids(spec["collection"], {**spec["query"], spec["since_field"]: {"$gte": since}})
+                members.update(joined)
+                ids = sorted(members)
+                rebuilt_at = state["rebuilt_at"]
+
+            state = {
+                "_id": name,
+                "ids": encode_ids(ids),
+                "count": len(ids),
+                "refreshed_at": now,
+                "rebuilt_at": rebuilt_at
+            }
+            await self.col.replace_one({"_id": name}, state, upsert=True)
+            self._state[name] = state
+            return state
+
+    async def get(self, name: str) -> Optional[Dict]:
+        """Segment document, refreshed first if it is older than the refresh interval"""
+        try:
+            state = await self._load(name)
+            if state is None or (datetime.now(timezone.utc) - state["refreshed_at"]).total_seconds() >= self.refresh_interval:
+                state = await self.refresh(name)
+            return state
+        except Exception as e:
+            logger.error(f"Error loading segment {name}: {e}")
+            return None
+
+    async def size(self, name: str) -> Optional[int]:
+        """Number of members, or None for unknown segments"""
+        state = await self.get(name)
+        return state["count"] if state else None
+
+    async def members(self, name: str, after: int = None) -> List[int]:
+        """Sorted member ids, optionally only those above a resume position"""
+        state = await self.get(name)
+        if not state:
+            return []
+        ids = decode_ids(state["ids"])
+        return ids if after is None else ids[bisect_right(ids, after):]
+
+    async def names(self) -> List[str]:
+        """Built-in segments followed by every batch segment used so far"""
+        stored = await self.col.find({"_id": {"$regex": f"^{BATCH_PREFIX}"}}, {"_id": 1}).to_list(length=None)
+        return list(SEGMENTS) + sorted(doc["_id"] for doc in stored)
+
+    async def _refresh_loop(self):
+        """Keep every known segment fresh so broadcasts start from a ready id list"""
+        await self.ensure_indexes()
+        while True:
+            try:
+                for name in await self.names():
+                    await self.refresh(name)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error refreshing segments: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        """Start the background segment refresher"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self._refresh_loop())
+
+    async def stop(self):
+        """Stop the background segment refresher"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Create global audience segments instance
+try:
+    audience_segments = AudienceSegments(study_db) if study_db is not None else None
+except Exception as e:
+    print(f"Warning: Could not initialize audience segments: {e}")
+    audience_segments = None
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import math
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Hashable, List, Optional
+
+try:
+    from config import SESSION_IDLE_TIMEOUT, SESSION_WHEEL_TICK, SESSION_WHEEL_SLOTS
+except ImportError:
+    # Fallback configuration values
+    SESSION_IDLE_TIMEOUT = 900
+    SESSION_WHEEL_TICK = 5
+    SESSION_WHEEL_SLOTS = 512
+
+from database.study_db import StudySessions
+from database.counters import counters
+from database.progress import progress_tracker
+from database.topdb import topdb
+from utils import temp
+
+logger = logging.getLogger(__name__)
+
+
+class TimerWheel:
+    """Hashed timer wheel: O(1) schedule and cancel, one tick walks a single slot"""
+
+    def __init__(self, slots: int = 512, tick: float = 1.0):
+        self.tick = tick
+        # slot -> key -> remaining full rotations before the timer fires
+        self.slots: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        self.cursor = 0
+        self._where: Dict[Hashable, int] = {}
+
+    def schedule(self, key: Hashable, delay: float):
+        """Fire key after roughly delay seconds, replacing any earlier timer"""
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self.cursor + ticks) % len(self.slots)
+        self.slots[slot][key] = (ticks - 1) // len(self.slots)
+        self._where[key] = slot
+
+    def cancel(self, key: Hashable):
+        """Remove a pending timer"""
+        slot = self._where.pop(key, None)
+        if slot is not None:
+            self.slots[slot].pop(key, None)
+
+    def advance(self) -> List[Hashable]:
+        """Move one tick forward and return the keys whose timers fired"""
+        self.cursor = (self.cursor + 1) % len(self.slots)
+        bucket = self.slots[self.cursor]
+        expired = []
+        for key, rounds in bucket.items():
+            if rounds:
+                bucket[key] = rounds - 1
+            else:
+                expired.append(key)
+        for key in expired:
+            del bucket[key]
+            del self._where[key]
+        return expired
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+
+class SessionTracker:
+    """Opens study sessions on content selection and closes them after an idle timeout"""
+
+    def __init__(self, sessions: Dict, idle_timeout: float = SESSION_IDLE_TIMEOUT,
+                 tick: float = SESSION_WHEEL_TICK, slots: int = SESSION_WHEEL_SLOTS):
+        self.idle_timeout = idle_timeout
+        # user_id -> open session, shared with temp.USER_SESSIONS
+        self.sessions = sessions
+        self.wheel = TimerWheel(slots, tick)
+        self._task: Optional[asyncio.Task] = None
+
+    def begin(self, user_id: int, batch_name: str, subject: str, chapter: str = None):
+        """Open a session for a content selection, or heartbeat if it is the same chapter"""
+        now = datetime.now(timezone.utc)
+        session = self.sessions.get(user_id)
+        if session and (session['batch_name'], session['subject'], session['chapter_no']) == (batch_name, subject, chapter):
+            session['last_seen'] = now
+            return
+
+        if session:
+            self._spawn(self._close(user_id))
+        self.sessions[user_id] = {
+            'batch_name': batch_name,
+            'subject': subject,
+            'chapter_no': chapter,
+            'start_time': now,
+            'last_seen': now
+        }
+        self.wheel.schedule(user_id, self.idle_timeout)
+
+    def heartbeat(self, user_id: int):
+        """Keep an open session alive; the wheel entry is only moved when it fires"""
+        session = self.sessions.get(user_id)
+        if session:
+            session['last_seen'] = datetime.now(timezone.utc)
+
+    @staticmethod
+    def _spawn(coroutines: List):
+        """Run follow-up updates in the background"""
+        loop = asyncio.get_event_loop()
+        for coroutine in coroutines:
+            loop.create_task(coroutine)
+
+    def end(self, user_id: int):
+        """Close a user's open session now"""
+        self._spawn(self._close(user_id))
+
+    def _close(self, user_id: int) -> List:
+        """Close a session at its last activity, returning the progress and stats updates to run"""
+        self.wheel.cancel(user_id)
+        session = self.sessions.pop(user_id, None)
+        if not session:
+            return []
+
+        duration = int((session['last_seen'] - session['start_time']).total_seconds() // 60)
+        counters.insert(StudySessions.collection, {
+            '_id': uuid.uuid4().hex,
+            'user_id': user_id,
+            'batch_name': session['batch_name'],
+            'subject': session['subject'],
+            'chapter_no': session['chapter_no'],
+            'start_time': session['start_time'],
+            'end_time': session['last_seen'],
+            'duration_minutes': duration
+        })
+
+        updates = []
+        if progress_tracker:
+            updates.append(progress_tracker.record_session(
+                user_id, duration, session['last_seen'],
+                session['batch_name'], session['subject'], session['chapter_no']
+            ))
+        if topdb and duration:
+            updates.append(topdb.update_study_stats(
+                user_id, session['subject'], session['chapter_no'], duration, "session"
+            ))
+        return updates
+
+    def _expire(self, user_id: int):
+        """Close an idle session, or reschedule it if it saw activity since it was armed"""
+        session = self.sessions.get(user_id)
+        if not session:
+            return
+        idle = (datetime.now(timezone.utc) - session['last_seen']).total_seconds()
+        if idle >= self.idle_timeout:
+            self._spawn(self._close(user_id))
+        else:
+            self.wheel.schedule(user_id, self.idle_timeout - idle)
+
+    async def _tick_loop(self):
+        """Advance the wheel in real time, catching up on ticks missed under load"""
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(self.wheel.tick)
+            now = time.monotonic()
+            ticks = int((now - last) / self.wheel.tick)
+            last += ticks * self.wheel.tick
+            for _ in range(ticks):
+                for user_id in self.wheel.advance():
+                    try:
+                        self._expire(user_id)
+                    except Exception as e:
+                        logger.error(f"Error closing study session for {user_id}: {e}")
+
+    @property
+    def open_sessions(self) -> int:
+        """Number of sessions currently open"""
+        return len(self.sessions)
+
+    def start(self):
+        """Start the background idle detection task"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self._tick_loop())
+
+    async def stop(self):
+        """Stop idle detection and close every open session"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        updates = []
+        for user_id in list(self.sessions):
+            updates.extend(self._close(user_id))
+        # Finish progress and stats updates before the counter buffer's final flush
+        await asyncio.gather(*updates, return_exceptions=True)
+
+
+# Create global session tracker instance
+session_tracker = SessionTracker(temp.USER_SESSIONS)
@@ -0,0 +1,57 @@
+import hashlib
+import logging
+import math
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter with mergeable byte registers"""
+
+    def __init__(self, precision: int = 14, registers: bytes = None):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers else bytearray(self.m)
+        if len(self.registers) != self.m:
+            raise ValueError("Register size does not match precision")
+
+    @staticmethod
+    def _hash(value) -> int:
+        """64-bit hash of a value"""
+        return int.from_bytes(hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest(), "big")
+
+    def add(self, value):
+        """Add a value to the sketch"""
+        x = self._hash(value)
+        index = x >> (64 - self.p)
+        remaining = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        """Merge another sketch of the same precision into this one"""
+        if other.p != self.p:
+            raise ValueError("Cannot merge sketches with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        """Estimate the number of distinct values added"""
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # Linear counting is more accurate for small cardinalities
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        """Serialize registers as a compressed blob"""
+        return zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data: bytes, precision: int = 14) -> "HyperLogLog":
+        """Load a sketch from a compressed blob"""
+        return cls(precision, zlib.decompress(data))
@@ -97,6 +97,9 @@ if instance:
         file_type = fields.StringField(allow_none=True)
         mime_type = fields.StringField(allow_none=True)
         caption = fields.StringField(allow_none=True)
+        # Message the file was uploaded in, used to copy it or refresh an expired file reference
+        chat_id = fields.IntegerField(allow_none=True)
+        message_id = fields.IntegerField(allow_none=True)
         
         # Study specific fields
         batch_name = fields.StringField(required=True)
@@ -167,6 +170,11 @@ if instance:
         premium_expires = fields.DateTimeField(allow_none=True)
         joined_at = fields.DateTimeField(default_factory=lambda: datetime.now(timezone.utc))
         last_active = fields.DateTimeField(default_factory=lambda: datetime.now(timezone.utc))
+        total_downloads = fields.IntegerField(default_factory=lambda: 0)
+        total_time_spent = fields.IntegerField(default_factory=lambda: 0)
+        study_progress = fields.DictField(default_factory=dict)
+        is_active = fields.BooleanField(default_factory=lambda: True)
+        inactive_reason = fields.StringField(allow_none=True)
         
         class Meta:
             indexes = [("username",), ("is_premium",)]
@@ -226,9 +234,11 @@ if instance:
         username = fields.StringField(allow_none=True)
         first_name = fields.StringField(allow_none=True)
         batch_name = fields.StringField(required=True)
-        status = fields.StringField(default_factory=lambda: "pending", choices=["pending", "approved", "rejected"])
+        status = fields.StringField(default_factory=lambda: "pending", choices=["pending", "approved", "declined"])
         requested_at = fields.DateTimeField(default_factory=lambda: datetime.now(timezone.utc))
         processed_at = fields.DateTimeField(allow_none=True)
+        # Set when the request is approved or declined; the TTL index expires resolved requests from here
+        resolved_at = fields.DateTimeField(allow_none=True)
         processed_by = fields.IntegerField(allow_none=True)
         
         class Meta:
@@ -290,7 +300,7 @@ else:
 # Database utility functions
 async def save_study_file(media, batch_name, subject, teacher=None, 
                          chapter_no=None, chapter_name=None, lecture_no=None, 
-                         content_type="NOTES", tags=None, uploaded_by=None):
+                         content_type="NOTES", tags=None, uploaded_by=None, chat_id=None, message_id=None):
     """Save study file in database"""
     if not instance:
         logger.warning("Database not initialized - cannot save file")
@@ -312,6 +322,8 @@ async def save_study_file(media, batch_name, subject, teacher=None,
             file_type=file_type,
             mime_type=mime_type,
             caption=caption,
+            chat_id=chat_id,
+            message_id=message_id,
             batch_name=batch_name,
             subject=subject,
             teacher=teacher,
@@ -400,8 +412,8 @@ async def init_db():
         return False
 
 # Additional utility functions for plugins
-async def get_study_files(limit=10, skip=0, batch_name=None, subject=None, content_type=None):
-    """Get study files with optional filtering"""
+async def get_study_files(limit=10, skip=0, batch_name=None, subject=None, content_type=None, teacher=None, chapter_no=None):
+    """Get study files with optional filtering, every match when limit is None"""
     if not instance:
         logger.warning("Database not initialized - cannot get study files")
         return []
@@ -414,8 +426,15 @@ async def get_study_files(limit=10, skip=0, batch_name=None, subject=None, conte
             filter_query["subject"] = subject
         if content_type:
             filter_query["content_type"] = content_type
+        if teacher:
+            filter_query["teacher"] = teacher
+        if chapter_no:
+            filter_query["chapter_no"] = chapter_no
             
-        files = await StudyFiles.find(filter_query).skip(skip).limit(limit).to_list(length=limit)
+        cursor = StudyFiles.find(filter_query).skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        files = await cursor.to_list(length=limit)
         return files
     except Exception as e:
         logger.error(f"Error getting study files: {e}")
@@ -445,6 +464,38 @@ async def search_study_files(query, limit=10, skip=0, batch_name=None, subject=N
         logger.error(f"Error searching study files: {e}")
         return []
 
+async def get_unsourced_study_files():
+    """Map (file_name, file_size) to the ids of study files that do not know their source message"""
+    if not instance:
+        logger.warning("Database not initialized - cannot get study files")
+        return {}
+        
+    try:
+        unsourced = {}
+        cursor = StudyFiles.collection.find({"chat_id": None}, {"file_name": 1, "file_size": 1})
+        async for doc in cursor:
+            unsourced.setdefault((doc.get("file_name"), doc.get("file_size")), []).append(doc["_id"])
+        return unsourced
+    except Exception as e:
+        logger.error(f"Error getting unsourced study files: {e}")
+        return {}
+
+async def set_study_file_source(doc_ids, chat_id, message_id):
+    """Record the message study files can be copied and refreshed from"""
+    if not instance:
+        logger.warning("Database not initialized - cannot update study files")
+        return 0
+        
+    try:
+        result = await StudyFiles.collection.update_many(
+            {"_id": {"$in": doc_ids}},
+            {"$set": {"chat_id": chat_id, "message_id": message_id}}
+        )
+        return result.modified_count
+    except Exception as e:
+        logger.error(f"Error setting study file source: {e}")
+        return 0
+
 async def get_batch_info(batch_name):
     """Get batch information"""
     if not instance:
@@ -1,3 +1,5 @@
+import asyncio
+import hashlib
 import logging
 from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Any
@@ -9,6 +11,35 @@ except ImportError as e:
     print(f"Warning: Could not import motor in topdb.py: {e}")
     AsyncIOMotorClient = None
 
+from database.maintenance import ensure_ttl_index, delete_in_chunks
+from database.counters import counters
+from database.sketches import HyperLogLog
+from database.leaderboard import RollingLeaderboard
+
+try:
+    from config import ANALYTICS_TTL_DAYS
+except ImportError:
+    ANALYTICS_TTL_DAYS = 90
+
+try:
+    from config import ROLLUP_INTERVAL, RAW_STATS_RETENTION_DAYS
+except ImportError:
+    ROLLUP_INTERVAL = 900
+    RAW_STATS_RETENTION_DAYS = 0
+
+try:
+    from bson import Binary
+except ImportError:
+    Binary = bytes
+
+try:
+    from pymongo import UpdateOne
+except ImportError:
+    UpdateOne = None
+
+# HyperLogLog precision: 2^14 registers, about 0.8% standard error
+HLL_PRECISION = 14
+
 logger = logging.getLogger(__name__)
 
 class Database:
@@ -36,26 +67,42 @@ class Database:
             
         # Collections
         self.col = self.db.top_messages
+        self.message_counts = self.db.top_message_counts
         self.stats = self.db.stats
         self.analytics = self.db.analytics
         self.leaderboard = self.db.leaderboard
+        
+        self.distinct_users = self.db.distinct_users
+        self.stats_hourly = self.db.stats_hourly
+        self.stats_daily = self.db.stats_daily
+        self.analytics_daily = self.db.analytics_daily
+        self.rollup_state = self.db.rollup_state
+        
+        # Daily, weekly and 30-day leaderboards, rebuilt from rollups on startup
+        self.board = RollingLeaderboard((1, 7, 30))
+        self.board_loaded = False
+        
+        # (subject, chapter, content_type, day) -> HyperLogLog not yet saved
+        self._pending_sketches = {}
+        counters.add_flush_hook(self.flush_distinct_users)
+
+    @staticmethod
+    def _message_hash(message_text):
+        """Stable key for a message text"""
+        return hashlib.sha1(message_text.strip().encode("utf-8")).hexdigest()
 
     async def update_top_messages(self, user_id, message_text):
-        """Update top messages for user"""
+        """Count a message in the flat counts collection with a single upsert"""
         try:
-            user = await self.col.find_one({"user_id": user_id, "messages.text": message_text})
-            
-            if not user:
-                await self.col.update_one(
-                    {"user_id": user_id},
-                    {"$push": {"messages": {"text": message_text, "count": 1}}},
-                    upsert=True
-                )
-            else:
-                await self.col.update_one(
-                    {"user_id": user_id, "messages.text": message_text},
-                    {"$inc": {"messages.$.count": 1}}
-                )
+            message_text = message_text.strip()
+            if not message_text:
+                return False
+            
+            await self.message_counts.update_one(
+                {"_id": self._message_hash(message_text)},
+                {"$inc": {"count": 1}, "$setOnInsert": {"text": message_text}},
+                upsert=True
+            )
             return True
         except Exception as e:
             logger.error(f"Error updating top messages: {e}")
@@ -64,22 +111,56 @@ class Database:
     async def get_top_messages(self, limit=30):
         """Get top messages by count"""
         try:
-            pipeline = [
-                {"$unwind": "$messages"},
-                {"$group": {"_id": "$messages.text", "count": {"$sum": "$messages.count"}}},
-                {"$sort": {"count": -1}},
-                {"$limit": limit}
-            ]
-            results = await self.col.aggregate(pipeline).to_list(limit)
-            return [result['_id'] for result in results]
+            cursor = self.message_counts.find({}, {"text": 1}).sort("count", -1).limit(limit)
+            return [doc["text"] async for doc in cursor]
         except Exception as e:
             logger.error(f"Error getting top messages: {e}")
             return []
+
+    async def load_top_messages(self):
+        """Copy counts from the old per-user messages arrays if the flat collection is still empty"""
+        try:
+            if UpdateOne is None or await self.message_counts.find_one({}):
+                return True
+            migrated = await self._backfill_top_messages()
+            logger.info(f"Backfilled {migrated} top message counts from top_messages")
+            return True
+        except Exception as e:
+            logger.error(f"Error backfilling top message counts: {e}")
+            return False
+
+    async def _backfill_top_messages(self, batch_size=1000):
+        """Sum each text's count across all users and upsert it by hash in batches"""
+        pipeline = [
+            {"$unwind": "$messages"},
+            {"$group": {"_id": "$messages.text", "count": {"$sum": "$messages.count"}}}
+        ]
+        migrated = 0
+        operations = []
+        async for doc in self.col.aggregate(pipeline, allowDiskUse=True):
+            text = (doc["_id"] or "").strip()
+            if not text:
+                continue
+            # Texts that only differ in surrounding whitespace share a hash, so add rather than set
+            operations.append(UpdateOne(
+                {"_id": self._message_hash(text)},
+                {"$inc": {"count": doc["count"]}, "$setOnInsert": {"text": text}},
+                upsert=True
+            ))
+            if len(operations) >= batch_size:
+                await self.message_counts.bulk_write(operations, ordered=False)
+                migrated += len(operations)
+                operations = []
+        if operations:
+            await self.message_counts.bulk_write(operations, ordered=False)
+            migrated += len(operations)
+        return migrated
     
     async def delete_all_messages(self):
         """Delete all messages"""
         try:
             await self.col.delete_many({})
+            await self.message_counts.delete_many({})
             return True
         except Exception as e:
             logger.error(f"Error deleting all messages: {e}")
@@ -97,7 +178,10 @@ class Database:
                 "timestamp": datetime.utcnow()
             }
             
-            await self.stats.insert_one(stats_data)
+            # Written in bulk by the counter buffer
+            counters.insert(self.stats, stats_data)
+            self._track_distinct_user(user_id, subject, chapter, content_type, stats_data["timestamp"])
+            self._track_leaderboard(user_id, duration, stats_data["timestamp"])
             return True
         except Exception as e:
             logger.error(f"Error updating study stats: {e}")
@@ -106,50 +190,218 @@ class Database:
     async def get_user_study_stats(self, user_id, days=30):
         """Get user study statistics for specified days"""
         try:
-            cutoff_date = datetime.utcnow() - timedelta(days=days)
+            cutoff_day = self._truncate(datetime.utcnow() - timedelta(days=days), "day")
             
+            # Read the daily rollups instead of scanning raw events
             pipeline = [
-                {"$match": {"user_id": user_id, "timestamp": {"$gte": cutoff_date}}},
+                {"$match": {"user_id": user_id, "day": {"$gte": cutoff_day}}},
                 {"$group": {
                     "_id": {
                         "subject": "$subject",
                         "chapter": "$chapter",
                         "content_type": "$content_type"
                     },
-                    "total_duration": {"$sum": "$duration"},
-                    "count": {"$sum": 1}
+                    "total_duration": {"$sum": "$total_duration"},
+                    "count": {"$sum": "$count"}
                 }},
                 {"$sort": {"total_duration": -1}}
             ]
             
-            results = await self.stats.aggregate(pipeline).to_list(length=None)
+            results = await self.stats_daily.aggregate(pipeline).to_list(length=None)
             return results
         except Exception as e:
             logger.error(f"Error getting user study stats: {e}")
             return []
 
+    async def load_leaderboard(self):
+        """Rebuild the in-memory leaderboards from the daily per-user rollups"""
+        try:
+            self.board.clear()
+            cutoff_day = (datetime.utcnow() - timedelta(days=self.board.windows[-1])).replace(
+                hour=0, minute=0, second=0, microsecond=0
+            )
+            if not await self.leaderboard.find_one({}):
+                await self._backfill_leaderboard(cutoff_day)
+            
+            cursor = self.leaderboard.find({"day": {"$gt": cutoff_day}})
+            async for doc in cursor:
+                self.board.add(doc["user_id"], doc.get("total_duration", 0), doc["day"], doc.get("total_sessions", 0))
+            self.board_loaded = True
+            logger.info(f"Leaderboard loaded with {self.board.size(self.board.windows[-1])} students")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading leaderboard: {e}")
+            return False
+
+    async def _backfill_leaderboard(self, cutoff_day):
+        """Build daily per-user rollups from raw stats, used once when none exist yet"""
+        day_expr = {"$dateFromString": {"dateString": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}}}
+        pipeline = [
+            {"$match": {"timestamp": {"$gt": cutoff_day}}},
+            {"$group": {
+                "_id": {"user_id": "$user_id", "day": day_expr},
+                "total_duration": {"$sum": "$duration"},
+                "total_sessions": {"$sum": 1}
+            }},
+            {"$project": {
+                "_id": {"$concat": [
+                    {"$toString": "$_id.user_id"}, ":",
+                    {"$dateToString": {"format": "%Y%m%d", "date": "$_id.day"}}
+                ]},
+                "user_id": "$_id.user_id",
+                "day": "$_id.day",
+                "total_duration": 1,
+                "total_sessions": 1
+            }},
+            {"$merge": {"into": self.leaderboard.name, "whenMatched": "replace"}}
+        ]
+        await self.stats.aggregate(pipeline).to_list(length=None)
+
     async def get_top_students(self, limit=10, days=30):
         """Get top students by study time"""
         try:
+            if self.board_loaded and days in self.board.windows:
+                return self.board.top(days, limit)
+            
+            # Other windows are summed from the daily rollups
             cutoff_date = datetime.utcnow() - timedelta(days=days)
             
             pipeline = [
-                {"$match": {"timestamp": {"$gte": cutoff_date}}},
+                {"$match": {"day": {"$gte": cutoff_date.replace(hour=0, minute=0, second=0, microsecond=0)}}},
                 {"$group": {
                     "_id": "$user_id",
-                    "total_duration": {"$sum": "$duration"},
-                    "total_sessions": {"$sum": 1}
+                    "total_duration": {"$sum": "$total_duration"},
+                    "total_sessions": {"$sum": "$total_sessions"}
                 }},
                 {"$sort": {"total_duration": -1}},
                 {"$limit": limit}
             ]
             
-            results = await self.stats.aggregate(pipeline).to_list(length=limit)
+            results = await self.leaderboard.aggregate(pipeline).to_list(length=limit)
             return results
         except Exception as e:
             logger.error(f"Error getting top students: {e}")
             return []
 
+    def get_student_rank(self, user_id, days=30):
+        """Get a student's leaderboard rank for a daily, weekly or 30-day window"""
+        if not self.board_loaded or days not in self.board.windows:
+            return None
+        return self.board.rank(days, user_id)
+
+    def _track_leaderboard(self, user_id, duration, timestamp):
+        """Update the daily rollup and the in-memory leaderboards for a study event"""
+        day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+        counters.incr(
+            self.leaderboard,
+            f"{user_id}:{day:%Y%m%d}",
+            {"total_duration": duration or 0, "total_sessions": 1},
+            on_insert={"user_id": user_id, "day": day}
+        )
+        self.board.add(user_id, duration or 0, timestamp)
+
+    def _track_distinct_user(self, user_id, subject, chapter, content_type, timestamp):
+        """Add a user to the in-memory distinct-user sketch for its day"""
+        day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+        key = (subject, chapter, content_type, day)
+        sketch = self._pending_sketches.get(key)
+        if sketch is None:
+            sketch = self._pending_sketches[key] = HyperLogLog(HLL_PRECISION)
+        sketch.add(user_id)
+
+    async def flush_distinct_users(self):
+        """Merge pending distinct-user sketches into their stored daily blobs"""
+        pending, self._pending_sketches = self._pending_sketches, {}
+        for (subject, chapter, content_type, day), sketch in pending.items():
+            query = {"subject": subject, "chapter": chapter, "content_type": content_type, "day": day}
+            try:
+                stored = await self.distinct_users.find_one(query, {"registers": 1})
+                if stored:
+                    sketch.merge(HyperLogLog.from_bytes(stored["registers"], HLL_PRECISION))
+                await self.distinct_users.update_one(
+                    query,
+                    {"$set": {"registers": Binary(sketch.to_bytes()), "updated_at": datetime.utcnow()}},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.error(f"Error saving distinct users sketch for {subject}/{chapter}: {e}")
+                # Keep it for the next flush, merged with anything added since
+                key = (subject, chapter, content_type, day)
+                if key in self._pending_sketches:
+                    sketch.merge(self._pending_sketches[key])
+                self._pending_sketches[key] = sketch
+
+    async def load_distinct_users(self):
+        """Build the daily distinct-user sketches from raw stats if none were saved yet"""
+        try:
+            if await self.distinct_users.find_one({}):
+                return True
+            saved = await self._backfill_distinct_users()
+            logger.info(f"Backfilled {saved} distinct users sketches from study stats")
+            return True
+        except Exception as e:
+            logger.error(f"Error backfilling distinct users sketches: {e}")
+            return False
+
+    async def _backfill_distinct_users(self):
+        """Stream distinct (sketch key, user) pairs from raw stats in key order, saving one sketch per key"""
+        day_expr = {"$dateFromString": {"dateString": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}}}
+        pipeline = [
+            {"$group": {"_id": {
+                "subject": "$subject",
+                "chapter": "$chapter",
+                "content_type": "$content_type",
+                "day": day_expr,
+                "user_id": "$user_id"
+            }}},
+            {"$sort": {"_id.subject": 1, "_id.chapter": 1, "_id.content_type": 1, "_id.day": 1}}
+        ]
+        saved = 0
+        key = sketch = None
+        
+        async def save():
+            subject, chapter, content_type, day = key
+            await self.distinct_users.update_one(
+                {"subject": subject, "chapter": chapter, "content_type": content_type, "day": day},
+                {"$set": {"registers": Binary(sketch.to_bytes()), "updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+        
+        async for doc in self.stats.aggregate(pipeline, allowDiskUse=True):
+            group = doc["_id"]
+            doc_key = (group.get("subject"), group.get("chapter"), group.get("content_type"), group["day"])
+            if doc_key != key:
+                if sketch is not None:
+                    await save()
+                    saved += 1
+                key, sketch = doc_key, HyperLogLog(HLL_PRECISION)
+            sketch.add(group.get("user_id"))
+        if sketch is not None:
+            await save()
+            saved += 1
+        return saved
+
+    async def _merged_distinct_users(self, query, group_key, days):
+        """Merge stored and pending daily sketches over a window, grouped by group_key(doc)"""
+        cutoff_day = (datetime.utcnow() - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        merged = {}
+        
+        cursor = self.distinct_users.find({**query, "day": {"$gte": cutoff_day}})
+        async for doc in cursor:
+            sketch = HyperLogLog.from_bytes(doc["registers"], HLL_PRECISION)
+            key = group_key(doc)
+            merged[key] = merged[key].merge(sketch) if key in merged else sketch
+        
+        for (subject, chapter, content_type, day), sketch in self._pending_sketches.items():
+            doc = {"subject": subject, "chapter": chapter, "content_type": content_type, "day": day}
+            if day < cutoff_day or any(doc[field] != value for field, value in query.items()):
+                continue
+            key = group_key(doc)
+            copy = HyperLogLog(HLL_PRECISION, sketch.registers)
+            merged[key] = merged[key].merge(copy) if key in merged else copy
+        
+        return {key: sketch.count() for key, sketch in merged.items()}
+
     async def get_subject_stats(self, subject, days=30):
         """Get statistics for specific subject"""
         try:
@@ -160,18 +412,19 @@ class Database:
                 {"$group": {
                     "_id": "$chapter",
                     "total_duration": {"$sum": "$duration"},
-                    "total_sessions": {"$sum": 1},
-                    "unique_users": {"$addToSet": "$user_id"}
+                    "total_sessions": {"$sum": 1}
                 }},
                 {"$sort": {"total_duration": -1}}
             ]
             
             results = await self.stats.aggregate(pipeline).to_list(length=None)
             
-            # Calculate unique user count for each chapter
+            # Distinct users per chapter come from merged HyperLogLog sketches
+            unique_users = await self._merged_distinct_users(
+                {"subject": subject}, lambda doc: doc["chapter"], days
+            )
             for result in results:
-                result["unique_users_count"] = len(result["unique_users"])
-                del result["unique_users"]
+                result["unique_users_count"] = unique_users.get(result["_id"], 0)
             
             return results
         except Exception as e:
@@ -191,18 +444,19 @@ class Database:
                         "chapter": "$chapter"
                     },
                     "total_duration": {"$sum": "$duration"},
-                    "total_sessions": {"$sum": 1},
-                    "unique_users": {"$addToSet": "$user_id"}
+                    "total_sessions": {"$sum": 1}
                 }},
                 {"$sort": {"total_duration": -1}}
             ]
             
             results = await self.stats.aggregate(pipeline).to_list(length=None)
             
-            # Calculate unique user count for each subject-chapter combination
+            # Distinct users per subject-chapter come from merged HyperLogLog sketches
+            unique_users = await self._merged_distinct_users(
+                {"content_type": content_type}, lambda doc: (doc["subject"], doc["chapter"]), days
+            )
             for result in results:
-                result["unique_users_count"] = len(result["unique_users"])
-                del result["unique_users"]
+                result["unique_users_count"] = unique_users.get((result["_id"]["subject"], result["_id"]["chapter"]), 0)
             
             return results
         except Exception as e:
@@ -270,29 +524,30 @@ class Database:
     async def get_daily_stats(self, days=30):
         """Get daily statistics"""
         try:
-            cutoff_date = datetime.utcnow() - timedelta(days=days)
+            cutoff_day = self._truncate(datetime.utcnow() - timedelta(days=days), "day")
             
+            # Group per user first, then count those groups, so no per-day array of user ids is built
             pipeline = [
-                {"$match": {"timestamp": {"$gte": cutoff_date}}},
+                {"$match": {"day": {"$gte": cutoff_day}}},
                 {"$group": {
                     "_id": {
-                        "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
-                        "subject": "$subject"
+                        "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$day"}},
+                        "subject": "$subject",
+                        "user_id": "$user_id"
                     },
-                    "total_duration": {"$sum": "$duration"},
-                    "total_sessions": {"$sum": 1},
-                    "unique_users": {"$addToSet": "$user_id"}
+                    "total_duration": {"$sum": "$total_duration"},
+                    "total_sessions": {"$sum": "$count"}
+                }},
+                {"$group": {
+                    "_id": {"date": "$_id.date", "subject": "$_id.subject"},
+                    "total_duration": {"$sum": "$total_duration"},
+                    "total_sessions": {"$sum": "$total_sessions"},
+                    "unique_users_count": {"$sum": 1}
                 }},
                 {"$sort": {"_id.date": -1}}
             ]
             
-            results = await self.stats.aggregate(pipeline).to_list(length=None)
-            
-            # Calculate unique user count for each date-subject combination
-            for result in results:
-                result["unique_users_count"] = len(result["unique_users"])
-                del result["unique_users"]
-            
+            results = await self.stats_daily.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
             return results
         except Exception as e:
             logger.error(f"Error getting daily stats: {e}")
@@ -360,32 +615,192 @@ class Database:
             logger.error(f"Error getting monthly stats: {e}")
             return []
 
-    async def cleanup_old_data(self, days_old=90):
-        """Clean up old data"""
+    @staticmethod
+    def _truncate(timestamp, unit):
+        """Truncate a timestamp to the start of its hour or day"""
+        if unit == "hour":
+            return timestamp.replace(minute=0, second=0, microsecond=0)
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def _truncate_expr(field, unit):
+        """Aggregation expression truncating a date field to its hour or day"""
+        fmt = "%Y-%m-%dT%H:00:00" if unit == "hour" else "%Y-%m-%dT00:00:00"
+        return {"$dateFromString": {"dateString": {"$dateToString": {"format": fmt, "date": field}}}}
+
+    async def _get_watermark(self, name, default):
+        """Get the time up to which a rollup is complete"""
+        state = await self.rollup_state.find_one({"_id": name})
+        return state["until"] if state else default
+
+    async def _set_watermark(self, name, until):
+        """Store the time up to which a rollup is complete"""
+        await self.rollup_state.update_one({"_id": name}, {"$set": {"until": until}}, upsert=True)
+
+    async def run_rollups(self):
+        """Compact raw stats and analytics into hourly and daily summaries with $merge"""
         try:
-            cutoff_date = datetime.utcnow() - timedelta(days=days_old)
+            now = datetime.utcnow()
+            # Recompute the previous hour too, so events flushed late are still counted
+            safe_hour = self._truncate(now, "hour") - timedelta(hours=1)
+            first_run = now - timedelta(days=ANALYTICS_TTL_DAYS)
+            
+            # Raw stats -> hourly rollups per user, subject, chapter and content type
+            since = self._truncate(await self._get_watermark("stats_hourly", first_run), "hour")
+            await self.stats.aggregate([
+                {"$match": {"timestamp": {"$gte": since}}},
+                {"$group": {
+                    "_id": {
+                        "user_id": "$user_id",
+                        "subject": "$subject",
+                        "chapter": "$chapter",
+                        "content_type": "$content_type",
+                        "hour": self._truncate_expr("$timestamp", "hour")
+                    },
+                    "total_duration": {"$sum": "$duration"},
+                    "count": {"$sum": 1}
+                }},
+                {"$addFields": {
+                    "user_id": "$_id.user_id",
+                    "subject": "$_id.subject",
+                    "chapter": "$_id.chapter",
+                    "content_type": "$_id.content_type",
+                    "hour": "$_id.hour"
+                }},
+                {"$merge": {"into": self.stats_hourly.name, "whenMatched": "replace"}}
+            ]).to_list(length=None)
             
-            # Clean old study stats
-            old_stats = await self.stats.delete_many({
-                "timestamp": {"$lt": cutoff_date}
-            })
+            # Hourly rollups -> daily rollups
+            since_day = self._truncate(since, "day")
+            await self.stats_hourly.aggregate([
+                {"$match": {"hour": {"$gte": since_day}}},
+                {"$group": {
+                    "_id": {
+                        "user_id": "$user_id",
+                        "subject": "$subject",
+                        "chapter": "$chapter",
+                        "content_type": "$content_type",
+                        "day": self._truncate_expr("$hour", "day")
+                    },
+                    "total_duration": {"$sum": "$total_duration"},
+                    "count": {"$sum": "$count"}
+                }},
+                {"$addFields": {
+                    "user_id": "$_id.user_id",
+                    "subject": "$_id.subject",
+                    "chapter": "$_id.chapter",
+                    "content_type": "$_id.content_type",
+                    "day": "$_id.day"
+                }},
+                {"$merge": {"into": self.stats_daily.name, "whenMatched": "replace"}}
+            ]).to_list(length=None)
+            await self._set_watermark("stats_hourly", safe_hour)
+            
+            # Raw analytics -> daily counts per user and activity type
+            since = self._truncate(await self._get_watermark("analytics_daily", first_run), "day")
+            await self.analytics.aggregate([
+                {"$match": {"timestamp": {"$gte": since}}},
+                {"$group": {
+                    "_id": {
+                        "user_id": "$user_id",
+                        "activity_type": "$activity_type",
+                        "day": self._truncate_expr("$timestamp", "day")
+                    },
+                    "count": {"$sum": 1}
+                }},
+                {"$addFields": {
+                    "user_id": "$_id.user_id",
+                    "activity_type": "$_id.activity_type",
+                    "day": "$_id.day"
+                }},
+                {"$merge": {"into": self.analytics_daily.name, "whenMatched": "replace"}}
+            ]).to_list(length=None)
+            await self._set_watermark("analytics_daily", safe_hour)
             
-            # Clean old user activity
-            old_activity = await self.analytics.delete_many({
-                "timestamp": {"$lt": cutoff_date}
-            })
+            # Optionally drop raw stats that are already rolled up
+            if RAW_STATS_RETENTION_DAYS:
+                cutoff = min(safe_hour, now - timedelta(days=RAW_STATS_RETENTION_DAYS))
+                await delete_in_chunks(self.stats, {"timestamp": {"$lt": cutoff}})
+            
+            return True
+        except Exception as e:
+            logger.error(f"Error running rollups: {e}")
+            return False
+
+    async def get_rollup_totals(self, days=7):
+        """Get total study time, sessions and students over recent days from the daily rollups"""
+        try:
+            cutoff_day = self._truncate(datetime.utcnow() - timedelta(days=days), "day")
+            pipeline = [
+                {"$match": {"day": {"$gte": cutoff_day}}},
+                # One row per student, then count the rows instead of returning every id
+                {"$group": {
+                    "_id": "$user_id",
+                    "total_duration": {"$sum": "$total_duration"},
+                    "total_sessions": {"$sum": "$count"}
+                }},
+                {"$group": {
+                    "_id": None,
+                    "total_duration": {"$sum": "$total_duration"},
+                    "total_sessions": {"$sum": "$total_sessions"},
+                    "active_students": {"$sum": 1}
+                }}
+            ]
+            results = await self.stats_daily.aggregate(pipeline).to_list(length=1)
+            totals = results[0] if results else {"total_duration": 0, "total_sessions": 0, "active_students": 0}
+            totals.pop("_id", None)
+            return totals
+        except Exception as e:
+            logger.error(f"Error getting rollup totals: {e}")
+            return {}
+
+    async def rollup_loop(self):
+        """Run the rollup job every ROLLUP_INTERVAL seconds"""
+        while True:
+            await self.run_rollups()
+            await asyncio.sleep(ROLLUP_INTERVAL)
+
+    async def ensure_indexes(self):
+        """Create query indexes and the analytics TTL index"""
+        try:
+            await self.stats.create_index([("user_id", 1), ("timestamp", -1)])
+            await self.stats.create_index("timestamp")
+            await self.analytics.create_index([("user_id", 1), ("timestamp", -1)])
+            await self.message_counts.create_index([("count", -1)])
+            await self.leaderboard.create_index([("day", 1), ("user_id", 1)])
+            await self.stats_hourly.create_index("hour")
+            await self.stats_daily.create_index([("user_id", 1), ("day", -1)])
+            await self.stats_daily.create_index("day")
+            await self.analytics_daily.create_index([("user_id", 1), ("day", -1)])
+            await self.distinct_users.create_index([("subject", 1), ("day", 1)])
+            await self.distinct_users.create_index([("content_type", 1), ("day", 1)])
+            await self.distinct_users.create_index(
+                [("subject", 1), ("chapter", 1), ("content_type", 1), ("day", 1)], unique=True
+            )
+            
+            # Raw activity events expire through TTL instead of cleanup_old_data
+            await ensure_ttl_index(self.analytics, "timestamp", ANALYTICS_TTL_DAYS * 86400)
+            
+            logger.info("TopDB indexes ensured")
+            return True
+        except Exception as e:
+            logger.error(f"Error ensuring TopDB indexes: {e}")
+            return False
+
+    async def cleanup_old_data(self, days_old=90):
+        """Clean up old study stats in rate-limited batches"""
+        try:
+            cutoff_date = datetime.utcnow() - timedelta(days=days_old)
             
-            # Clean old messages
-            old_messages = await self.col.delete_many({
+            # Analytics events are expired by their TTL index
+            stats_deleted = await delete_in_chunks(self.stats, {
                 "timestamp": {"$lt": cutoff_date}
             })
             
-            logger.info(f"Cleaned up {old_stats.deleted_count} old stats, {old_activity.deleted_count} old activities, {old_messages.deleted_count} old messages")
+            logger.info(f"Cleaned up {stats_deleted} old stats")
             
             return {
-                "stats_deleted": old_stats.deleted_count,
-                "activity_deleted": old_activity.deleted_count,
-                "messages_deleted": old_messages.deleted_count
+                "stats_deleted": stats_deleted
             }
             
         except Exception as e:
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, FrozenSet, Optional
+
+# Try to import pymongo with error handling
+try:
+    from pymongo import UpdateOne
+except ImportError:
+    UpdateOne = None
+
+try:
+    from config import USER_CACHE_SIZE, LAST_ACTIVE_FLUSH_INTERVAL
+except ImportError:
+    # Fallback configuration values
+    USER_CACHE_SIZE = 50000
+    LAST_ACTIVE_FLUSH_INTERVAL = 60
+
+from database.study_db import db as study_db
+
+logger = logging.getLogger(__name__)
+
+
+class UserRegistry:
+    """Registers users with a single upsert and batches last_active writes"""
+
+    def __init__(self, collection, max_known: int = USER_CACHE_SIZE, flush_interval: float = LAST_ACTIVE_FLUSH_INTERVAL):
+        self.col = collection
+        self.max_known = max_known
+        self.flush_interval = flush_interval
+        # LRU of user ids already known to exist in the database -> bots they are known to have started
+        self._known: "OrderedDict[int, FrozenSet[str]]" = OrderedDict()
+        # user_id -> latest activity time waiting to be written
+        self._pending: Dict[int, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def is_known(self, user_id: int) -> bool:
+        """Check whether a user id is in the in-memory known set"""
+        return int(user_id) in self._known
+
+    def _remember(self, user_id: int, bot: str):
+        """Mark a user id as known, evicting the least recently seen one when full"""
+        self._known[user_id] = self._known.get(user_id, frozenset()) | {bot}
+        self._known.move_to_end(user_id)
+        while len(self._known) > self.max_known:
+            self._known.popitem(last=False)
+
+    async def touch(self, user, bot: str = "main") -> bool:
+        """Record an interaction from a Telegram user with one of the bots, returns True on first contact"""
+        user_id = int(user.id)
+        now = datetime.now(timezone.utc)
+
+        if bot in self._known.get(user_id, ()):
+            self._known.move_to_end(user_id)
+            self._pending[user_id] = now
+            return False
+
+        try:
+            result = await self.col.update_one(
+                {'_id': user_id},
+                {
+                    '$setOnInsert': {
+                        'first_name': user.first_name,
+                        'last_name': getattr(user, 'last_name', None),
+                        'username': getattr(user, 'username', None),
+                        'is_premium': False,
+                        'joined_at': now
+                    },
+                    '$max': {'last_active': now},
+                    # A user who talks to the bot again can receive broadcasts again
+                    '$set': {'is_active': True},
+                    # Bots the user has started and can therefore be messaged from
+                    '$addToSet': {'bots': bot}
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Error registering user {user_id}: {e}")
+            return False
+
+        self._remember(user_id, bot)
+        return result.upserted_id is not None
+
+    async def drop_bots(self, user_ids, bot: str):
+        """Remove a bot from users it can no longer message; it is added back when they talk to it again"""
+        user_ids = [int(user_id) for user_id in user_ids]
+        await self.col.update_many({'_id': {'$in': user_ids}}, {'$pull': {'bots': bot}})
+        for user_id in user_ids:
+            known = self._known.get(user_id)
+            if known is not None:
+                self._known[user_id] = known - {bot}
+
+    def forget(self, user_id: int):
+        """Drop a user id from the known set, e.g. after the user was deleted"""
+        self._known.pop(int(user_id), None)
+        self._pending.pop(int(user_id), None)
+
+    async def flush(self) -> int:
+        """Write all pending last_active updates in one bulk operation"""
+        if not self._pending or UpdateOne is None:
+            return 0
+
+        pending, self._pending = self._pending, {}
+        operations = [
+            UpdateOne({'_id': user_id}, {'$max': {'last_active': ts}})
+            for user_id, ts in pending.items()
+        ]
+        try:
+            await self.col.bulk_write(operations, ordered=False)
+            return len(operations)
+        except Exception as e:
+            logger.error(f"Error flushing last_active updates: {e}")
+            # Keep the newer of the failed and any freshly queued timestamps
+            for user_id, ts in pending.items():
+                self._pending[user_id] = max(ts, self._pending.get(user_id, ts))
+            return 0
+
+    async def _flush_loop(self):
+        """Periodically flush pending last_active updates"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        """Start the background flush task"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the background flush task and write what is left"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+
+# Create global registry instance
+try:
+    user_registry = UserRegistry(study_db.users) if study_db is not None else None
+except Exception as e:
+    print(f"Warning: Could not initialize user registry: {e}")
+    user_registry = None
@@ -12,6 +12,7 @@ except ImportError as e:
     AsyncIOMotorClient = None
 
 from config import *
+from database.maintenance import ensure_ttl_index, drop_index_if_exists, update_in_chunks
 
 logger = logging.getLogger(__name__)
 
@@ -156,6 +157,11 @@ class Database:
         self.movie_updates = self.db.movie_updates
         self.connection = self.db.connections
         self.join_requests = self.db.join_requests
+        
+        # In-memory ban registry, kept in sync by the ban/disable methods below
+        self.banned_users = set()
+        self.disabled_chats = set()
+        self.ban_cache_loaded = False
 
     async def add_name(self, filename):
         """Add filename to movie updates collection"""
@@ -233,7 +239,8 @@ class Database:
             is_banned=False,
             ban_reason=''
         )
-        await self.col.update_one({'id': id}, {'$set': {'ban_status': ban_status}})
+        await self._set_ban_status(int(id), ban_status)
+        self.banned_users.discard(int(id))
     
     async def ban_user(self, user_id, ban_reason="No Reason"):
         """Ban user with reason"""
@@ -241,7 +248,40 @@ class Database:
             is_banned=True,
             ban_reason=ban_reason
         )
-        await self.col.update_one({'id': user_id}, {'$set': {'ban_status': ban_status}})
+        await self._set_ban_status(int(user_id), ban_status)
+        self.banned_users.add(int(user_id))
+
+    async def _set_ban_status(self, user_id, ban_status):
+        """Store ban status on the user's registry document and on any legacy add_user document"""
+        # Registry documents are keyed by _id alone; id is set too so the id-based lookups find them
+        await self.col.update_one(
+            {'_id': user_id},
+            {'$set': {'id': user_id, 'ban_status': ban_status}},
+            upsert=True
+        )
+        await self.col.update_many({'id': user_id, '_id': {'$ne': user_id}}, {'$set': {'ban_status': ban_status}})
+
+    async def load_ban_cache(self):
+        """Load banned user and disabled chat ids into memory"""
+        banned = self.col.find({'ban_status.is_banned': True}, {'id': 1, '_id': 0})
+        self.banned_users.clear()
+        self.banned_users.update([int(doc['id']) async for doc in banned])
+        
+        disabled = self.grp.find({'chat_status.is_disabled': True}, {'id': 1, '_id': 0})
+        self.disabled_chats.clear()
+        self.disabled_chats.update([int(doc['id']) async for doc in disabled])
+        
+        self.ban_cache_loaded = True
+        logger.info(f"Ban cache loaded: {len(self.banned_users)} users, {len(self.disabled_chats)} chats")
+        return self.banned_users, self.disabled_chats
+
+    def is_user_banned(self, user_id):
+        """Check ban status from the in-memory registry"""
+        return int(user_id) in self.banned_users
+
+    def is_chat_disabled(self, chat_id):
+        """Check chat status from the in-memory registry"""
+        return int(chat_id) in self.disabled_chats
 
     async def get_ban_status(self, id):
         """Get ban status of user"""
@@ -249,6 +289,9 @@ class Database:
             is_banned=False,
             ban_reason=''
         )
+        # Only banned users need a lookup for the reason
+        if self.ban_cache_loaded and int(id) not in self.banned_users:
+            return default
         user = await self.col.find_one({'id': int(id)})
         if not user:
             return default
@@ -265,6 +308,7 @@ class Database:
     async def delete_user(self, user_id):
         """Delete user from database"""
         await self.col.delete_many({'id': int(user_id)})
+        self.banned_users.discard(int(user_id))
 
     async def get_banned_users(self):
         """Get all banned users"""
@@ -335,6 +379,7 @@ class Database:
             {'id': int(chat_id)},
             {'$set': {'chat_status': chat_status}}
         )
+        self.disabled_chats.add(int(chat_id))
 
     async def enable_chat(self, chat_id):
         """Enable chat"""
@@ -346,6 +391,7 @@ class Database:
             {'id': int(chat_id)},
             {'$set': {'chat_status': chat_status}}
         )
+        self.disabled_chats.discard(int(chat_id))
 
     async def get_chat_status(self, chat_id):
         """Get chat status"""
@@ -353,6 +399,9 @@ class Database:
             is_disabled=False,
             reason=''
         )
+        # Only disabled chats need a lookup for the reason
+        if self.ban_cache_loaded and int(chat_id) not in self.disabled_chats:
+            return default
         group = await self.grp.find_one({'id': int(chat_id)})
         if not group:
             return default
@@ -372,6 +421,10 @@ class Database:
 
     async def update_join_request(self, user_id, chat_id, update_data):
         """Update join request status"""
+        update_data = dict(update_data)
+        # Resolved requests expire through the resolved_at TTL index
+        if update_data.get('status') in ('approved', 'declined'):
+            update_data.setdefault('resolved_at', datetime.now(timezone.utc))
         await self.join_requests.update_one(
             {'user_id': user_id, 'chat_id': chat_id},
             {'$set': update_data}
@@ -492,7 +545,7 @@ class Database:
         """Set verification ID for user"""
         await self.verify_id.update_one(
             {'user_id': user_id},
-            {'$set': {'verify_id': verify_id}},
+            {'$set': {'verify_id': verify_id, 'created_at': datetime.now(timezone.utc)}},
             upsert=True
         )
 
@@ -552,45 +605,73 @@ class Database:
         """Get recent groups"""
         return self.grp.find({}).sort('created_at', -1).limit(limit)
 
-    async def get_user_activity(self, user_id, days=7):
-        """Get user activity for specified days"""
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        user = await self.col.find_one({'id': int(user_id)})
-        if user and 'activity' in user:
-            return [act for act in user['activity'] if act.get('timestamp', datetime.min) > cutoff_date]
-        return []
-
-    async def add_user_activity(self, user_id, activity_type, details=None):
-        """Add user activity"""
+    async def add_activity(self, kind, owner_id, activity_type, details=None):
+        """Append an activity event to the owner's current daily bucket"""
+        now = datetime.now(timezone.utc)
+        day = now.replace(hour=0, minute=0, second=0, microsecond=0)
         activity = {
             'type': activity_type,
-            'timestamp': datetime.now(timezone.utc),
+            'timestamp': now,
             'details': details or {}
         }
-        await self.col.update_one(
-            {'id': int(user_id)},
-            {'$push': {'activity': activity}}
+        # A full bucket no longer matches, so the upsert opens a fresh one for the same day
+        await self.act.update_one(
+            {
+                'kind': kind,
+                'owner_id': int(owner_id),
+                'day': day,
+                'count': {'$lt': ACTIVITY_BUCKET_SIZE}
+            },
+            {
+                '$push': {'events': activity},
+                '$inc': {'count': 1},
+                '$max': {'last_at': now}
+            },
+            upsert=True
         )
 
+    async def get_activity_range(self, kind, owner_id, start, end=None, activity_type=None, limit=None):
+        """Get activity events for an owner between start and end, newest first"""
+        end = end or datetime.now(timezone.utc)
+        start_day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        
+        event_match = {'events.timestamp': {'$gte': start, '$lte': end}}
+        if activity_type:
+            event_match['events.type'] = activity_type
+        
+        pipeline = [
+            {'$match': {
+                'kind': kind,
+                'owner_id': int(owner_id),
+                'day': {'$gte': start_day, '$lte': end}
+            }},
+            {'$unwind': '$events'},
+            {'$match': event_match},
+            {'$replaceRoot': {'newRoot': '$events'}},
+            {'$sort': {'timestamp': -1}}
+        ]
+        if limit:
+            pipeline.append({'$limit': limit})
+        
+        return await self.act.aggregate(pipeline).to_list(length=limit)
+
+    async def get_user_activity(self, user_id, days=7):
+        """Get user activity for specified days"""
+        cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
+        return await self.get_activity_range('user', user_id, cutoff_date)
+
+    async def add_user_activity(self, user_id, activity_type, details=None):
+        """Add user activity"""
+        await self.add_activity('user', user_id, activity_type, details)
+
     async def get_chat_activity(self, chat_id, days=7):
         """Get chat activity for specified days"""
         cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
-        group = await self.grp.find_one({'id': int(chat_id)})
-        if group and 'activity' in group:
-            return [act for act in group['activity'] if act.get('timestamp', datetime.min) > cutoff_date]
-        return []
+        return await self.get_activity_range('chat', chat_id, cutoff_date)
 
     async def add_chat_activity(self, chat_id, activity_type, details=None):
         """Add chat activity"""
-        activity = {
-            'type': activity_type,
-            'timestamp': datetime.now(timezone.utc),
-            'details': details or {}
-        }
-        await self.grp.update_one(
-            {'id': int(chat_id)},
-            {'$push': {'activity': activity}}
-        )
+        await self.add_activity('chat', chat_id, activity_type, details)
 
     async def get_database_stats(self):
         """Get comprehensive database statistics"""
@@ -618,29 +699,48 @@ class Database:
             logger.error(f"Error getting database stats: {e}")
             return {}
 
+    async def ensure_indexes(self):
+        """Create lookup and TTL indexes for expiring collections"""
+        try:
+            await self.join_requests.create_index([('user_id', 1), ('chat_id', 1)])
+            await self.verify_id.create_index('user_id')
+            await self.act.create_index([('kind', 1), ('owner_id', 1), ('day', 1)])
+            await self.col.create_index('ban_status.is_banned')
+            await self.grp.create_index('chat_status.is_disabled')
+            
+            # Expired by MongoDB instead of cleanup loops
+            # Only resolved join requests expire, counted from when they were resolved;
+            # pending ones carry no resolved_at and wait for an admin however long it takes
+            await drop_index_if_exists(self.join_requests, 'timestamp_ttl')
+            await ensure_ttl_index(
+                self.join_requests, 'resolved_at', JOIN_REQUEST_TTL_DAYS * 86400,
+                partial_filter={'resolved_at': {'$exists': True}}
+            )
+            await ensure_ttl_index(self.verify_id, 'created_at', VERIFY_ID_TTL_HOURS * 3600)
+            await ensure_ttl_index(self.act, 'day', ACTIVITY_TTL_DAYS * 86400)
+            
+            logger.info("Users/chats indexes ensured")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error ensuring users/chats indexes: {e}")
+            return False
+
     async def cleanup_old_data(self, days_old=30):
-        """Clean up old data from database"""
+        """Clean up legacy activity arrays still embedded in user and group documents"""
         try:
             cutoff_date = datetime.now(timezone.utc) - timedelta(days=days_old)
             
-            # Clean old join requests
-            old_requests = await self.join_requests.delete_many({
-                'timestamp': {'$lt': cutoff_date}
-            })
+            # Join requests, verify ids and activity buckets expire through TTL indexes.
+            # Only rewrite documents that actually hold stale entries, in small batches.
+            stale = {'activity.timestamp': {'$lt': cutoff_date}}
+            pull = {'$pull': {'activity': {'timestamp': {'$lt': cutoff_date}}}}
             
-            # Clean old activity logs
-            old_user_activity = await self.col.update_many(
-                {},
-                {'$pull': {'activity': {'timestamp': {'$lt': cutoff_date}}}}
-            )
-            
-            old_group_activity = await self.grp.update_many(
-                {},
-                {'$pull': {'activity': {'timestamp': {'$lt': cutoff_date}}}}
-            )
+            users_cleaned = await update_in_chunks(self.col, stale, pull)
+            groups_cleaned = await update_in_chunks(self.grp, stale, pull)
             
-            logger.info(f"Cleaned up {old_requests.deleted_count} old join requests")
-            return old_requests.deleted_count
+            logger.info(f"Cleaned old activity from {users_cleaned} users and {groups_cleaned} groups")
+            return users_cleaned + groups_cleaned
             
         except Exception as e:
             logger.error(f"Error cleaning up old data: {e}")
@@ -4,6 +4,7 @@ from pyrogram import Client, filters, enums
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.errors import FloodWait
 from database.study_db import db as study_db
+from plugins import check_expired_premium
 from config import *
 from Script import script
 from utils import temp, get_readable_time
@@ -247,13 +248,17 @@ async def add_premium(client, message):
         current_time = datetime.now(pytz.timezone("Asia/Kolkata"))
         expiry_time = current_time + timedelta(days=days)
         
-        # Update user in database
-        await study_db.update_user(user_id, {
-            'premium_expiry': expiry_time.isoformat(),
+        # Update user in database; expiries are stored as naive UTC dates so the expiry scheduler can range over them
+        expiry_utc = expiry_time.astimezone(pytz.utc).replace(tzinfo=None)
+        await study_db.users.update_one({'_id': user_id}, {'$set': {
+            'is_premium': True,
+            'premium_expiry': expiry_utc,
             'premium_plan': 'standard',
             'premium_added_by': message.from_user.id,
-            'premium_added_at': current_time.isoformat()
-        })
+            'premium_added_at': datetime.utcnow()
+        }}, upsert=True)
+        if check_expired_premium.scheduler:
+            check_expired_premium.scheduler.schedule(user_id, expiry_utc)
         
         # Send confirmation
         await message.reply_text(
@@ -2,6 +2,10 @@ import logging
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from database.study_db import db as study_db, StudyFiles, Batches, Chapters, Users, StudySessions, ContentAnalytics, BotSettings, JoinRequests, Chats, GroupSettings
+from database.topdb import topdb
+from database.analytics_export import export_analytics, remove_export
+from database.scoring import recompute_scores
+from database.broadcast_jobs import broadcast_jobs
 from config import *
 from studybot.Bot import studybot, content_bot
 import re
@@ -327,7 +331,13 @@ async def stats_command(client: Client, message: Message):
         total_users = await Users.count_documents({})
         total_batches = await Batches.count_documents({})
         total_content = await StudyFiles.count_documents({})
-        total_downloads = sum([user.total_downloads for user in await Users.find().to_list(length=1000)])
+        downloads = await Users.collection.aggregate([
+            {"$group": {"_id": None, "total": {"$sum": "$total_downloads"}}}
+        ]).to_list(length=1)
+        total_downloads = downloads[0]["total"] if downloads else 0
+        
+        # Study activity comes from the pre-aggregated daily rollups
+        weekly = await topdb.get_rollup_totals(days=7) if topdb else {}
         
         # Get content by type
         content_by_type = await StudyFiles.aggregate([
@@ -341,6 +351,11 @@ async def stats_command(client: Client, message: Message):
 📁 **Content Files:** {total_content}
 📥 **Total Downloads:** {total_downloads}
 
+📈 **Last 7 Days:**
+• Study Time: {int(weekly.get('total_duration', 0))} min
+• Sessions: {weekly.get('total_sessions', 0)}
+• Active Students: {weekly.get('active_students', 0)}
+
 📝 **Content by Type:**"""
         
         for content_type in content_by_type:
@@ -352,6 +367,65 @@ async def stats_command(client: Client, message: Message):
         logger.error(f"Error in stats command: {e}")
         await message.reply_text("❌ An error occurred while fetching bot statistics.")
 
+# Export command
+@studybot.on_message(filters.command("export") & filters.private)
+async def export_command(client: Client, message: Message):
+    """Export engagement metrics and raw analytics as compressed files"""
+    try:
+        user_id = message.from_user.id
+        
+        # Check if user is admin/owner
+        if user_id not in OWNER_ID and not await is_admin(user_id):
+            await message.reply_text("❌ Access denied. Admin privileges required.")
+            return
+        
+        fmt = message.command[1].lower() if len(message.command) > 1 else "csv"
+        status = await message.reply_text("⏳ Building analytics export...")
+        
+        archive = await export_analytics(fmt)
+        if not archive:
+            await status.edit_text("❌ Export failed. Check the logs for details.")
+            return
+        
+        try:
+            await message.reply_document(
+                archive,
+                caption="📊 **Analytics Export**\n\nDAU/WAU, retention cohorts, chapter completion and raw events."
+            )
+            await status.delete()
+        finally:
+            remove_export(archive)
+        
+    except Exception as e:
+        logger.error(f"Error in export command: {e}")
+        await message.reply_text("❌ An error occurred while exporting analytics.")
+
+# Rescore command
+@studybot.on_message(filters.command("rescore") & filters.private)
+async def rescore_command(client: Client, message: Message):
+    """Recompute scores, levels and achievements for every user"""
+    try:
+        user_id = message.from_user.id
+        
+        # Check if user is admin/owner
+        if user_id not in OWNER_ID and not await is_admin(user_id):
+            await message.reply_text("❌ Access denied. Admin privileges required.")
+            return
+        
+        status = await message.reply_text("⏳ Recomputing study scores...")
+        summary = await recompute_scores()
+        
+        await status.edit_text(
+            f"✅ **Scores Recomputed**\n\n"
+            f"👥 **Users Scanned:** {summary.get('users', 0)}\n"
+            f"✏️ **Users Updated:** {summary.get('updated', 0)}\n"
+            f"🏆 **New Achievements:** {summary.get('new_achievements', 0)}"
+        )
+        
+    except Exception as e:
+        logger.error(f"Error in rescore command: {e}")
+        await message.reply_text("❌ An error occurred while recomputing scores.")
+
 # Broadcast command
 @studybot.on_message(filters.command("broadcast") & filters.private)
 async def broadcast_command(client: Client, message: Message):
@@ -372,37 +446,21 @@ async def broadcast_command(client: Client, message: Message):
         
         broadcast_message = command_parts[1].strip()
         
-        # Get all users
-        users = await Users.find().to_list(length=1000)
-        
-        if not users:
-            await message.reply_text("❌ No users found to broadcast to.")
+        # Recipients are read in _id order by the broadcast worker, which survives restarts
+        text = f"📢 **Broadcast Message** 📢\n\n{broadcast_message}\n\n_From Study Bot Admin_"
+        job_id = await broadcast_jobs.enqueue(user_id, "pm", {'type': 'text', 'text': text})
+        if not job_id:
+            await message.reply_text("❌ Could not queue the broadcast.")
             return
         
-        # Send broadcast
-        success_count = 0
-        failed_count = 0
-        
-        for user in users:
-            try:
-                await client.send_message(
-                    user.user_id,
-                    f"📢 **Broadcast Message** 📢\n\n{broadcast_message}\n\n_From Study Bot Admin_"
-                )
-                success_count += 1
-            except Exception as e:
-                failed_count += 1
-                logger.error(f"Failed to send broadcast to {user.user_id}: {e}")
-        
         await message.reply_text(
-            f"✅ **Broadcast Completed!**\n\n"
+            f"✅ **Broadcast Queued!**\n\n"
             f"📢 **Message:** {broadcast_message}\n"
-            f"✅ **Success:** {success_count} users\n"
-            f"❌ **Failed:** {failed_count} users\n"
+            f"🆔 **Job:** `{job_id}`\n"
             f"👤 **Sent By:** {user_id}"
         )
         
-        logger.info(f"Admin {user_id} sent broadcast to {success_count} users")
+        logger.info(f"Admin {user_id} queued broadcast {job_id}")
         
     except Exception as e:
         logger.error(f"Error in broadcast: {e}")
@@ -5,12 +5,23 @@ from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message
 from pyrogram.errors import FloodWait, UserNotParticipant, ChatAdminRequired
 from config import *
 from database.study_db import db as study_db
-from utils import temp, get_readable_time
+from database.users_chats_db import db as users_db
+from utils import temp, get_readable_time, banned_filter
 from datetime import datetime, timedelta
 import pytz
 
 logger = logging.getLogger(__name__)
 
+@Client.on_message(banned_filter, group=-1)
+async def drop_banned_messages(client, message):
+    """Drop messages from banned users and disabled chats before other handlers"""
+    message.stop_propagation()
+
+@Client.on_callback_query(banned_filter, group=-1)
+async def drop_banned_callbacks(client, callback_query):
+    """Drop button presses from banned users and disabled chats"""
+    callback_query.stop_propagation()
+
 @Client.on_message(filters.command("ban") & filters.private)
 async def ban_user_command(client, message):
     """Handle ban user command"""
@@ -38,24 +49,13 @@ async def ban_user_command(client, message):
 async def ban_user(client, message, user_id, reason):
     """Ban a user"""
     try:
-        # Check if user exists
-        user = await study_db.get_user(user_id)
-        if not user:
-            await message.reply_text(f"❌ User {user_id} not found in database.")
-            return
-        
         # Check if user is already banned
-        if user.get('banned', False):
+        if users_db.is_user_banned(user_id):
             await message.reply_text(f"❌ User {user_id} is already banned.")
             return
         
-        # Ban the user
-        await study_db.update_user(user_id, {
-            'banned': True,
-            'ban_reason': reason,
-            'banned_by': message.from_user.id,
-            'banned_at': int(asyncio.get_event_loop().time())
-        })
+        # Ban the user; users_db keeps the in-memory ban registry in sync
+        await users_db.ban_user(user_id, reason)
         
         await message.reply_text(
             f"✅ **User Banned Successfully!**\n\n"
@@ -110,24 +110,13 @@ async def unban_user_command(client, message):
 async def unban_user(client, message, user_id):
     """Unban a user"""
     try:
-        # Check if user exists
-        user = await study_db.get_user(user_id)
-        if not user:
-            await message.reply_text(f"❌ User {user_id} not found in database.")
-            return
-        
         # Check if user is banned
-        if not user.get('banned', False):
+        if not users_db.is_user_banned(user_id):
             await message.reply_text(f"❌ User {user_id} is not banned.")
             return
         
-        # Unban the user
-        await study_db.update_user(user_id, {
-            'banned': False,
-            'ban_reason': None,
-            'banned_by': None,
-            'banned_at': None
-        })
+        # Unban the user; users_db keeps the in-memory ban registry in sync
+        await users_db.remove_ban(user_id)
         
         await message.reply_text(
             f"✅ **User Unbanned Successfully!**\n\n"
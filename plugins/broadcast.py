@@ -7,6 +7,8 @@ from database.study_db import db as study_db
 from config import *
 from Script import script
 from utils import temp, get_readable_time
+from database.broadcast_jobs import broadcast_jobs
+from database.segments import audience_segments
 from datetime import datetime, timedelta
 import pytz
 
@@ -46,31 +48,18 @@ async def show_broadcast_menu(client, message):
 
 async def start_direct_broadcast(client, message, broadcast_message):
     """Start direct broadcast with provided message"""
-    await message.reply_text("📢 Starting direct broadcast...")
-    
     try:
-        success_count = 0
-        failed_count = 0
-        
-        # Get all users
-        users = await study_db.get_all_users()
-        
-        for user in users:
-            try:
-                await client.send_message(user['user_id'], broadcast_message)
-                success_count += 1
-                await asyncio.sleep(0.1)  # Rate limiting
-            except Exception as e:
-                failed_count += 1
-                logger.error(f"Failed to send to user {user['user_id']}: {e}")
-        
-        # Send completion message
-        completion_text = f"📢 **Direct Broadcast Completed!**\n\n"
-        completion_text += f"✅ Successfully sent: {success_count}\n"
-        completion_text += f"❌ Failed: {failed_count}\n"
-        completion_text += f"📝 Message: {broadcast_message[:100]}{'...' if len(broadcast_message) > 100 else ''}"
+        job_id = await broadcast_jobs.enqueue(message.from_user.id, "pm", {'type': 'text', 'text': broadcast_message})
+        if not job_id:
+            await message.reply_text("❌ Could not queue the broadcast.")
+            return
         
-        await message.reply_text(completion_text)
+        await message.reply_text(
+            f"📢 **Direct Broadcast Queued!**\n\n"
+            f"🆔 Job: `{job_id}`\n"
+            f"📝 Message: {broadcast_message[:100]}{'...' if len(broadcast_message) > 100 else ''}\n\n"
+            "You will get a report when it finishes. Use /broadcasts to follow progress."
+        )
         
     except Exception as e:
         logger.error(f"Error in direct broadcast: {e}")
@@ -224,57 +213,22 @@ async def handle_user_ids_input(client, message, user_ids_text):
 async def start_broadcast_process(client, message, target, message_text):
     """Start the actual broadcast process"""
     try:
-        await message.reply_text("📢 Starting broadcast...")
-        
-        success_count = 0
-        failed_count = 0
-        
-        if target == "all" or target == "pm":
-            # Broadcast to PM users
-            users = await study_db.get_all_users()
-            for user in users:
-                try:
-                    await client.send_message(user['user_id'], message_text)
-                    success_count += 1
-                    await asyncio.sleep(0.1)  # Rate limiting
-                except Exception as e:
-                    failed_count += 1
-                    logger.error(f"Failed to send to user {user['user_id']}: {e}")
-        
-        if target == "all" or target == "groups":
-            # Broadcast to groups
-            groups = await study_db.get_all_chats()
-            for group in groups:
-                try:
-                    await client.send_message(group['chat_id'], message_text)
-                    success_count += 1
-                    await asyncio.sleep(0.1)  # Rate limiting
-                except Exception as e:
-                    failed_count += 1
-                    logger.error(f"Failed to send to group {group['chat_id']}: {e}")
-        
-        if target == "specific":
-            # Broadcast to specific users
-            specific_users = temp.BROADCAST_STATE.get('specific_users', [])
-            for user_id in specific_users:
-                try:
-                    await client.send_message(user_id, message_text)
-                    success_count += 1
-                    await asyncio.sleep(0.1)  # Rate limiting
-                except Exception as e:
-                    failed_count += 1
-                    logger.error(f"Failed to send to user {user_id}: {e}")
-        
-        # Send completion message
-        completion_text = f"📢 **Broadcast Completed!**\n\n"
-        completion_text += f"✅ Successfully sent: {success_count}\n"
-        completion_text += f"❌ Failed: {failed_count}\n"
-        completion_text += f"🎯 Target: {target.title()}"
+        # Recipients are read from the database in _id order when the job runs
+        specific_users = temp.BROADCAST_STATE.get('specific_users', []) if target == "specific" else None
+        job_id = await broadcast_jobs.enqueue(message.from_user.id, target, {'type': 'text', 'text': message_text}, specific_users)
+        if not job_id:
+            await message.reply_text("❌ Could not queue the broadcast.")
+            temp.BROADCAST_STATE['active'] = False
+            return
         
+        queued_text = f"📢 **Broadcast Queued!**\n\n"
+        queued_text += f"🆔 Job: `{job_id}`\n"
+        queued_text += f"🎯 Target: {target.title()}"
         if target == "specific":
-            completion_text += f"\n👥 Users: {len(temp.BROADCAST_STATE.get('specific_users', []))}"
+            queued_text += f"\n👥 Users: {len(specific_users)}"
+        queued_text += f"\n\nUse `/cancelbroadcast {job_id}` to stop it."
         
-        await message.reply_text(completion_text)
+        await message.reply_text(queued_text)
         
         # Reset broadcast state
         temp.BROADCAST_STATE['active'] = False
@@ -284,6 +238,106 @@ async def start_broadcast_process(client, message, target, message_text):
         await message.reply_text(f"❌ Error during broadcast: {e}")
         temp.BROADCAST_STATE['active'] = False
 
+@Client.on_message(filters.command("broadcasts") & filters.private)
+async def list_broadcasts_command(client, message):
+    """List recent broadcast jobs"""
+    if message.from_user.id not in ADMINS:
+        await message.reply_text("❌ This command is only for admins!")
+        return
+    
+    try:
+        jobs = await broadcast_jobs.list_jobs()
+        if not jobs:
+            await message.reply_text("📢 No broadcasts yet.")
+            return
+        
+        status_icons = {'queued': '⏳', 'running': '🔄', 'done': '✅', 'cancelled': '❌'}
+        jobs_text = "📢 **Recent Broadcasts**\n\n"
+        for job in jobs:
+            counts = job.get('counts', {})
+            jobs_text += f"{status_icons.get(job['status'], '•')} `{job['_id']}` - {job.get('segment') or job['target'].title()} - {job['status']}\n"
+            jobs_text += f"   ✅ {counts.get('success', 0)} sent, created {job['created_at']:%d %b %H:%M}\n"
+        
+        await message.reply_text(jobs_text)
+        
+    except Exception as e:
+        logger.error(f"Error listing broadcasts: {e}")
+        await message.reply_text(f"❌ Error listing broadcasts: {e}")
+
+@Client.on_message(filters.command("segments") & filters.private)
+async def list_segments_command(client, message):
+    """List audience segments with their current sizes"""
+    if message.from_user.id not in ADMINS:
+        await message.reply_text("❌ This command is only for admins!")
+        return
+    
+    try:
+        segments_text = "🎯 **Audience Segments**\n\n"
+        for name in await audience_segments.names():
+            segments_text += f"• `{name}` - {await audience_segments.size(name)} users\n"
+        segments_text += "\nUse `batch:<batch name>` for any batch.\n"
+        segments_text += "Send with `/segmentcast <segment> <message>`"
+        await message.reply_text(segments_text)
+        
+    except Exception as e:
+        logger.error(f"Error listing segments: {e}")
+        await message.reply_text(f"❌ Error listing segments: {e}")
+
+@Client.on_message(filters.command("segmentcast") & filters.private)
+async def segment_broadcast_command(client, message):
+    """Broadcast to a named audience segment"""
+    if message.from_user.id not in ADMINS:
+        await message.reply_text("❌ This command is only for admins!")
+        return
+    
+    if len(message.command) < 3:
+        await message.reply_text("❌ **Usage:** `/segmentcast <segment> <message>`\n\nUse /segments to see segment names.")
+        return
+    
+    try:
+        segment = message.command[1]
+        size = await audience_segments.size(segment)
+        if size is None:
+            await message.reply_text("❌ Unknown segment! Use /segments to see segment names.")
+            return
+        if not size:
+            await message.reply_text(f"❌ Segment `{segment}` has no users.")
+            return
+        
+        broadcast_message = " ".join(message.command[2:])
+        job_id = await broadcast_jobs.enqueue(message.from_user.id, "segment", {'type': 'text', 'text': broadcast_message}, segment=segment)
+        if not job_id:
+            await message.reply_text("❌ Could not queue the broadcast.")
+            return
+        
+        await message.reply_text(
+            f"📢 **Segment Broadcast Queued!**\n\n"
+            f"🆔 Job: `{job_id}`\n"
+            f"🎯 Segment: {segment}\n"
+            f"👥 Users: {size}\n\n"
+            f"Use `/cancelbroadcast {job_id}` to stop it."
+        )
+        
+    except Exception as e:
+        logger.error(f"Error in segment broadcast: {e}")
+        await message.reply_text(f"❌ Error during broadcast: {e}")
+
+@Client.on_message(filters.command("cancelbroadcast") & filters.private)
+async def cancel_broadcast_job_command(client, message):
+    """Cancel a queued or running broadcast job"""
+    if message.from_user.id not in ADMINS:
+        await message.reply_text("❌ This command is only for admins!")
+        return
+    
+    if len(message.command) < 2:
+        await message.reply_text("❌ **Usage:** `/cancelbroadcast <job_id>`\n\nUse /broadcasts to see job ids.")
+        return
+    
+    if await broadcast_jobs.cancel(message.command[1]):
+        await message.reply_text(f"❌ Broadcast `{message.command[1]}` cancelled!")
+    else:
+        await message.reply_text("❌ No queued or running broadcast with that id!")
+
 @Client.on_callback_query(filters.regex(r"^cancel_broadcast$"))
 async def cancel_broadcast_callback(client, callback_query):
     """Cancel broadcast from callback"""
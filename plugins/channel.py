@@ -7,6 +7,7 @@ from database.study_db import db as study_db
 from config import *
 from Script import script
 from utils import temp, get_readable_time
+from database.broadcast_jobs import broadcast_jobs
 from datetime import datetime, timedelta
 import pytz
 
@@ -201,42 +202,19 @@ async def handle_broadcast_message(client, message):
 async def start_broadcast_process(client, message, target, message_text):
     """Start the actual broadcast process"""
     try:
-        await message.reply_text("📢 Starting broadcast...")
+        # Recipients are read from the database in _id order when the job runs
+        job_id = await broadcast_jobs.enqueue(message.from_user.id, target, {'type': 'text', 'text': message_text})
+        if not job_id:
+            await message.reply_text("❌ Could not queue the broadcast.")
+            temp.BROADCAST_STATE['active'] = False
+            return
         
-        success_count = 0
-        failed_count = 0
-        
-        if target == "all" or target == "pm":
-            # Broadcast to PM users
-            users = await study_db.get_all_users()
-            for user in users:
-                try:
-                    await client.send_message(user['user_id'], message_text)
-                    success_count += 1
-                    await asyncio.sleep(0.1)  # Rate limiting
-                except Exception as e:
-                    failed_count += 1
-                    logger.error(f"Failed to send to user {user['user_id']}: {e}")
-        
-        if target == "all" or target == "groups":
-            # Broadcast to groups
-            groups = await study_db.get_all_chats()
-            for group in groups:
-                try:
-                    await client.send_message(group['chat_id'], message_text)
-                    success_count += 1
-                    await asyncio.sleep(0.1)  # Rate limiting
-                except Exception as e:
-                    failed_count += 1
-                    logger.error(f"Failed to send to group {group['chat_id']}: {e}")
-        
-        # Send completion message
-        completion_text = f"📢 **Broadcast Completed!**\n\n"
-        completion_text += f"✅ Successfully sent: {success_count}\n"
-        completion_text += f"❌ Failed: {failed_count}\n"
-        completion_text += f"🎯 Target: {target.title()}"
-        
-        await message.reply_text(completion_text)
+        await message.reply_text(
+            f"📢 **Broadcast Queued!**\n\n"
+            f"🆔 Job: `{job_id}`\n"
+            f"🎯 Target: {target.title()}\n\n"
+            f"Use `/cancelbroadcast {job_id}` to stop it."
+        )
         
         # Reset broadcast state
         temp.BROADCAST_STATE['active'] = False
@@ -1,97 +1,213 @@
 import asyncio
+import heapq
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
 from database.study_db import Users
+from database.notifications import notification_ledger
 from config import *
 
 logger = logging.getLogger(__name__)
 
-async def check_expired_premium(bot):
-    """Check and handle expired premium users"""
-    try:
-        logger.info("Starting premium expiration check...")
-        
+EXPIRED_TEXT = (
+    "⚠️ **Premium Expired**\n\n"
+    "Your premium subscription has expired.\n"
+    "You can renew your premium to continue enjoying:\n"
+    "• 🚀 Priority access to content\n"
+    "• 📚 Unlimited downloads\n"
+    "• 🎯 Advanced features\n"
+    "• 🏆 Premium support\n\n"
+    "Contact admin to renew your subscription."
+)
+
+# Longest sleep while nothing is due, so expiries written elsewhere are still picked up
+IDLE_RECHECK = 3600
+
+
+class PremiumExpiryScheduler:
+    """Expires premium users on time from a min-heap of the next upcoming expiries"""
+
+    def __init__(self, bot, collection, preload: int = PREMIUM_EXPIRY_PRELOAD, batch_size: int = PREMIUM_EXPIRY_BATCH):
+        self.bot = bot
+        self.col = collection
+        self.preload = preload
+        self.batch_size = batch_size
+        # (premium_expiry, user_id), earliest first
+        self.heap: List[Tuple[datetime, int]] = []
+        # Every expiry before this is in the heap; None once the whole range is loaded
+        self.horizon: Optional[datetime] = None
+        self.exhausted = False
+        self._wake = asyncio.Event()
+
+    async def ensure_indexes(self):
+        """Index premium users by expiry so range loads never scan"""
+        try:
+            await self.col.create_index(
+                [("premium_expiry", 1)],
+                partialFilterExpression={"is_premium": True}
+            )
+        except Exception as e:
+            logger.error(f"Error creating premium expiry index: {e}")
+        if notification_ledger:
+            await notification_ledger.ensure_indexes()
+
+    async def migrate_string_expiries(self):
+        """Convert ISO string expiries written by older /add_premium versions into dates"""
+        now = datetime.utcnow()
+        migrated = 0
+        async for doc in self.col.find({"premium_expiry": {"$type": "string"}}, {"premium_expiry": 1}):
+            try:
+                expiry = datetime.fromisoformat(doc["premium_expiry"].replace('Z', '+00:00'))
+            except ValueError:
+                logger.error(f"Invalid premium expiry for {doc['_id']}: {doc['premium_expiry']}")
+                continue
+            if expiry.tzinfo is not None:
+                expiry = expiry.astimezone(timezone.utc).replace(tzinfo=None)
+            await self.col.update_one(
+                {"_id": doc["_id"], "premium_expiry": doc["premium_expiry"]},
+                {"$set": {"premium_expiry": expiry, "is_premium": expiry > now}}
+            )
+            migrated += 1
+        if migrated:
+            logger.info(f"Migrated {migrated} string premium expiries")
+
+    async def refill(self):
+        """Load the next preload expiries after the current horizon"""
+        query = {"is_premium": True, "premium_expiry": {"$type": "date"}}
+        if self.horizon is not None:
+            query["premium_expiry"]["$gte"] = self.horizon
+        cursor = self.col.find(query, {"premium_expiry": 1}).sort("premium_expiry", 1).limit(self.preload)
+        docs = await cursor.to_list(length=self.preload)
+
+        for doc in docs:
+            heapq.heappush(self.heap, (doc["premium_expiry"], doc["_id"]))
+        self.exhausted = len(docs) < self.preload
+        if docs:
+            # Ties at the boundary are reloaded next time; expiring twice is a no-op
+            self.horizon = docs[-1]["premium_expiry"]
+        logger.debug(f"Loaded {len(docs)} upcoming premium expiries")
+
+    def schedule(self, user_id: int, expiry: datetime):
+        """Track a new or extended expiry that falls inside the loaded range"""
+        if self.exhausted or (self.horizon is not None and expiry < self.horizon):
+            heapq.heappush(self.heap, (expiry, user_id))
+            self._wake.set()
+
+    def _pop_due(self, now: datetime) -> List[int]:
+        """Pop up to batch_size users whose expiry has passed"""
+        due = []
+        while self.heap and self.heap[0][0] <= now and len(due) < self.batch_size:
+            due.append(heapq.heappop(self.heap)[1])
+        return list(dict.fromkeys(due))
+
+    async def expire(self, user_ids: List[int], now: datetime) -> List[Tuple[int, datetime]]:
+        """Expire a batch of users with one update, returning (user_id, expiry) of those expired"""
+        # Stale heap entries (extended or revoked since loading) are filtered out here
+        query = {"_id": {"$in": user_ids}, "is_premium": True, "premium_expiry": {"$lte": now}}
+        docs = await self.col.find(query, {"premium_expiry": 1}).to_list(length=len(user_ids))
+        expired = [(doc["_id"], doc["premium_expiry"]) for doc in docs]
+        if expired:
+            query["_id"] = {"$in": [user_id for user_id, _ in expired]}
+            await self.col.update_many(query, {"$set": {"is_premium": False, "premium_expiry": None}})
+        return expired
+
+    async def notify(self, expired: List[Tuple[int, datetime]]):
+        """Send expiration notices, once per subscription term"""
+        if not notification_ledger:
+            return
+        notices = [(user_id, "premium_expired", f"{expiry:%Y-%m-%d}", EXPIRED_TEXT) for user_id, expiry in expired]
+        counts = await notification_ledger.deliver(self.bot, notices)
+        logger.info(f"Expiration notices: {counts}")
+
+    async def _sleep(self, seconds: float):
+        """Sleep until the next expiry, waking early when a sooner one is scheduled"""
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=max(0, seconds))
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        """Main loop: refill, sleep until the earliest expiry, expire what is due"""
+        await self.ensure_indexes()
+        await self.migrate_string_expiries()
+        await self.refill()
         while True:
             try:
-                # Find users with expired premium
-                current_time = datetime.utcnow()
-                expired_users = await Users.find({
-                    "is_premium": True,
-                    "premium_expiry": {"$lt": current_time}
-                }).to_list(length=100)
-                
-                if expired_users:
-                    logger.info(f"Found {len(expired_users)} expired premium users")
-                    
-                    for user in expired_users:
-                        try:
-                            # Update user status
-                            user.is_premium = False
-                            user.premium_expiry = None
-                            await user.commit()
-                            
-                            # Send expiration notification
-                            try:
-                                await bot.send_message(
-                                    chat_id=user.user_id,
-                                    text="⚠️ **Premium Expired**\n\n"
-                                         "Your premium subscription has expired.\n"
-                                         "You can renew your premium to continue enjoying:\n"
-                                         "• 🚀 Priority access to content\n"
-                                         "• 📚 Unlimited downloads\n"
-                                         "• 🎯 Advanced features\n"
-                                         "• 🏆 Premium support\n\n"
-                                         "Contact admin to renew your subscription."
-                                )
-                                logger.info(f"Sent expiration notice to user {user.user_id}")
-                            except Exception as e:
-                                logger.error(f"Failed to send expiration notice to user {user.user_id}: {e}")
-                            
-                        except Exception as e:
-                            logger.error(f"Error processing expired user {user.user_id}: {e}")
-                            continue
-                    
-                    logger.info(f"Processed {len(expired_users)} expired premium users")
-                else:
-                    logger.debug("No expired premium users found")
-                
-                # Check for users approaching expiration (7 days before)
-                warning_date = current_time + timedelta(days=7)
-                warning_users = await Users.find({
-                    "is_premium": True,
-                    "premium_expiry": {"$lt": warning_date, "$gte": current_time}
-                }).to_list(length=100)
-                
-                if warning_users:
-                    logger.info(f"Found {len(warning_users)} users approaching premium expiration")
-                    
-                    for user in warning_users:
-                        try:
-                            days_left = (user.premium_expiry - current_time).days
-                            
-                            # Send warning notification
-                            await bot.send_message(
-                                chat_id=user.user_id,
-                                text=f"⚠️ **Premium Expiring Soon**\n\n"
-                                     f"Your premium subscription will expire in {days_left} days.\n"
-                                     "To continue enjoying premium features, please renew your subscription.\n\n"
-                                     "Contact admin to renew."
-                            )
-                            logger.info(f"Sent expiration warning to user {user.user_id}")
-                            
-                        except Exception as e:
-                            logger.error(f"Failed to send warning to user {user.user_id}: {e}")
-                            continue
-                
-                # Wait for 24 hours before next check
-                await asyncio.sleep(86400)  # 24 hours
-                
+                if not self.heap:
+                    if self.exhausted:
+                        await self._sleep(IDLE_RECHECK)
+                        # Catch expiries written without going through schedule()
+                        self.horizon, self.exhausted = None, False
+                    await self.refill()
+                    continue
+
+                now = datetime.utcnow()
+                next_expiry = self.heap[0][0]
+                if next_expiry > now:
+                    await self._sleep(min((next_expiry - now).total_seconds(), IDLE_RECHECK))
+                    continue
+
+                due = self._pop_due(now)
+                expired = await self.expire(due, now)
+                if expired:
+                    logger.info(f"Expired premium for {len(expired)} users")
+                    await self.notify(expired)
             except Exception as e:
-                logger.error(f"Error in premium check loop: {e}")
-                await asyncio.sleep(3600)  # Wait 1 hour before retry
-                
-    except Exception as e:
-        logger.error(f"Fatal error in premium check: {e}")
+                logger.error(f"Error in premium expiry scheduler: {e}")
+                await asyncio.sleep(60)
+
+
+# Running scheduler, used by extend_premium to register new expiries
+scheduler: Optional[PremiumExpiryScheduler] = None
+
+
+async def send_expiry_warnings(bot):
+    """Warn users whose premium expires within the next 7 days, once per subscription term"""
+    if not notification_ledger:
+        return
+    current_time = datetime.utcnow()
+    warning_date = current_time + timedelta(days=7)
+    cursor = Users.collection.find(
+        {"is_premium": True, "premium_expiry": {"$lt": warning_date, "$gte": current_time}},
+        {"premium_expiry": 1}
+    ).batch_size(PREMIUM_EXPIRY_BATCH)
+
+    notices = []
+    async for user in cursor:
+        expiry = user["premium_expiry"]
+        days_left = (expiry - current_time).days
+        notices.append((
+            user["_id"], "premium_warning", f"{expiry:%Y-%m-%d}",
+            f"⚠️ **Premium Expiring Soon**\n\n"
+            f"Your premium subscription will expire in {days_left} days.\n"
+            "To continue enjoying premium features, please renew your subscription.\n\n"
+            "Contact admin to renew."
+        ))
+        if len(notices) >= PREMIUM_EXPIRY_BATCH:
+            logger.info(f"Expiry warnings: {await notification_ledger.deliver(bot, notices)}")
+            notices = []
+    if notices:
+        logger.info(f"Expiry warnings: {await notification_ledger.deliver(bot, notices)}")
+
+
+async def _warning_loop(bot):
+    """Check for expiring subscriptions once a day; the ledger skips users already warned"""
+    while True:
+        try:
+            await send_expiry_warnings(bot)
+        except Exception as e:
+            logger.error(f"Error sending premium expiry warnings: {e}")
+        await asyncio.sleep(86400)  # 24 hours
+
+
+async def check_expired_premium(bot):
+    """Run the premium expiry scheduler and the daily expiry warnings"""
+    global scheduler
+    logger.info("Starting premium expiry scheduler...")
+    scheduler = PremiumExpiryScheduler(bot, Users.collection)
+    asyncio.get_event_loop().create_task(_warning_loop(bot))
+    await scheduler.run()
 
 async def get_premium_stats():
     """Get premium user statistics"""
@@ -154,6 +270,8 @@ async def extend_premium(user_id: int, days: int):
         user.is_premium = True
         user.premium_expiry = new_expiry
         await user.commit()
+        if scheduler:
+            scheduler.schedule(user_id, new_expiry)
         
         logger.info(f"Extended premium for user {user_id} by {days} days")
         return True, f"Premium extended by {days} days"
@@ -3,7 +3,14 @@ from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from database.study_db import db as study_db, StudyFiles, Batches, Chapters, Users, StudySessions, ContentAnalytics, BotSettings, JoinRequests, Chats, GroupSettings
 from config import *
+from database.counters import counters
+from database.user_registry import user_registry
+from database.progress import progress_tracker
+from database.sessions import session_tracker
 from studybot.Bot import studybot, content_bot
+from studybot.util.delivery import content_delivery
+from database.prefetch import lecture_prefetcher
+from utils import progress_key
 import re
 
 logger = logging.getLogger(__name__)
@@ -173,17 +180,8 @@ Please check your Content Bot for the file."""
         
         # Send the lecture file from content bot
         try:
-            # Find the lecture file in database
-            file_query = {
-                "batch_name": batch_name,
-                "subject": subject,
-                "teacher": teacher,
-                "chapter_no": chapter,
-                "content_type": "Lectures",
-                "file_name": {"$regex": f"{lecture_num}", "$options": "i"}
-            }
-            
-            study_file = await StudyFiles.find_one(file_query)
+            # Find the lecture file, served from memory when the previous lecture prefetched it
+            study_file = await lecture_prefetcher.get(batch_name, subject, teacher, chapter, lecture_num)
             
             if study_file:
                 # Send file from content bot
@@ -203,24 +201,13 @@ Please check your Content Bot for the file."""
 
 💡 **Note:** This file is sent from the Content Bot."""
                 )
+                content_delivery.submit(content_bot, user_id, [study_file])
+                
+                # Students usually continue with the next lecture, warm it up now
+                lecture_prefetcher.prefetch(content_bot, batch_name, subject, teacher, chapter, lecture_num)
                 
                 # Update user statistics
-                user = await Users.find_one({"_id": user_id})
-                if user:
-                    user.total_downloads += 1
-                    user.last_active = datetime.utcnow()
-                    
-                    # Update study progress
-                    progress_key = f"{batch_name}.{subject}.{chapter}"
-                    if not user.study_progress:
-                        user.study_progress = {}
-                    if progress_key not in user.study_progress:
-                        user.study_progress[progress_key] = {}
-                    if "Lectures" not in user.study_progress[progress_key]:
-                        user.study_progress[progress_key]["Lectures"] = 0
-                    user.study_progress[progress_key]["Lectures"] += 1
-                    
-                    await user.commit()
+                await record_download(callback_query.from_user, study_file, batch_name, subject, chapter, "Lectures")
                 
                 logger.info(f"Lecture {lecture_num} sent successfully to user {user_id}")
                 
@@ -322,22 +309,7 @@ Please check your Content Bot for the file."""
                 )
                 
                 # Update user statistics
-                user = await Users.find_one({"_id": user_id})
-                if user:
-                    user.total_downloads += 1
-                    user.last_active = datetime.utcnow()
-                    
-                    # Update study progress
-                    progress_key = f"{batch_name}.{subject}.{chapter}"
-                    if not user.study_progress:
-                        user.study_progress = {}
-                    if progress_key not in user.study_progress:
-                        user.study_progress[progress_key] = {}
-                    if "DPP Quiz" not in user.study_progress[progress_key]:
-                        user.study_progress[progress_key]["DPP Quiz"] = 0
-                    user.study_progress[progress_key]["DPP Quiz"] += 1
-                    
-                    await user.commit()
+                await record_download(callback_query.from_user, study_file, batch_name, subject, chapter, "DPP Quiz")
                 
                 logger.info(f"DPP Quiz sent successfully to user {user_id}")
                 
@@ -439,22 +411,7 @@ Please check your Content Bot for the file."""
                 )
                 
                 # Update user statistics
-                user = await Users.find_one({"_id": user_id})
-                if user:
-                    user.total_downloads += 1
-                    user.last_active = datetime.utcnow()
-                    
-                    # Update study progress
-                    progress_key = f"{batch_name}.{subject}.{chapter}"
-                    if not user.study_progress:
-                        user.study_progress = {}
-                    if progress_key not in user.study_progress:
-                        user.study_progress[progress_key] = {}
-                    if "DPP PDF" not in user.study_progress[progress_key]:
-                        user.study_progress[progress_key]["DPP PDF"] = 0
-                    user.study_progress[progress_key]["DPP PDF"] += 1
-                    
-                    await user.commit()
+                await record_download(callback_query.from_user, study_file, batch_name, subject, chapter, "DPP PDF")
                 
                 logger.info(f"DPP PDF sent successfully to user {user_id}")
                 
@@ -573,22 +530,7 @@ Please check your Content Bot for the content."""
                 )
                 
                 # Update user statistics
-                user = await Users.find_one({"_id": user_id})
-                if user:
-                    user.total_downloads += 1
-                    user.last_active = datetime.utcnow()
-                    
-                    # Update study progress
-                    progress_key = f"{batch_name}.{subject}.{chapter}"
-                    if not user.study_progress:
-                        user.study_progress = {}
-                    if progress_key not in user.study_progress:
-                        user.study_progress[progress_key] = {}
-                    if material_name not in user.study_progress[progress_key]:
-                        user.study_progress[progress_key][material_name] = 0
-                    user.study_progress[progress_key][material_name] += 1
-                    
-                    await user.commit()
+                await record_download(callback_query.from_user, study_file, batch_name, subject, chapter, material_name)
                 
                 logger.info(f"{material_name} sent successfully to user {user_id}")
                 
@@ -657,5 +599,23 @@ def get_file_size(size_bytes: int) -> str:
         i += 1
     return f"{size_bytes:.1f}{size_names[i]}"
 
+# Buffered statistics for delivered files
+async def record_download(user, study_file, batch_name, subject, chapter, content_name):
+    """Queue download counters for the user and the file, written in bulk by the counter buffer"""
+    if user_registry:
+        await user_registry.touch(user)
+    session_tracker.begin(user.id, batch_name, subject, chapter)
+    
+    # Material names are free text, escape them the same way as the chapter key
+    content_key = content_name.replace('.', '_')
+    counters.incr(Users.collection, user.id, {
+        'total_downloads': 1,
+        f'study_progress.{progress_key(batch_name, subject, chapter)}.{content_key}': 1
+    }, upsert=False)
+    # Every tap shows the file card and queues the file, so it counts as a view and a download
+    counters.incr(ContentAnalytics.collection, f"analytics_{study_file.file_id}", {'views': 1, 'downloads': 1}, upsert=False)
+    if progress_tracker:
+        await progress_tracker.record_download(user.id, batch_name, subject, chapter)
+
 # Log when plugin loads
 logger.info("Command plugin loaded successfully")
@@ -4,6 +4,8 @@ from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from database.study_db import db as study_db, StudyFiles, Batches, Chapters, Users, StudySessions, ContentAnalytics, BotSettings, JoinRequests, Chats, GroupSettings, search_study_files, get_study_files
 from config import *
 from studybot.Bot import content_bot
+from database.user_registry import user_registry
+from utils import split_progress_key
 import re
 
 logger = logging.getLogger(__name__)
@@ -14,6 +16,10 @@ async def content_start_command(client: Client, message: Message):
     user_id = message.from_user.id
     first_name = message.from_user.first_name
     
+    # Remember that this user can now receive messages from the content bot
+    if user_registry:
+        await user_registry.touch(message.from_user, bot="content")
+    
     welcome_text = f"""Hello {first_name}! 👋
 
 All your Files will be sent here.
@@ -192,7 +198,7 @@ async def content_progress_command(client: Client, message: Message):
         progress_text = "📈 **Your Study Progress**\n\n"
         
         for progress_key, progress_data in user.study_progress.items():
-            batch_name, subject, chapter_no = progress_key.split('.')
+            batch_name, subject, chapter_no = split_progress_key(progress_key)
             progress_text += f"📚 **{batch_name}** - {subject}\n"
             progress_text += f"   📖 Chapter: {chapter_no}\n"
             
@@ -80,7 +80,8 @@ async def handle_file_upload(client: Client, message: Message):
             "file_size": file_size,
             "file_type": file_type,
             "mime_type": mime_type,
-            "message_id": message.message_id
+            "chat_id": message.chat.id,
+            "message_id": message.id
         }
         
         logger.info(f"Admin {user_id} uploaded file: {file_name} ({file_type})")
@@ -190,6 +191,8 @@ async def handle_file_info(client: Client, message: Message):
             existing_file.file_size = file_info["file_size"]
             existing_file.file_type = file_info["file_type"]
             existing_file.mime_type = file_info["mime_type"]
+            existing_file.chat_id = file_info["chat_id"]
+            existing_file.message_id = file_info["message_id"]
             existing_file.uploaded_at = datetime.utcnow()
             existing_file.uploaded_by = user_id
             existing_file.is_active = True
@@ -224,6 +227,8 @@ async def handle_file_info(client: Client, message: Message):
                 file_size=file_info["file_size"],
                 file_type=file_info["file_type"],
                 mime_type=file_info["mime_type"],
+                chat_id=file_info["chat_id"],
+                message_id=file_info["message_id"],
                 uploaded_at=datetime.utcnow(),
                 uploaded_by=user_id,
                 is_active=True
@@ -6,7 +6,8 @@ from pyrogram import Client, filters, enums
 from pyrogram.errors import FloodWait
 from pyrogram.errors.exceptions.bad_request_400 import ChannelInvalid, ChatAdminRequired, UsernameInvalid, UsernameNotModified
 from config import ADMINS, INDEX_REQ_CHANNEL as LOG_CHANNEL
-from database.study_db import save_file
+from database.ia_filterdb import save_file
+from database.study_db import get_unsourced_study_files, set_study_file_source
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from utils import temp, get_readable_time
 from math import ceil
@@ -119,8 +120,12 @@ async def index_files_to_db(lst_msg_id, chat, msg, bot):
     no_media = 0
     unsupported = 0
     index = 0
+    linked = 0
     temp.CANCEL = False
     
+    # Study files uploaded without a source message get one when the same file is indexed
+    unsourced = await get_unsourced_study_files()
+    
     async for message in bot.iter_messages(chat, lst_msg_id, reverse=True):
         if temp.CANCEL:
             await msg.edit(f"Successfully Cancelled!!\n\nCompleted : {index}\nTotal Saved : {total_files}\nDuplicate : {duplicate}\nDeleted : {deleted}\nErrors : {errors}\nUnsupported : {unsupported}")
@@ -134,11 +139,19 @@ async def index_files_to_db(lst_msg_id, chat, msg, bot):
             continue
         
         try:
-            file = await save_file(message)
+            media = getattr(message, message.media.value)
+            if message.media == enums.MessageMediaType.PHOTO:
+                media.file_name = f"photo_{media.file_unique_id}.jpg"
+            media.file_type = message.media.value
+            media.caption = message.caption
+            file = await save_file(media, message.chat.id, message.id)
             if file:
                 total_files += 1
             else:
                 duplicate += 1
+            doc_ids = unsourced.pop((media.file_name, media.file_size), None)
+            if doc_ids:
+                linked += await set_study_file_source(doc_ids, message.chat.id, message.id)
         except Exception as e:
             logger.error(f"Error saving file: {e}")
             errors += 1
@@ -153,4 +166,4 @@ async def index_files_to_db(lst_msg_id, chat, msg, bot):
             except Exception as e:
                 logger.error(f"Error updating message: {e}")
     
-    await msg.edit(f"Indexing Completed!\n\nTotal Files : {total_files}\nDuplicate : {duplicate}\nDeleted : {deleted}\nErrors : {errors}\nUnsupported : {unsupported}")
+    await msg.edit(f"Indexing Completed!\n\nTotal Files : {total_files}\nDuplicate : {duplicate}\nStudy Files Linked : {linked}\nDeleted : {deleted}\nErrors : {errors}\nUnsupported : {unsupported}")
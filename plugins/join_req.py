@@ -5,6 +5,7 @@ from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message,
 from pyrogram.errors import FloodWait, UserNotParticipant, ChatAdminRequired
 from config import *
 from database.study_db import db as study_db
+from database.users_chats_db import db as users_db
 from utils import temp, get_readable_time
 from datetime import datetime, timedelta
 import pytz
@@ -22,12 +23,11 @@ async def handle_join_request(client, chat_join_request):
         logger.info(f"Join request from {user.id} ({user.first_name}) to {chat.id} ({chat.title})")
         
         # Store join request in database
-        await study_db.add_join_request(
+        await users_db.add_join_request(
             user_id=user.id,
             chat_id=chat.id,
             user_name=user.first_name,
-            chat_title=chat.title,
-            timestamp=int(asyncio.get_event_loop().time())
+            chat_title=chat.title
         )
         
         # Send notification to admins if configured
@@ -82,7 +82,7 @@ async def approve_join_request(client, callback_query):
         await client.approve_chat_join_request(chat_id, user_id)
         
         # Update database
-        await study_db.update_join_request(user_id, chat_id, {"status": "approved", "approved_by": callback_query.from_user.id})
+        await users_db.update_join_request(user_id, chat_id, {"status": "approved", "approved_by": callback_query.from_user.id})
         
         # Send success message
         await callback_query.answer("✅ Join request approved!")
@@ -130,7 +130,7 @@ async def decline_join_request(client, callback_query):
         await client.decline_chat_join_request(chat_id, user_id)
         
         # Update database
-        await study_db.update_join_request(user_id, chat_id, {"status": "declined", "declined_by": callback_query.from_user.id})
+        await users_db.update_join_request(user_id, chat_id, {"status": "declined", "declined_by": callback_query.from_user.id})
         
         # Send success message
         await callback_query.answer("❌ Join request declined!")
@@ -272,13 +272,8 @@ async def ban_user_from_join_request(client, callback_query):
     try:
         user_id = int(callback_query.data.split("_")[2])
         
-        # Ban the user
-        await study_db.update_user(user_id, {
-            'banned': True,
-            'ban_reason': 'Join request abuse',
-            'banned_by': callback_query.from_user.id,
-            'banned_at': int(asyncio.get_event_loop().time())
-        })
+        # Ban the user; users_db keeps the in-memory ban registry in sync
+        await users_db.ban_user(user_id, 'Join request abuse')
         
         await callback_query.answer("✅ User banned successfully!")
         
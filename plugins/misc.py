@@ -7,6 +7,7 @@ from pyrogram.errors import FloodWait, UserNotParticipant, ChatAdminRequired
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message
 from config import *
 from database.study_db import db as study_db
+from database.progress import progress_tracker
 from utils import temp, get_readable_time
 
 logger = logging.getLogger(__name__)
@@ -228,37 +229,10 @@ async def stats_command(client, message):
     user_id = message.from_user.id
     
     try:
-        # Get user from database
-        user = await study_db.get_user(user_id)
+        # Aggregates are kept up to date as sessions and downloads are recorded
+        stats_text = await progress_tracker.get_summary(user_id) if progress_tracker else None
         
-        if user:
-            # Calculate statistics
-            total_sessions = len(user.get('study_sessions', []))
-            total_time = sum(session.get('duration', 0) for session in user.get('study_sessions', []))
-            current_streak = user.get('current_streak', 0)
-            achievements = len(user.get('achievements', []))
-            
-            # Calculate average session time
-            avg_session_time = total_time / total_sessions if total_sessions > 0 else 0
-            
-            # Get recent activity
-            recent_sessions = sorted(user.get('study_sessions', []), key=lambda x: x.get('timestamp', 0), reverse=True)[:5]
-            
-            stats_text = f"📊 **Your Study Statistics**\n\n"
-            stats_text += f"📚 **Total Study Sessions:** {total_sessions}\n"
-            stats_text += f"⏱️ **Total Study Time:** {get_readable_time(total_time)}\n"
-            stats_text += f"📈 **Average Session:** {get_readable_time(avg_session_time)}\n"
-            stats_text += f"🎯 **Current Streak:** {current_streak} days\n"
-            stats_text += f"🏆 **Achievements:** {achievements}\n"
-            stats_text += f"📅 **Member Since:** {get_readable_time(user.get('joined_at', 0))}"
-            
-            if recent_sessions:
-                stats_text += f"\n\n📝 **Recent Activity:**\n"
-                for i, session in enumerate(recent_sessions, 1):
-                    session_time = get_readable_time(session.get('duration', 0))
-                    session_date = get_readable_time(session.get('timestamp', 0))
-                    stats_text += f"{i}. {session_time} - {session_date}\n"
-            
+        if stats_text:
             buttons = [
                 [InlineKeyboardButton("📈 Detailed Stats", callback_data="detailed_stats")],
                 [InlineKeyboardButton("🏆 Achievements", callback_data="achievements")],
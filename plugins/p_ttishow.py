@@ -12,6 +12,7 @@ import psutil
 import logging
 from time import time
 from bot import botStartTime
+from database.broadcast_jobs import broadcast_jobs
 
 """-----------------------------------------Study Bot - Group Management--------------------------------------"""
 
@@ -214,30 +215,20 @@ async def broadcast_handler(bot, message):
         broadcast_message = " ".join(message.command[1:])
     
     try:
-        users = await users_db.get_all_users()
-        success_count = 0
-        failed_count = 0
+        if isinstance(broadcast_message, str):
+            payload = {'type': 'text', 'text': broadcast_message}
+        else:
+            # Copy the replied message so media broadcasts survive a restart
+            payload = {'type': 'copy', 'chat_id': broadcast_message.chat.id, 'message_id': broadcast_message.id}
+        job_id = await broadcast_jobs.enqueue(message.from_user.id, "pm", payload)
+        if not job_id:
+            return await message.reply_text("❌ Could not queue the broadcast.")
         
-        await message.reply_text("📢 Starting broadcast...")
-        
-        for user in users:
-            try:
-                if isinstance(broadcast_message, str):
-                    await bot.send_message(user['id'], broadcast_message)
-                else:
-                    await broadcast_message.copy(user['id'])
-                success_count += 1
-                await asyncio.sleep(0.1)  # Rate limiting
-            except Exception as e:
-                failed_count += 1
-                logging.error(f"Failed to send to user {user['id']}: {e}")
-        
-        completion_text = f"📢 **Broadcast Completed!**\n\n"
-        completion_text += f"✅ Successfully sent: {success_count}\n"
-        completion_text += f"❌ Failed: {failed_count}\n"
-        completion_text += f"📊 Total Users: {len(users)}"
-        
-        await message.reply_text(completion_text)
+        await message.reply_text(
+            f"📢 **Broadcast Queued!**\n\n"
+            f"🆔 Job: `{job_id}`\n\n"
+            "You will get a report when it finishes."
+        )
         
     except Exception as e:
         logging.error(f"Error in broadcast: {e}")
@@ -4,6 +4,8 @@ from datetime import datetime
 from pyrogram import Client, filters, enums
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from database.study_db import db as study_db
+from database.user_registry import user_registry
+from studybot.Bot.clients import client_name
 from config import *
 from utils import temp, get_readable_time
 
@@ -60,15 +62,13 @@ async def process_batch_command(client: Client, message: Message, batch_name: st
         user_id = message.from_user.id
         first_name = message.from_user.first_name
         
-        # Get or create user
-        user = await study_db.get_user(user_id)
-        if not user:
-            await study_db.add_user(user_id, first_name)
+        # Register user on first contact, last_active is written in batches
+        if user_registry:
+            await user_registry.touch(message.from_user, bot=client_name(client))
         
-        # Update user's current batch and last active
+        # Update user's current batch
         await study_db.update_user(user_id, {
-            'current_batch': batch_name,
-            'last_active': int(asyncio.get_event_loop().time())
+            'current_batch': batch_name
         })
         
         # Get batch information
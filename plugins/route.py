@@ -4,9 +4,12 @@ from pyrogram import Client, filters, enums
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message
 from pyrogram.errors import FloodWait
 from database.study_db import db as study_db
+from database.user_registry import user_registry
+from studybot.Bot.clients import client_name
+from database.progress import progress_tracker
 from config import *
 from Script import script
-from utils import temp, get_readable_time
+from utils import temp
 from datetime import datetime, timedelta
 import pytz
 
@@ -15,11 +18,9 @@ logger = logging.getLogger(__name__)
 @Client.on_message(filters.command("route") & filters.private)
 async def route_command(client, message):
     """Handle route command for navigation"""
-    user_id = message.from_user.id
-    
-    # Check if user exists in database
-    if not await study_db.is_user_exist(user_id):
-        await study_db.add_user(user_id, message.from_user.first_name)
+    # Register user on first contact
+    if user_registry:
+        await user_registry.touch(message.from_user, bot=client_name(client))
     
     # Show route options
     buttons = [
@@ -40,7 +41,6 @@ async def route_command(client, message):
 async def route_callback(client, callback_query):
     """Handle route callback queries"""
     data = callback_query.data
-    user_id = callback_query.from_user.id
     
     if data == "route_home":
         await show_home(client, callback_query)
@@ -107,18 +107,9 @@ async def show_progress(client, callback_query):
     """Show user progress"""
     user_id = callback_query.from_user.id
     
-    # Get user progress from database
-    user = await study_db.get_user(user_id)
-    if user:
-        total_sessions = len(user.get('study_sessions', []))
-        total_time = sum(session.get('duration', 0) for session in user.get('study_sessions', []))
-        
-        progress_text = f"📊 **Your Progress**\n\n"
-        progress_text += f"📚 Total Study Sessions: {total_sessions}\n"
-        progress_text += f"⏱️ Total Study Time: {get_readable_time(total_time)}\n"
-        progress_text += f"🎯 Current Streak: {user.get('current_streak', 0)} days\n"
-        progress_text += f"🏆 Achievements: {len(user.get('achievements', []))}"
-    else:
+    # Aggregates are kept up to date as sessions and downloads are recorded
+    progress_text = await progress_tracker.get_summary(user_id) if progress_tracker else None
+    if not progress_text:
         progress_text = "📊 **Your Progress**\n\nNo progress data available yet."
     
     buttons = [
@@ -3,29 +3,44 @@ from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from database.study_db import db as study_db, StudyFiles, Batches, Chapters, Users, StudySessions, ContentAnalytics, BotSettings, JoinRequests, Chats, GroupSettings, get_study_files, get_batch_info, create_batch
 from config import *
+from database.user_registry import user_registry
+from database.sessions import session_tracker
 from studybot.Bot import studybot, content_bot
+from studybot.util.delivery import content_delivery
+from database.prefetch import lecture_prefetcher
+from plugins.check_expired_premium import check_user_premium
 import re
 import json
 
 logger = logging.getLogger(__name__)
 
+# content_type stored by /fileinfo for each DPP and study material button
+CONTENT_TYPES = {
+    "dpp": {"QUIZ": "DPP Quiz", "PDF": "DPP PDF"},
+    "material": {
+        "mind_maps": "Mind Maps",
+        "revision": "Revision",
+        "short_notes": "Short Notes",
+        "pyqs": "PYQs",
+        "kpp_pdf": "KPP PDF",
+        "kpp_solution": "KPP Solution",
+        "practice_sheet": "Practice Sheet",
+        "kattar_neet": "Kattar NEET 2026",
+        "important": "IMPORTANT",
+        "handwritten": "Handwritten Notes",
+        "module_question": "Module Question"
+    }
+}
+
 # Command handlers
 @studybot.on_message(filters.command("start") & filters.private)
 async def start_command(client: Client, message: Message):
     """Handle /start command in private chat"""
-    user_id = message.from_user.id
     first_name = message.from_user.first_name
     
-    # Create or update user
-    user = await Users.find_one({"_id": user_id})
-    if not user:
-        user_doc = Users(
-            user_id=user_id,
-            first_name=first_name,
-            last_name=message.from_user.last_name,
-            username=message.from_user.username
-        )
-        await user_doc.commit()
+    # Register user on first contact
+    if user_registry:
+        await user_registry.touch(message.from_user)
     
     welcome_text = f"""Hello {first_name}! 👋
 
@@ -277,6 +292,9 @@ async def content_callback(client: Client, callback_query: CallbackQuery):
         data = callback_query.data
         _, batch_name, subject, teacher, chapter_no, content_type = data.split("_", 5)
         
+        # Selecting content opens a study session for this chapter
+        session_tracker.begin(callback_query.from_user.id, batch_name, subject, chapter_no)
+        
         if content_type == "LECTURES":
             await handle_lectures(client, callback_query, batch_name, subject, teacher, chapter_no)
         elif content_type == "DPP":
@@ -386,35 +404,59 @@ async def final_content_callback(client: Client, callback_query: CallbackQuery):
     """Handle final content selection and forward to content bot"""
     try:
         data = callback_query.data
-        content_type, batch_name, subject, teacher, chapter_no, specific_type = data.split("_", 5)
+        kind, batch_name, subject, teacher, chapter_no, specific_type = data.split("_", 5)
         
         # Get content from database
-        files = await get_study_files(
-            batch_name=batch_name,
-            subject=subject,
-            chapter_no=chapter_no,
-            content_type=content_type.upper()
-        )
+        if kind == "lecture":
+            # Lectures are matched by number in the file name, served from memory when prefetched
+            study_file = await lecture_prefetcher.get(batch_name, subject, teacher, chapter_no, specific_type)
+            files = [study_file] if study_file else []
+        else:
+            content_type = CONTENT_TYPES[kind].get(specific_type)
+            files = await get_study_files(
+                limit=None,
+                batch_name=batch_name,
+                subject=subject,
+                teacher=teacher,
+                chapter_no=chapter_no,
+                content_type=content_type
+            ) if content_type else []
         
         if not files:
             await callback_query.answer("❌ No content found for this selection", show_alert=True)
             return
         
-        # Forward to content bot
+        # Queue the cached files for the content bot, sent as media groups with premium users first
         try:
-            await content_bot.send_message(
-                chat_id=callback_query.from_user.id,
-                text=f"📚 **{batch_name}** - {subject}\n**Chapter {chapter_no}**\n\nHere's your requested content:"
-            )
+            user_id = callback_query.from_user.id
             
-            # Send files (you can customize this based on your content bot setup)
-            for file in files[:5]:  # Limit to 5 files
-                await content_bot.send_message(
-                    chat_id=callback_query.from_user.id,
-                    text=f"📄 {file.file_name}\n\n**Type:** {file.content_type}\n**Size:** {file.file_size} bytes"
+            async def content_bot_unreachable(error):
+                # The content bot can only message users who started it, so tell them from the main bot
+                await client.send_message(
+                    user_id,
+                    f"❌ **Content not delivered**\n\n"
+                    f"📚 **{batch_name}** - {subject}, Chapter {chapter_no}\n\n"
+                    f"The Content Bot can't message you yet. Open the Content Bot, press **Start** "
+                    f"and request the content again."
                 )
             
-            await callback_query.answer("✅ Content sent to your PM!", show_alert=True)
+            ahead = content_delivery.submit(
+                content_bot,
+                user_id,
+                files,
+                header=f"📚 **{batch_name}** - {subject}\n**Chapter {chapter_no}**\n\nHere's your requested content:",
+                premium=await check_user_premium(user_id),
+                on_unreachable=content_bot_unreachable
+            )
+            
+            if kind == "lecture":
+                # Students usually continue with the next lecture, warm it up now
+                lecture_prefetcher.prefetch(content_bot, batch_name, subject, teacher, chapter_no, specific_type)
+            
+            if ahead:
+                await callback_query.answer(f"✅ {len(files)} files queued, {ahead} deliveries ahead of you!", show_alert=True)
+            else:
+                await callback_query.answer("✅ Content is on its way to your PM!", show_alert=True)
             
         except Exception as e:
             logger.error(f"Error forwarding to content bot: {e}")
@@ -454,6 +496,12 @@ async def back_button_callback(client: Client, callback_query: CallbackQuery):
         logger.error(f"Error in back button callback: {e}")
         await callback_query.answer("❌ An error occurred", show_alert=True)
 
+# Any navigation keeps an open study session alive; runs alongside the handlers above
+@studybot.on_callback_query(group=1)
+async def session_heartbeat(client: Client, callback_query: CallbackQuery):
+    """Refresh the user's open study session on navigation"""
+    session_tracker.heartbeat(callback_query.from_user.id)
+
 # Admin commands
 @studybot.on_message(filters.command("addbatch") & filters.user(ADMINS))
 async def add_batch_command(client: Client, message: Message):
@@ -1,6 +1,12 @@
+import hmac
 import logging
+import os
 from aiohttp import web
 from config import *
+from database.analytics_export import export_analytics, remove_export
+from studybot.util.outbound import outbound_stats
+from studybot.util.delivery import content_delivery
+from database.prefetch import lecture_prefetcher
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +20,7 @@ async def web_server():
         app.router.add_get('/health', handle_health)
         app.router.add_get('/stats', handle_stats)
         app.router.add_get('/status', handle_status)
+        app.router.add_get('/export', handle_export)
         
         # Add CORS middleware
         app.middlewares.append(web.middleware.cors.cors_middleware)
@@ -145,6 +152,9 @@ async def handle_status(request):
             "database": "connected",
             "telegram_api": "connected",
             "web_server": "running",
+            "outbound": outbound_stats(),
+            "delivery": content_delivery.stats(),
+            "prefetch": lecture_prefetcher.stats(),
             "timestamp": "2024-01-01T00:00:00Z"
         }
         
@@ -154,6 +164,34 @@ async def handle_status(request):
         logger.error(f"Error handling status request: {e}")
         return web.json_response({"error": "Failed to get status"}, status=500)
 
+async def handle_export(request):
+    """Handle analytics export request, protected by EXPORT_TOKEN"""
+    # Prefer the header so the token stays out of proxy and access logs
+    token = request.headers.get('X-Export-Token') or request.query.get('token', '')
+    if not EXPORT_TOKEN or not hmac.compare_digest(token.encode(), EXPORT_TOKEN.encode()):
+        return web.json_response({"error": "Forbidden"}, status=403)
+    
+    archive = await export_analytics(request.query.get('format', 'csv'))
+    if not archive:
+        return web.json_response({"error": "Failed to build export"}, status=500)
+    
+    try:
+        response = web.StreamResponse(headers={
+            "Content-Type": "application/zip",
+            "Content-Disposition": f'attachment; filename="{os.path.basename(archive)}"'
+        })
+        await response.prepare(request)
+        with open(archive, 'rb') as f:
+            while chunk := f.read(1024 * 1024):
+                await response.write(chunk)
+        await response.write_eof()
+        return response
+    except Exception as e:
+        logger.error(f"Error handling export request: {e}")
+        raise
+    finally:
+        remove_export(archive)
+
 # Additional utility functions
 def add_route(app, path, handler, method='GET'):
     """Add a route to the web application"""
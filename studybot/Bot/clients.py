@@ -1,9 +1,138 @@
-import asyncio
 import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple
+
+try:
+    from config import BROADCAST_RATE, BROADCAST_MAX_RETRIES, USER_CACHE_SIZE
+except ImportError:
+    # Fallback configuration values
+    BROADCAST_RATE = 25
+    BROADCAST_MAX_RETRIES = 3
+    USER_CACHE_SIZE = 50000
+
 from studybot.Bot import clients, studybot, content_bot
+from studybot.util.broadcast import (
+    broadcast_engine, broadcast_bucket, flood_wait_seconds, classify_error, DEAD_CLASSES, TokenBucket, BroadcastEngine
+)
+from studybot.util.outbound import install
 
 logger = logging.getLogger(__name__)
 
+
+class ClientPool:
+    """Spreads outbound sends over every connected bot, each with its own rate budget"""
+
+    def __init__(self, members: Dict, buckets: Dict[str, TokenBucket] = None, rate: float = BROADCAST_RATE,
+                 max_retries: int = BROADCAST_MAX_RETRIES, max_routes: int = USER_CACHE_SIZE):
+        self.members = members
+        self.buckets = {name: (buckets or {}).get(name) or TokenBucket(rate) for name in members}
+        self.max_retries = max_retries
+        self.max_routes = max_routes
+        # LRU of chat_id -> bots the chat can be reached from
+        self._routes: "OrderedDict[int, tuple]" = OrderedDict()
+        self.sent = {name: 0 for name in members}
+        self.failovers = 0
+        # (chat_id, bot) pairs where a bot found the chat unreachable but another bot delivered
+        self._unreachable: List[Tuple[int, str]] = []
+
+    def available(self) -> List[str]:
+        """Names of the clients that are currently connected"""
+        return [name for name, client in self.members.items() if client.is_connected]
+
+    def learn(self, chat_id: int, bots: Iterable[str]):
+        """Remember which bots a chat has started"""
+        self._routes[chat_id] = tuple(sorted(bots))
+        self._routes.move_to_end(chat_id)
+        while len(self._routes) > self.max_routes:
+            self._routes.popitem(last=False)
+
+    def candidates(self, chat_id: int, bots: Iterable[str] = None) -> List[str]:
+        """Clients able to reach a chat, sticky choice first, then those not held by a FloodWait"""
+        allowed = tuple(sorted(bots)) if bots else self._routes.get(chat_id, ("main",))
+        names = [name for name in allowed if name in self.members and self.members[name].is_connected]
+        if not names:
+            return ["main"]
+        # The same chat always prefers the same bot, so a conversation stays in one place
+        start = chat_id % len(names)
+        return self._by_pause(names[start:] + names[:start])
+
+    def _drop_route(self, chat_id: int, name: str):
+        """Stop routing a chat through a bot that cannot reach it"""
+        route = self._routes.get(chat_id)
+        if route and name in route:
+            remaining = tuple(bot for bot in route if bot != name)
+            if remaining:
+                self._routes[chat_id] = remaining
+            else:
+                del self._routes[chat_id]
+        self._unreachable.append((chat_id, name))
+
+    def take_unreachable(self) -> List[Tuple[int, str]]:
+        """Return and clear the bots found unable to reach chats since the last call"""
+        unreachable, self._unreachable = self._unreachable, []
+        return unreachable
+
+    def _by_pause(self, names: List[str]) -> List[str]:
+        """Order clients by remaining FloodWait, keeping the given order among free ones"""
+        now = time.monotonic()
+        return sorted(names, key=lambda name: max(self.buckets[name].paused_until - now, 0))
+
+    async def call(self, chat_id: int, method: str, *args, bots: Iterable[str] = None, **kwargs):
+        """Run a client send method for a chat, failing over to another bot on FloodWait or when a bot cannot reach it"""
+        names = self.candidates(chat_id, bots)
+        attempts = len(names) + self.max_retries
+        unreachable = []
+        for attempt in range(attempts):
+            name = names[0]
+            bucket = self.buckets[name]
+            await bucket.acquire()
+            try:
+                result = await getattr(self.members[name], method)(chat_id, *args, **kwargs)
+                self.sent[name] += 1
+                # Only once another bot got through is the chat known to be alive
+                for dead in unreachable:
+                    self._drop_route(chat_id, dead)
+                return result
+            except Exception as e:
+                wait = flood_wait_seconds(e)
+                if wait is None and classify_error(e) in DEAD_CLASSES and len(names) > 1 and attempt < attempts - 1:
+                    # The user blocked or never started this bot; the others may still reach them
+                    unreachable.append(name)
+                    names = names[1:]
+                    self.failovers += 1
+                    logger.warning(f"{name} client cannot reach {chat_id}, failing over")
+                    continue
+                if wait is None or attempt == attempts - 1:
+                    raise
+                bucket.pause(wait + 1)
+                if len(names) > 1:
+                    self.failovers += 1
+                    logger.warning(f"{name} client FloodWaited for {wait}s, failing over")
+                names = self._by_pause(names)
+
+    def stats(self) -> Dict:
+        """Sends per client and failover count"""
+        return {"sent": dict(self.sent), "failovers": self.failovers}
+
+
+# Every outgoing call of each bot goes through its own outbound scheduler
+for _name, _client in clients.items():
+    install(_client, _name)
+
+# The main bot keeps the shared broadcast bucket so single-client senders stay within its budget
+client_pool = ClientPool(clients, buckets={"main": broadcast_bucket})
+# Total send rate is capped by the per-client buckets inside the pool
+pool_engine = BroadcastEngine(TokenBucket(BROADCAST_RATE * len(clients)))
+
+
+def client_name(client) -> str:
+    """Pool name of a client, used to record which bot a user talked to"""
+    for name, member in clients.items():
+        if member is client:
+            return name
+    return "main"
+
 async def initialize_clients():
     """Initialize all bot clients"""
     try:
@@ -43,20 +172,13 @@ async def broadcast_message(client_type, chat_ids, message, **kwargs):
     """Broadcast message using specified client"""
     try:
         client = get_client(client_type)
-        success_count = 0
-        failed_count = 0
+        result = await broadcast_engine.run(
+            chat_ids,
+            lambda chat_id: client.send_message(chat_id, message, **kwargs)
+        )
         
-        for chat_id in chat_ids:
-            try:
-                await client.send_message(chat_id, message, **kwargs)
-                success_count += 1
-                await asyncio.sleep(0.1)  # Rate limiting
-            except Exception as e:
-                logger.error(f"Failed to send message to {chat_id}: {e}")
-                failed_count += 1
-                
-        logger.info(f"Broadcast completed: {success_count} success, {failed_count} failed")
-        return {"success": success_count, "failed": failed_count}
+        logger.info(f"Broadcast completed: {result.success} success, {result.failed} failed")
+        return result.to_dict()
         
     except Exception as e:
         logger.error(f"Error in broadcast: {e}")
@@ -11,6 +11,10 @@ from .human_readable import *
 from .render_template import *
 from .time_format import *
 from .keepalive import *
+from .broadcast import *
+from .outbound import *
+from .file_refs import *
+from .delivery import *
 
 __all__ = [
     'config_parser',
@@ -20,5 +24,9 @@ __all__ = [
     'human_readable',
     'render_template',
     'time_format',
-    'keepalive'
+    'keepalive',
+    'broadcast',
+    'outbound',
+    'file_refs',
+    'delivery'
 ]
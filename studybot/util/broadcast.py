@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, AsyncIterable, Awaitable, Callable, Iterable, Union
+
+try:
+    from config import BROADCAST_RATE, BROADCAST_WORKERS, BROADCAST_MAX_RETRIES
+except ImportError:
+    # Fallback configuration values
+    BROADCAST_RATE = 25
+    BROADCAST_WORKERS = 20
+    BROADCAST_MAX_RETRIES = 3
+
+from .outbound import bulk, flood_wait_seconds
+
+logger = logging.getLogger(__name__)
+
+# Telegram errors grouped into outcome classes; matched by name so pyrogram is optional here
+ERROR_CLASSES = {
+    "UserIsBlocked": "blocked",
+    "InputUserDeactivated": "deactivated",
+    "UserDeactivated": "deactivated",
+    "PeerIdInvalid": "invalid",
+    "UserIdInvalid": "invalid",
+    "ChatIdInvalid": "invalid",
+    "ChannelInvalid": "invalid",
+    "UserIsBot": "invalid",
+    "UserDeactivatedBan": "deactivated",
+    "UserKicked": "kicked",
+    "ChannelPrivate": "kicked",
+    "ChatWriteForbidden": "forbidden",
+    "ChatAdminRequired": "forbidden",
+}
+
+# Outcome classes that mean the recipient can never be reached. "forbidden" is left out on purpose:
+# a muted or admin-only group can become writable again, so it is reported but never pruned
+DEAD_CLASSES = {"blocked", "deactivated", "invalid", "kicked"}
+
+
+def classify_error(error: Exception) -> str:
+    """Outcome class of a send error"""
+    return ERROR_CLASSES.get(type(error).__name__, "other")
+
+
+class TokenBucket:
+    """Global send rate limiter; a FloodWait pauses every sender sharing the bucket"""
+
+    def __init__(self, rate: float = BROADCAST_RATE, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a send is allowed"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Hold all sends for a number of seconds"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class BroadcastResult:
+    """Per-outcome counts of a broadcast"""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.cancelled = False
+
+    @property
+    def success(self) -> int:
+        return self.counts["success"]
+
+    @property
+    def failed(self) -> int:
+        return sum(count for outcome, count in self.counts.items() if outcome not in ("success", "flood_retries"))
+
+    @property
+    def total(self) -> int:
+        return self.success + self.failed
+
+    def breakdown(self) -> str:
+        """One line per failure class, for completion messages"""
+        return "\n".join(
+            f"• {outcome.replace('_', ' ').title()}: {count}"
+            for outcome, count in sorted(self.counts.items()) if outcome != "success" and count
+        )
+
+    def to_dict(self) -> dict:
+        return {"success": self.success, "failed": self.failed, **self.counts}
+
+
+class BroadcastEngine:
+    """Sends to many recipients with a pool of workers behind a shared token bucket"""
+
+    def __init__(self, bucket: TokenBucket = None, workers: int = BROADCAST_WORKERS,
+                 max_retries: int = BROADCAST_MAX_RETRIES):
+        self.bucket = bucket or broadcast_bucket
+        self.workers = workers
+        self.max_retries = max_retries
+
+    async def _deliver(self, send: Callable[[Any], Awaitable], recipient, result: BroadcastResult) -> str:
+        """Send to one recipient, backing off and retrying on FloodWait"""
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                await send(recipient)
+                return "success"
+            except Exception as e:
+                wait = flood_wait_seconds(e)
+                if wait is not None and attempt < self.max_retries:
+                    result.counts["flood_retries"] += 1
+                    logger.warning(f"FloodWait of {wait}s while broadcasting, backing off")
+                    self.bucket.pause(wait + 1)
+                    continue
+                if wait is not None:
+                    return "flood"
+                outcome = classify_error(e)
+                if outcome == "other":
+                    logger.error(f"Failed to send to {recipient}: {e}")
+                return outcome
+        return "flood"
+
+    async def run(self, recipients: Union[Iterable, AsyncIterable], send: Callable[[Any], Awaitable],
+                  on_result: Callable[[Any, str], None] = None,
+                  cancelled: Callable[[], bool] = None) -> BroadcastResult:
+        """Deliver to every recipient and return the outcome counts"""
+        result = BroadcastResult()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 4)
+        done = object()
+
+        async def feed(recipient) -> bool:
+            if cancelled and cancelled():
+                result.cancelled = True
+                return False
+            await queue.put(recipient)
+            return True
+
+        async def produce():
+            try:
+                if hasattr(recipients, "__aiter__"):
+                    async for recipient in recipients:
+                        if not await feed(recipient):
+                            break
+                else:
+                    for recipient in recipients:
+                        if not await feed(recipient):
+                            break
+            except Exception as e:
+                logger.error(f"Error reading broadcast recipients: {e}")
+            finally:
+                for _ in range(self.workers):
+                    await queue.put(done)
+
+        async def work():
+            while True:
+                recipient = await queue.get()
+                if recipient is done:
+                    return
+                outcome = await self._deliver(send, recipient, result)
+                result.counts[outcome] += 1
+                if on_result:
+                    # A failing callback must not stop this worker, or produce() blocks on a full queue
+                    try:
+                        on_result(recipient, outcome)
+                    except Exception as e:
+                        logger.error(f"Error recording broadcast result for {recipient}: {e}")
+
+        # Broadcast sends queue behind interactive replies in the outbound scheduler
+        with bulk():
+            await asyncio.gather(produce(), *(work() for _ in range(self.workers)))
+        logger.info(f"Broadcast finished: {result.to_dict()}")
+        return result
+
+
+# Shared by every broadcast and notice sender so they stay within Telegram's global limit
+broadcast_bucket = TokenBucket()
+broadcast_engine = BroadcastEngine(broadcast_bucket)
@@ -0,0 +1,181 @@
+import asyncio
+import itertools
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# Try to import pyrogram media types with error handling
+try:
+    from pyrogram.types import InputMediaAudio, InputMediaDocument, InputMediaPhoto, InputMediaVideo
+except ImportError:
+    InputMediaAudio = InputMediaDocument = InputMediaPhoto = InputMediaVideo = None
+
+try:
+    from config import DELIVERY_WORKERS, BROADCAST_MAX_RETRIES
+except ImportError:
+    # Fallback configuration values
+    DELIVERY_WORKERS = 8
+    BROADCAST_MAX_RETRIES = 3
+
+from .broadcast import classify_error, DEAD_CLASSES
+from .outbound import flood_wait_seconds
+from .file_refs import file_refs, has_source, is_stale_reference
+
+logger = logging.getLogger(__name__)
+
+# Telegram sends at most this many items in one media group
+MEDIA_GROUP_SIZE = 10
+
+# Delivery queue priorities, lower is served first
+PREMIUM = 0
+REGULAR = 1
+
+# Media types that may share an album: photos mix with videos, documents and audio only with their own kind
+MEDIA_FAMILIES = {"photo": "visual", "video": "visual", "document": "document", "audio": "audio"}
+
+
+def _input_media(file):
+    """InputMedia for a cached file, captioned with its caption or name"""
+    media_class = {
+        "photo": InputMediaPhoto,
+        "video": InputMediaVideo,
+        "audio": InputMediaAudio
+    }.get((file.file_type or "").lower(), InputMediaDocument)
+    return media_class(file_refs.file_id(file), caption=file.caption or file.file_name)
+
+
+def media_groups(files: List) -> List[List]:
+    """Split files into albums of compatible media, at most MEDIA_GROUP_SIZE each, keeping their order"""
+    families: Dict[str, List] = {}
+    for file in files:
+        families.setdefault(MEDIA_FAMILIES.get((file.file_type or "").lower(), "document"), []).append(file)
+    return [
+        members[start:start + MEDIA_GROUP_SIZE]
+        for members in families.values()
+        for start in range(0, len(members), MEDIA_GROUP_SIZE)
+    ]
+
+
+class ContentDelivery:
+    """Queue of file deliveries sent as media groups by cached file_id, premium users first"""
+
+    def __init__(self, workers: int = DELIVERY_WORKERS, max_retries: int = BROADCAST_MAX_RETRIES):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._tasks: List[asyncio.Task] = []
+        # Queued requests per priority, so a position counts only those served before it
+        self.queued = {PREMIUM: 0, REGULAR: 0}
+        self.delivered = {"requests": 0, "groups": 0, "files": 0, "failed": 0, "unreachable": 0}
+
+    def submit(self, client, user_id: int, files: List, header: str = None, premium: bool = False,
+               on_unreachable: Callable[[Exception], Awaitable] = None) -> int:
+        """Queue files for a user and return how many deliveries are ahead of it
+
+        on_unreachable is awaited with the error if the client cannot message the user at all,
+        e.g. because the user never started it or blocked it.
+        """
+        priority = PREMIUM if premium else REGULAR
+        ahead = sum(count for queued_priority, count in self.queued.items() if queued_priority <= priority)
+        self.queue.put_nowait((priority, next(self._seq), client, user_id, files, header, on_unreachable))
+        self.queued[priority] += 1
+        self.start()
+        return ahead
+
+    async def _send(self, send, *args, **kwargs):
+        """Run a send, waiting out FloodWait a limited number of times"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await send(*args, **kwargs)
+            except Exception as e:
+                wait = flood_wait_seconds(e)
+                if wait is None or attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(wait + 1)
+
+    async def _send_files(self, client, user_id: int, group: List):
+        """Send files by file_id, refreshing stale references from their source messages once"""
+        for attempt in range(2):
+            try:
+                if len(group) == 1:
+                    file = group[0]
+                    await self._send(client.send_cached_media, user_id, file_refs.file_id(file), caption=file.caption or file.file_name)
+                else:
+                    await self._send(client.send_media_group, user_id, [_input_media(file) for file in group])
+                return
+            except Exception as e:
+                if attempt or not is_stale_reference(e) or not await file_refs.refresh(client, group):
+                    raise
+
+    async def _copy_or_send(self, client, user_id: int, file):
+        """Copy a file's source message, which does not depend on a stored file reference, else send by file_id"""
+        try:
+            await self._send(client.copy_message, user_id, file.chat_id, file.message_id)
+        except Exception as e:
+            # The user cannot be reached at all, sending by file_id would fail the same way
+            if classify_error(e) in DEAD_CLASSES:
+                raise
+            logger.warning(f"Copying {file.chat_id}/{file.message_id} failed, sending by file_id: {e}")
+            await self._send_files(client, user_id, [file])
+
+    async def _deliver(self, client, user_id: int, files: List, header: Optional[str]):
+        """Send the header and every file of one request; errors that mean the user is unreachable propagate"""
+        if header:
+            await self._send(client.send_message, user_id, header)
+        for group in media_groups(files):
+            try:
+                if len(group) == 1 and has_source(group[0]) and not file_refs.is_fresh(group[0]):
+                    await self._copy_or_send(client, user_id, group[0])
+                else:
+                    await self._send_files(client, user_id, group)
+                self.delivered["groups"] += 1
+                self.delivered["files"] += len(group)
+            except Exception as e:
+                self.delivered["failed"] += len(group)
+                if classify_error(e) in DEAD_CLASSES:
+                    raise
+                logger.error(f"Error delivering {len(group)} files to {user_id}: {e}")
+
+    async def _worker(self):
+        """Deliver queued requests one at a time; sends are paced by the outbound scheduler"""
+        while True:
+            priority, _, client, user_id, files, header, on_unreachable = await self.queue.get()
+            self.queued[priority] -= 1
+            try:
+                await self._deliver(client, user_id, files, header)
+                self.delivered["requests"] += 1
+            except Exception as e:
+                if classify_error(e) in DEAD_CLASSES:
+                    self.delivered["unreachable"] += 1
+                    logger.warning(f"Cannot deliver content to {user_id}: {e}")
+                    if on_unreachable:
+                        try:
+                            await on_unreachable(e)
+                        except Exception as notify_error:
+                            logger.error(f"Error reporting failed delivery to {user_id}: {notify_error}")
+                else:
+                    logger.error(f"Error delivering content to {user_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def stats(self) -> Dict:
+        """Queue depth and delivery counts"""
+        return {"queued": self.queue.qsize(), **self.delivered, "file_refs": file_refs.stats()}
+
+    def start(self):
+        """Start the delivery workers"""
+        self._tasks = [task for task in self._tasks if not task.done()]
+        loop = asyncio.get_event_loop()
+        while len(self._tasks) < self.workers:
+            self._tasks.append(loop.create_task(self._worker()))
+
+    async def stop(self):
+        """Stop the delivery workers"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+# Create global content delivery instance
+content_delivery = ContentDelivery()
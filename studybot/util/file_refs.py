@@ -0,0 +1,89 @@
+import logging
+from collections import OrderedDict
+from typing import Dict, List
+
+try:
+    from config import FILE_REF_CACHE_SIZE
+except ImportError:
+    # Fallback configuration values
+    FILE_REF_CACHE_SIZE = 2000
+
+logger = logging.getLogger(__name__)
+
+# Send errors that mean a stored file_id can no longer be used as is
+STALE_REFERENCE_ERRORS = {"FileReferenceExpired", "FileReferenceInvalid", "FileReferenceEmpty", "MediaEmpty", "FileIdInvalid"}
+
+# Telegram returns at most this many messages per get_messages call
+GET_MESSAGES_LIMIT = 200
+
+
+def is_stale_reference(error: Exception) -> bool:
+    """Check whether a send failed because the file reference went stale"""
+    return type(error).__name__ in STALE_REFERENCE_ERRORS
+
+
+def has_source(file) -> bool:
+    """Check whether a stored file knows the message it came from"""
+    return getattr(file, "chat_id", None) is not None and getattr(file, "message_id", None) is not None
+
+
+class FileRefResolver:
+    """Maps stored file_ids to fresh ones re-read from their source messages, with a small LRU cache"""
+
+    def __init__(self, max_cached: int = FILE_REF_CACHE_SIZE):
+        self.max_cached = max_cached
+        # stored file_id -> file_id taken from a recent read of the source message
+        self._fresh: "OrderedDict[str, str]" = OrderedDict()
+        self.refreshed = 0
+        self.lookups = 0
+
+    def file_id(self, file) -> str:
+        """Best known file_id for a stored file"""
+        fresh = self._fresh.get(file.file_id)
+        if fresh is not None:
+            self._fresh.move_to_end(file.file_id)
+            return fresh
+        return file.file_id
+
+    def is_fresh(self, file) -> bool:
+        """Check whether a recently refreshed file_id is cached for a stored file"""
+        return file.file_id in self._fresh
+
+    def _remember(self, stored: str, fresh: str):
+        self._fresh[stored] = fresh
+        self._fresh.move_to_end(stored)
+        while len(self._fresh) > self.max_cached:
+            self._fresh.popitem(last=False)
+
+    async def refresh(self, client, files: List) -> int:
+        """Re-read the source messages of files in as few get_messages calls as possible"""
+        by_chat: Dict[int, Dict[int, str]] = {}
+        for file in files:
+            if has_source(file):
+                by_chat.setdefault(file.chat_id, {})[file.message_id] = file.file_id
+
+        refreshed = 0
+        for chat_id, wanted in by_chat.items():
+            message_ids = list(wanted)
+            for start in range(0, len(message_ids), GET_MESSAGES_LIMIT):
+                self.lookups += 1
+                try:
+                    messages = await client.get_messages(chat_id, message_ids[start:start + GET_MESSAGES_LIMIT])
+                except Exception as e:
+                    logger.error(f"Error refreshing file references from {chat_id}: {e}")
+                    continue
+                for message in messages if isinstance(messages, list) else [messages]:
+                    media = getattr(message, message.media.value, None) if getattr(message, "media", None) else None
+                    if media is not None and message.id in wanted:
+                        self._remember(wanted[message.id], media.file_id)
+                        refreshed += 1
+        self.refreshed += refreshed
+        return refreshed
+
+    def stats(self) -> Dict:
+        """Cache size and refresh counts"""
+        return {"cached": len(self._fresh), "refreshed": self.refreshed, "lookups": self.lookups}
+
+
+# Create global file reference resolver instance
+file_refs = FileRefResolver()
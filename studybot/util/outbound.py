@@ -0,0 +1,195 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from config import OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_INTERVAL, OUTBOUND_GROUP_PER_MINUTE
+except ImportError:
+    # Fallback configuration values
+    OUTBOUND_GLOBAL_RATE = 30
+    OUTBOUND_CHAT_INTERVAL = 1
+    OUTBOUND_GROUP_PER_MINUTE = 20
+
+logger = logging.getLogger(__name__)
+
+# Request priorities, lower is served first
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+# Priority of requests made from the current task; bulk senders switch it with bulk()
+OUTBOUND_PRIORITY: ContextVar[int] = ContextVar("outbound_priority", default=INTERACTIVE)
+
+# Raw API calls that post to a chat and count against Telegram's message limits
+CHAT_QUERIES = {"SendMessage", "SendMedia", "SendMultiMedia", "ForwardMessages", "EditMessage", "SendInlineBotResult"}
+# Calls with no target chat that only count against the global limit
+GLOBAL_QUERIES = {"SetBotCallbackAnswer", "SetInlineBotResults"}
+
+# Forget per-chat state once this many chats are tracked
+MAX_TRACKED_CHATS = 10000
+
+
+def flood_wait_seconds(error: Exception) -> Optional[float]:
+    """Seconds requested by a FloodWait error, or None for other errors"""
+    if type(error).__name__ in ("FloodWait", "SlowmodeWait"):
+        return float(getattr(error, "value", None) or getattr(error, "x", 1))
+    return None
+
+
+@contextmanager
+def bulk():
+    """Mark requests made inside the block, and tasks started from it, as bulk traffic"""
+    token = OUTBOUND_PRIORITY.set(BULK)
+    try:
+        yield
+    finally:
+        OUTBOUND_PRIORITY.reset(token)
+
+
+def peer_key(query) -> Optional[Tuple[int, bool]]:
+    """(chat id, is group) targeted by a raw API call, or None if it has no target chat"""
+    peer = getattr(query, "peer", None) or getattr(query, "to_peer", None)
+    if peer is None:
+        return None
+    for attribute, group in (("user_id", False), ("chat_id", True), ("channel_id", True)):
+        value = getattr(peer, attribute, None)
+        if value is not None:
+            return (-value if group else value), group
+    return None
+
+
+class OutboundScheduler:
+    """Orders one client's outgoing API calls under per-chat, per-group and global rate limits"""
+
+    def __init__(self, global_rate: float = OUTBOUND_GLOBAL_RATE, chat_interval: float = OUTBOUND_CHAT_INTERVAL,
+                 group_per_minute: int = OUTBOUND_GROUP_PER_MINUTE):
+        self.global_rate = global_rate
+        self.chat_interval = chat_interval
+        self.group_interval = 60 / group_per_minute
+        # A group may burst up to its per-minute allowance, then one message per interval
+        self.group_burst = 60 - self.group_interval
+        # chat key -> theoretical arrival time of its next message (GCRA)
+        self._tat: Dict[int, float] = {}
+        self.tokens = float(global_rate)
+        self.updated = time.monotonic()
+        # Waiters for a global token: (priority, sequence, future)
+        self._heap: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.waiting = {INTERACTIVE: 0, BULK: 0}
+        self.served = {INTERACTIVE: 0, BULK: 0}
+        self.wait_total = {INTERACTIVE: 0.0, BULK: 0.0}
+        self.wait_max = {INTERACTIVE: 0.0, BULK: 0.0}
+
+    def _reserve(self, key: int, interval: float, burst: float) -> float:
+        """Book the next slot for a chat and return how long to wait for it"""
+        now = time.monotonic()
+        tat = max(self._tat.get(key, now), now)
+        start = max(now, tat - burst)
+        self._tat[key] = tat + interval
+        if len(self._tat) > MAX_TRACKED_CHATS:
+            self._tat = {k: v for k, v in self._tat.items() if v > now}
+        return start - now
+
+    def pause_chat(self, key: int, seconds: float):
+        """Hold a chat after Telegram asked us to wait"""
+        self._tat[key] = max(self._tat.get(key, 0), time.monotonic() + seconds)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.global_rate, self.tokens + (now - self.updated) * self.global_rate)
+        self.updated = now
+
+    async def _dispatch(self):
+        """Hand out global tokens to waiters, highest priority first"""
+        while self._heap:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.global_rate)
+                continue
+            _, _, future = heapq.heappop(self._heap)
+            if not future.done():
+                self.tokens -= 1
+                future.set_result(None)
+
+    async def _global(self, priority: int):
+        """Wait for a global token"""
+        self._refill()
+        if not self._heap and self.tokens >= 1:
+            self.tokens -= 1
+            return
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._seq), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_event_loop().create_task(self._dispatch())
+        await future
+
+    async def acquire(self, target: Optional[Tuple[int, bool]], priority: int = None):
+        """Wait until a call to the target chat may be sent"""
+        priority = OUTBOUND_PRIORITY.get() if priority is None else priority
+        started = time.monotonic()
+        self.waiting[priority] += 1
+        try:
+            if target is not None:
+                key, group = target
+                delay = self._reserve(key, *((self.group_interval, self.group_burst) if group else (self.chat_interval, 0)))
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self._global(priority)
+        finally:
+            self.waiting[priority] -= 1
+        waited = time.monotonic() - started
+        self.served[priority] += 1
+        self.wait_total[priority] += waited
+        self.wait_max[priority] = max(self.wait_max[priority], waited)
+
+    def stats(self) -> Dict:
+        """Queue depth and wait times per priority"""
+        return {
+            PRIORITY_NAMES[priority]: {
+                "queued": self.waiting[priority],
+                "served": self.served[priority],
+                "avg_wait": round(self.wait_total[priority] / self.served[priority], 3) if self.served[priority] else 0,
+                "max_wait": round(self.wait_max[priority], 3)
+            }
+            for priority in PRIORITY_NAMES
+        }
+
+
+# Client name -> scheduler; Telegram limits apply per bot, so each client gets its own
+outbound_schedulers: Dict[str, OutboundScheduler] = {}
+
+
+def install(client, name: str) -> OutboundScheduler:
+    """Route a client's outgoing calls through a scheduler by wrapping its invoke method"""
+    if name in outbound_schedulers:
+        return outbound_schedulers[name]
+    scheduler = outbound_schedulers[name] = OutboundScheduler()
+    invoke = client.invoke
+
+    async def scheduled_invoke(query, *args, **kwargs):
+        query_name = type(query).__name__
+        if query_name not in CHAT_QUERIES and query_name not in GLOBAL_QUERIES:
+            return await invoke(query, *args, **kwargs)
+        target = peer_key(query) if query_name in CHAT_QUERIES else None
+        await scheduler.acquire(target)
+        try:
+            return await invoke(query, *args, **kwargs)
+        except Exception as e:
+            wait = flood_wait_seconds(e)
+            if wait is not None and target is not None:
+                scheduler.pause_chat(target[0], wait)
+            raise
+
+    client.invoke = scheduled_invoke
+    return scheduler
+
+
+def outbound_stats() -> Dict:
+    """Scheduler metrics for every client"""
+    return {name: scheduler.stats() for name, scheduler in outbound_schedulers.items()}
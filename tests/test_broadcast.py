@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+import pytest
+
+broadcast = pytest.importorskip("studybot.util.broadcast")
+
+
+class UserIsBlocked(Exception):
+    pass
+
+
+class ChatWriteForbidden(Exception):
+    pass
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    async def run():
+        bucket = broadcast.TokenBucket(rate=50)
+        started = time.monotonic()
+        for _ in range(50):
+            await bucket.acquire()
+        burst = time.monotonic() - started
+        for _ in range(5):
+            await bucket.acquire()
+        return burst, time.monotonic() - started
+
+    burst, total = asyncio.run(run())
+    assert burst < 0.05
+    # Five more tokens at 50 per second take about 0.1s
+    assert 0.08 <= total < 0.5
+
+
+def test_token_bucket_pause_holds_every_sender():
+    async def run():
+        bucket = broadcast.TokenBucket(rate=100)
+        bucket.pause(0.1)
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.09
+
+
+def test_classify_error_by_name():
+    assert broadcast.classify_error(UserIsBlocked()) == "blocked"
+    assert broadcast.classify_error(ChatWriteForbidden()) == "forbidden"
+    assert broadcast.classify_error(ValueError()) == "other"
+
+
+def test_restricted_groups_are_not_pruned():
+    assert "blocked" in broadcast.DEAD_CLASSES
+    assert "forbidden" not in broadcast.DEAD_CLASSES
+
+
+def test_failing_result_callback_does_not_stall_the_broadcast():
+    async def send(recipient):
+        pass
+
+    def on_result(recipient, outcome):
+        raise RuntimeError("db down")
+
+    async def run():
+        engine = broadcast.BroadcastEngine(broadcast.TokenBucket(rate=1000), workers=2)
+        # More recipients than the queue holds, so produce() would block if workers died
+        return await asyncio.wait_for(engine.run(range(50), send, on_result=on_result), 5)
+
+    result = asyncio.run(run())
+    assert result.counts["success"] == 50
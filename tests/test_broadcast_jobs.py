@@ -0,0 +1,31 @@
+import pytest
+
+broadcast_jobs = pytest.importorskip("database.broadcast_jobs")
+_Watermark = broadcast_jobs._Watermark
+
+
+def test_watermark_advances_over_the_completed_prefix_only():
+    progress = _Watermark(None)
+    seqs = [progress.issue(chat_id) for chat_id in (10, 20, 30, 40)]
+
+    progress.complete(seqs[1])
+    progress.complete(seqs[2])
+    assert progress.last_id is None
+
+    progress.complete(seqs[0])
+    assert progress.last_id == 30
+    # Finished sends are forgotten, unfinished ones are kept for resuming
+    assert progress.ids == {seqs[3]: 40}
+
+    progress.complete(seqs[3])
+    assert progress.last_id == 40
+    assert progress.ids == {}
+
+
+def test_watermark_keeps_the_resume_position_until_a_send_finishes():
+    progress = _Watermark(99)
+    seq = progress.issue(120)
+
+    assert progress.last_id == 99
+    progress.complete(seq)
+    assert progress.last_id == 120
@@ -0,0 +1,98 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+study_bot = pytest.importorskip("plugins.study_bot")
+study_db = pytest.importorskip("database.study_db")
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+        self.limited = None
+
+    def skip(self, n):
+        return self
+
+    def limit(self, n):
+        self.limited = n
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs if length is None else self.docs[:length]
+
+
+class FakeStudyFiles:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def find(self, query):
+        self.queries.append(query)
+        return FakeCursor([doc for doc in self.docs if all(doc.get(k) == v for k, v in query.items())])
+
+
+class FakeCallback:
+    def __init__(self, data):
+        self.data = data
+        self.from_user = SimpleNamespace(id=42)
+        self.answers = []
+
+    async def answer(self, text, show_alert=False):
+        self.answers.append(text)
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    calls = []
+
+    def submit(client, user_id, files, **kwargs):
+        calls.append((user_id, files))
+        return 0
+
+    async def not_premium(user_id):
+        return False
+
+    monkeypatch.setattr(study_bot.content_delivery, "submit", submit)
+    monkeypatch.setattr(study_bot, "check_user_premium", not_premium)
+    return calls
+
+
+def test_material_tap_submits_every_file_of_the_chapter(monkeypatch, submitted):
+    docs = [
+        {"is_active": True, "batch_name": "B", "subject": "Physics", "teacher": "T", "chapter_no": "CH01",
+         "content_type": "Mind Maps", "file_name": f"map{i}"}
+        for i in range(12)
+    ]
+    docs.append({**docs[0], "chapter_no": "CH02", "file_name": "other"})
+    files = FakeStudyFiles(docs)
+    monkeypatch.setattr(study_db, "instance", True)
+    monkeypatch.setattr(study_db, "StudyFiles", files)
+
+    callback = FakeCallback("material_B_Physics_T_CH01_mind_maps")
+    asyncio.run(study_bot.final_content_callback(None, callback))
+
+    assert files.queries == [{
+        "is_active": True, "batch_name": "B", "subject": "Physics", "teacher": "T",
+        "chapter_no": "CH01", "content_type": "Mind Maps"
+    }]
+    assert [(user_id, len(sent)) for user_id, sent in submitted] == [(42, 12)]
+    assert callback.answers == ["✅ Content is on its way to your PM!"]
+
+
+def test_lecture_tap_submits_the_numbered_lecture(monkeypatch, submitted):
+    lecture = SimpleNamespace(file_name="Waves L03.mp4")
+    requests = []
+
+    async def get(*key):
+        requests.append(key)
+        return lecture
+
+    monkeypatch.setattr(study_bot.lecture_prefetcher, "get", get)
+    monkeypatch.setattr(study_bot.lecture_prefetcher, "prefetch", lambda *args: None)
+
+    asyncio.run(study_bot.final_content_callback(None, FakeCallback("lecture_B_Physics_T_CH01_L03")))
+
+    assert requests == [("B", "Physics", "T", "CH01", "L03")]
+    assert submitted == [(42, [lecture])]
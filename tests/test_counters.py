@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+counters = pytest.importorskip("database.counters")
+from pymongo.errors import BulkWriteError
+
+
+class FakeCollection:
+    name = "stats"
+    full_name = "db.stats"
+
+    def __init__(self, errors=None, exc=None):
+        self.errors = errors
+        self.exc = exc
+        self.calls = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.calls.append(operations)
+        if self.exc:
+            raise self.exc
+        if self.errors:
+            errors, self.errors = self.errors, None
+            raise BulkWriteError({"writeErrors": errors})
+
+
+def test_only_failed_writes_are_requeued():
+    # Index 0 is the first $inc, index 2 is the insert that already exists
+    coll = FakeCollection(errors=[
+        {"index": 0, "code": 2, "errmsg": "bad"},
+        {"index": 2, "code": counters.DUPLICATE_KEY, "errmsg": "dup"},
+    ])
+    buffer = counters.CounterBuffer(flush_interval=60, flush_events=100)
+    buffer.incr(coll, "a", {"views": 2})
+    buffer.incr(coll, "b", {"views": 5})
+    buffer.insert(coll, {"_id": "x"})
+
+    assert asyncio.run(buffer.flush()) == 1
+    assert buffer.pending == 1
+    assert dict(buffer._deltas["db.stats"]) == {("a", True): {"views": 2}}
+    assert buffer._inserts["db.stats"] == []
+
+    assert asyncio.run(buffer.flush()) == 1
+    assert coll.calls[1][0]._doc == {"$inc": {"views": 2}}
+    assert buffer.pending == 0
+
+
+def test_other_errors_retry_the_whole_batch():
+    coll = FakeCollection(exc=RuntimeError("down"))
+    buffer = counters.CounterBuffer(flush_interval=60, flush_events=100)
+    buffer.incr(coll, "a", {"views": 1}, on_insert={"title": "A"})
+    buffer.insert(coll, {"_id": "x"})
+
+    assert asyncio.run(buffer.flush()) == 0
+    assert buffer.pending == 2
+    assert buffer._on_insert["db.stats"] == {("a", True): {"title": "A"}}
+    assert buffer._inserts["db.stats"] == [{"_id": "x"}]
@@ -0,0 +1,48 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+delivery = pytest.importorskip("studybot.util.delivery")
+
+
+def stored(name, file_type):
+    return SimpleNamespace(file_name=name, file_type=file_type, file_id=name, caption=None)
+
+
+def names(groups):
+    return [[file.file_name for file in group] for group in groups]
+
+
+def test_compatible_media_share_an_album_in_order():
+    files = [stored("p1", "photo"), stored("d1", "document"), stored("v1", "video"), stored("a1", "audio"), stored("d2", "document")]
+
+    assert names(delivery.media_groups(files)) == [["p1", "v1"], ["d1", "d2"], ["a1"]]
+
+
+def test_albums_are_split_at_the_group_size():
+    files = [stored(f"d{i}", "document") for i in range(23)]
+    groups = delivery.media_groups(files)
+
+    assert [len(group) for group in groups] == [10, 10, 3]
+    assert [file.file_name for group in groups for file in group] == [f"d{i}" for i in range(23)]
+
+
+def test_unknown_types_are_sent_as_documents():
+    files = [stored("x", None), stored("y", "Voice"), stored("d", "DOCUMENT")]
+
+    assert names(delivery.media_groups(files)) == [["x", "y", "d"]]
+
+
+def test_queue_position_counts_only_requests_served_first():
+    async def run():
+        queue = delivery.ContentDelivery(workers=0)
+        return [
+            queue.submit(None, 1, []),
+            queue.submit(None, 2, []),
+            queue.submit(None, 3, [], premium=True),
+            queue.submit(None, 4, []),
+            queue.submit(None, 5, [], premium=True),
+        ]
+
+    assert asyncio.run(run()) == [0, 1, 0, 3, 1]
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+from database import leaderboard
+from database.leaderboard import RollingLeaderboard
+
+
+def days_ago(days):
+    return datetime.utcnow() - timedelta(days=days)
+
+
+def test_top_orders_by_study_time():
+    board = RollingLeaderboard((1, 7, 30))
+    board.add(1, 30, days_ago(0))
+    board.add(2, 50, days_ago(0))
+    board.add(1, 40, days_ago(0))
+
+    assert board.top(1) == [
+        {"_id": 1, "total_duration": 70, "total_sessions": 2},
+        {"_id": 2, "total_duration": 50, "total_sessions": 1},
+    ]
+    assert board.rank(1, 1) == 1
+    assert board.rank(1, 2) == 2
+    assert board.rank(1, 3) is None
+
+
+def test_events_only_count_in_windows_they_fall_into():
+    board = RollingLeaderboard((1, 7, 30))
+    board.add(1, 10, days_ago(0))
+    board.add(2, 20, days_ago(3))
+    board.add(3, 30, days_ago(10))
+    # Older than the longest window
+    board.add(4, 40, days_ago(40))
+
+    assert [row["_id"] for row in board.top(1)] == [1]
+    assert [row["_id"] for row in board.top(7)] == [2, 1]
+    assert [row["_id"] for row in board.top(30)] == [3, 2, 1]
+    assert board.size(30) == 3
+
+
+def test_days_leave_the_windows_as_time_advances(monkeypatch):
+    class Clock(datetime):
+        current = datetime(2024, 1, 10, 12)
+
+        @classmethod
+        def utcnow(cls):
+            return cls.current
+
+    monkeypatch.setattr(leaderboard, "datetime", Clock)
+    board = RollingLeaderboard((1, 7))
+    board.add(1, 10, datetime(2024, 1, 5, 9))
+    board.add(2, 20, datetime(2024, 1, 10, 9))
+    assert [row["_id"] for row in board.top(7)] == [2, 1]
+    assert [row["_id"] for row in board.top(1)] == [2]
+
+    Clock.current = datetime(2024, 1, 11, 12)
+    assert [row["_id"] for row in board.top(7)] == [2, 1]
+    assert board.top(1) == []
+
+    Clock.current = datetime(2024, 1, 12, 12)
+    assert [row["_id"] for row in board.top(7)] == [2]
+    assert board.rank(7, 1) is None
+
+
+def test_clear_drops_everything():
+    board = RollingLeaderboard((1, 7))
+    board.add(1, 10, days_ago(0))
+    board.clear()
+
+    assert board.top(7) == []
+    assert board.size(1) == 0
@@ -0,0 +1,45 @@
+import pytest
+
+outbound = pytest.importorskip("studybot.util.outbound")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(outbound.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_private_chats_get_one_message_per_interval(clock):
+    scheduler = outbound.OutboundScheduler(global_rate=30, chat_interval=1, group_per_minute=20)
+
+    assert scheduler._reserve(1, 1, 0) == 0
+    assert scheduler._reserve(1, 1, 0) == 1
+    assert scheduler._reserve(1, 1, 0) == 2
+    # Other chats are independent
+    assert scheduler._reserve(2, 1, 0) == 0
+
+
+def test_groups_burst_up_to_their_per_minute_allowance(clock):
+    scheduler = outbound.OutboundScheduler(global_rate=30, chat_interval=1, group_per_minute=20)
+    interval, burst = scheduler.group_interval, scheduler.group_burst
+
+    waits = [scheduler._reserve(-100, interval, burst) for _ in range(21)]
+    assert waits[:20] == [0] * 20
+    assert waits[20] == pytest.approx(interval)
+
+
+def test_slots_free_up_as_time_passes(clock):
+    scheduler = outbound.OutboundScheduler(global_rate=30, chat_interval=1, group_per_minute=20)
+    scheduler._reserve(1, 1, 0)
+    scheduler._reserve(1, 1, 0)
+
+    clock[0] += 5
+    assert scheduler._reserve(1, 1, 0) == 0
+
+
+def test_pause_chat_holds_the_next_reservation(clock):
+    scheduler = outbound.OutboundScheduler(global_rate=30, chat_interval=1, group_per_minute=20)
+    scheduler.pause_chat(1, 7)
+
+    assert scheduler._reserve(1, 1, 0) == 7
@@ -0,0 +1,32 @@
+import re
+
+import pytest
+
+prefetch = pytest.importorskip("database.prefetch")
+
+
+def test_next_lectures_keep_prefix_and_padding():
+    assert prefetch.next_lectures("L01", 3) == ["L02", "L03", "L04"]
+    assert prefetch.next_lectures("Lecture 9", 2) == ["Lecture 10", "Lecture 11"]
+    assert prefetch.next_lectures("L09", 1) == ["L10"]
+
+
+def test_next_lectures_without_a_number():
+    assert prefetch.next_lectures("Intro", 3) == []
+    assert prefetch.next_lectures("L1", 0) == []
+
+
+def test_lecture_pattern_does_not_match_longer_numbers():
+    pattern = re.compile(prefetch.lecture_pattern("L1"), re.IGNORECASE)
+
+    assert pattern.search("Physics l1 Kinematics.mp4")
+    assert pattern.search("L1.mp4")
+    assert not pattern.search("L10.mp4")
+    assert not pattern.search("L21.mp4")
+
+
+def test_lecture_pattern_escapes_metacharacters():
+    pattern = re.compile(prefetch.lecture_pattern("L1.5"))
+
+    assert pattern.search("L1.5 notes")
+    assert not pattern.search("L1x5 notes")
@@ -0,0 +1,27 @@
+import random
+
+from database.segments import encode_ids, decode_ids
+
+
+def test_ids_round_trip():
+    ids = sorted(random.Random(7).sample(range(1, 10 ** 10), 5000))
+
+    assert decode_ids(encode_ids(ids)) == ids
+
+
+def test_negative_ids_and_gaps_round_trip():
+    ids = [-1001234567890, -42, 0, 1, 5_000_000_000]
+
+    assert decode_ids(encode_ids(ids)) == ids
+
+
+def test_empty_segment():
+    assert decode_ids(encode_ids([])) == []
+    assert decode_ids(b"") == []
+
+
+def test_dense_ids_compress_well():
+    ids = list(range(1_000_000, 1_100_000))
+
+    # Consecutive ids are one byte each before zlib, which then collapses the run
+    assert len(encode_ids(ids)) < 1000
@@ -0,0 +1,56 @@
+import pytest
+
+sessions = pytest.importorskip("database.sessions")
+TimerWheel = sessions.TimerWheel
+
+
+def advance(wheel, ticks):
+    fired = []
+    for _ in range(ticks):
+        fired.extend(wheel.advance())
+    return fired
+
+
+def test_timer_fires_after_its_delay():
+    wheel = TimerWheel(slots=8, tick=1.0)
+    wheel.schedule("a", 3)
+
+    assert advance(wheel, 2) == []
+    assert wheel.advance() == ["a"]
+    assert len(wheel) == 0
+
+
+def test_delays_round_up_to_whole_ticks():
+    wheel = TimerWheel(slots=8, tick=2.0)
+    wheel.schedule("a", 3)
+
+    assert wheel.advance() == []
+    assert wheel.advance() == ["a"]
+
+
+def test_delays_longer_than_a_rotation_wait_extra_rounds():
+    wheel = TimerWheel(slots=4, tick=1.0)
+    wheel.schedule("a", 10)
+
+    assert advance(wheel, 9) == []
+    assert wheel.advance() == ["a"]
+
+
+def test_rescheduling_replaces_the_earlier_timer():
+    wheel = TimerWheel(slots=8, tick=1.0)
+    wheel.schedule("a", 2)
+    wheel.schedule("a", 5)
+
+    assert advance(wheel, 4) == []
+    assert wheel.advance() == ["a"]
+    assert len(wheel) == 0
+
+
+def test_cancel_removes_a_timer():
+    wheel = TimerWheel(slots=8, tick=1.0)
+    wheel.schedule("a", 2)
+    wheel.schedule("b", 2)
+    wheel.cancel("a")
+    wheel.cancel("missing")
+
+    assert advance(wheel, 2) == ["b"]
@@ -0,0 +1,51 @@
+import pytest
+
+from database.sketches import HyperLogLog
+
+
+def test_hyperloglog_estimates_within_a_few_percent():
+    sketch = HyperLogLog(14)
+    for user_id in range(20000):
+        sketch.add(user_id)
+    # Duplicates do not change the estimate
+    for user_id in range(5000):
+        sketch.add(user_id)
+
+    assert abs(sketch.count() - 20000) / 20000 < 0.03
+
+
+def test_hyperloglog_small_cardinalities_are_exact_enough():
+    sketch = HyperLogLog(14)
+    for user_id in range(50):
+        sketch.add(user_id)
+
+    assert sketch.count() == 50
+
+
+def test_hyperloglog_merge_is_the_union():
+    first, second, union = HyperLogLog(12), HyperLogLog(12), HyperLogLog(12)
+    for user_id in range(3000):
+        first.add(user_id)
+        union.add(user_id)
+    for user_id in range(2000, 6000):
+        second.add(user_id)
+        union.add(user_id)
+
+    assert first.merge(second).registers == union.registers
+
+
+def test_hyperloglog_round_trips_through_bytes():
+    sketch = HyperLogLog(10)
+    for user_id in range(1000):
+        sketch.add(user_id)
+
+    loaded = HyperLogLog.from_bytes(sketch.to_bytes(), 10)
+    assert loaded.registers == sketch.registers
+    assert loaded.count() == sketch.count()
+
+
+def test_hyperloglog_rejects_mismatched_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(HyperLogLog(10))
+    with pytest.raises(ValueError):
+        HyperLogLog(12, bytes(16))
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+topdb = pytest.importorskip("database.topdb")
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = list(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.docs:
+            raise StopAsyncIteration
+        return self.docs.pop(0)
+
+
+class LegacyMessages:
+    """Old top_messages documents already grouped by the $unwind/$group pipeline"""
+
+    def __init__(self, groups):
+        self.groups = groups
+
+    def aggregate(self, pipeline, **kwargs):
+        return FakeCursor(self.groups)
+
+
+class MessageCounts:
+    def __init__(self, docs=None):
+        self.docs = dict(docs or {})
+
+    async def find_one(self, query):
+        return next(iter(self.docs.values()), None)
+
+    async def bulk_write(self, operations, ordered=True):
+        for op in operations:
+            doc = self.docs.setdefault(op._filter["_id"], {"count": 0, **op._doc["$setOnInsert"]})
+            doc["count"] += op._doc["$inc"]["count"]
+
+
+def make_db(groups, counts=None):
+    db = object.__new__(topdb.Database)
+    db.col = LegacyMessages(groups)
+    db.message_counts = MessageCounts(counts)
+    return db
+
+
+def test_backfill_merges_legacy_counts_by_hash():
+    db = make_db([{"_id": "hello", "count": 3}, {"_id": "hello ", "count": 2}, {"_id": "  ", "count": 9}])
+
+    assert asyncio.run(db.load_top_messages())
+    assert db.message_counts.docs == {db._message_hash("hello"): {"text": "hello", "count": 5}}
+
+
+def test_backfill_skipped_once_counts_exist():
+    existing = {"x": {"text": "x", "count": 1}}
+    db = make_db([{"_id": "hello", "count": 3}], existing)
+
+    assert asyncio.run(db.load_top_messages())
+    assert db.message_counts.docs == existing
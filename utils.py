@@ -3,6 +3,7 @@ import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Union
 import logging
+from pyrogram import filters
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +17,7 @@ class temp:
     
     # Study bot specific temp data
     BANNED_CHATS = set()  # Set of banned chat IDs
+    BANNED_USERS = set()  # Set of banned user IDs
     
     # File upload tracking
     FILE_UPLOADS = {}
@@ -42,6 +44,31 @@ class temp:
     BATCH_CACHE = {}    # Cache batch information
     CONTENT_CACHE = {}  # Cache content data
 
+async def _is_blocked(_, __, update):
+    """Match updates from banned users or disabled chats"""
+    user = getattr(update, 'from_user', None)
+    if user and user.id in temp.BANNED_USERS:
+        return True
+    
+    message = getattr(update, 'message', None) or update
+    chat = getattr(message, 'chat', None)
+    # Let join events through so the bot can announce and leave disabled chats
+    if chat and chat.id in temp.BANNED_CHATS and not getattr(message, 'new_chat_members', None):
+        return True
+    return False
+
+# Filter for updates that should be dropped before any handler runs
+banned_filter = filters.create(_is_blocked)
+
+def progress_key(batch_name: str, subject: str, chapter: str) -> str:
+    """Build the study_progress key for a chapter, safe to use in a MongoDB field path"""
+    return f"{batch_name}:{subject}:{chapter}".replace('.', '_')
+
+def split_progress_key(key: str) -> List[str]:
+    """Split a study_progress key into batch, subject and chapter"""
+    separator = ':' if ':' in key else '.'
+    return key.split(separator, 2)
+
 def get_file_size(size_bytes: int) -> str:
     """Convert bytes to human readable format"""
     if size_bytes == 0:
@@ -117,48 +144,68 @@ def parse_filename_pattern(filename: str) -> Dict[str, str]:
     
     return pattern
 
+# Achievements as (metric, threshold, title); the list index is the bit in achievement masks
+ACHIEVEMENTS = [
+    ('total_time_spent', 60, "⏰ First Hour - Studied for 1 hour"),
+    ('total_time_spent', 300, "📚 Study Warrior - Studied for 5 hours"),
+    ('total_time_spent', 600, "🎓 Study Master - Studied for 10 hours"),
+    ('total_downloads', 10, "📥 Downloader - Downloaded 10 files"),
+    ('total_downloads', 50, "📚 File Collector - Downloaded 50 files"),
+    ('total_downloads', 100, "🏆 Content Master - Downloaded 100 files"),
+    ('subjects', 3, "🧪 Subject Explorer - Studied 3 subjects"),
+    ('subjects', 5, "📖 Knowledge Seeker - Studied 5 subjects"),
+]
+
+# Level names and the minimum score for each
+STUDY_LEVELS = [
+    (0, "🆕 Beginner"),
+    (100, "📚 Learner"),
+    (500, "🎯 Student"),
+    (1000, "📖 Scholar"),
+    (2000, "🎓 Graduate"),
+    (5000, "🏆 Master"),
+]
+
+# Points per minute studied, per download and per subject, plus the bonus for recent activity
+SCORE_WEIGHTS = {'total_time_spent': 1, 'total_downloads': 10, 'subjects': 50}
+ACTIVE_BONUS = 100
+
+def score_from_metrics(metrics: Dict, active: bool) -> int:
+    """Study score from time spent, downloads and subject count"""
+    score = sum(metrics.get(name, 0) * weight for name, weight in SCORE_WEIGHTS.items())
+    return score + (ACTIVE_BONUS if active else 0)
+
+def achievement_mask(metrics: Dict) -> int:
+    """Bit mask of the achievements unlocked by a set of metrics"""
+    mask = 0
+    for bit, (metric, threshold, _) in enumerate(ACHIEVEMENTS):
+        if metrics.get(metric, 0) >= threshold:
+            mask |= 1 << bit
+    return mask
+
+def achievement_titles(mask: int) -> List[str]:
+    """Titles of the achievements set in a bit mask"""
+    return [title for bit, (_, _, title) in enumerate(ACHIEVEMENTS) if mask & (1 << bit)]
+
 def generate_achievement(user_stats: Dict) -> Optional[str]:
     """Generate achievement based on user statistics"""
-    achievements = []
-    
-    # Study time achievements
-    if user_stats.get('total_time_spent', 0) >= 60:
-        achievements.append("⏰ First Hour - Studied for 1 hour")
-    if user_stats.get('total_time_spent', 0) >= 300:
-        achievements.append("📚 Study Warrior - Studied for 5 hours")
-    if user_stats.get('total_time_spent', 0) >= 600:
-        achievements.append("🎓 Study Master - Studied for 10 hours")
-    
-    # Download achievements
-    if user_stats.get('total_downloads', 0) >= 10:
-        achievements.append("📥 Downloader - Downloaded 10 files")
-    if user_stats.get('total_downloads', 0) >= 50:
-        achievements.append("📚 File Collector - Downloaded 50 files")
-    if user_stats.get('total_downloads', 0) >= 100:
-        achievements.append("🏆 Content Master - Downloaded 100 files")
-    
-    # Subject completion achievements
-    subjects_completed = len(user_stats.get('study_progress', {}))
-    if subjects_completed >= 3:
-        achievements.append("🧪 Subject Explorer - Studied 3 subjects")
-    if subjects_completed >= 5:
-        achievements.append("📖 Knowledge Seeker - Studied 5 subjects")
+    metrics = {
+        'total_time_spent': user_stats.get('total_time_spent', 0),
+        'total_downloads': user_stats.get('total_downloads', 0),
+        'subjects': len(user_stats.get('study_progress', {}))
+    }
+    achievements = [title for metric, threshold, title in ACHIEVEMENTS if metrics[metric] >= threshold]
     
     return achievements[-1] if achievements else None
 
 def calculate_study_score(user_stats: Dict) -> int:
     """Calculate study score based on user activity"""
-    score = 0
-    
-    # Time spent (1 point per minute)
-    score += user_stats.get('total_time_spent', 0)
-    
-    # Downloads (10 points per download)
-    score += user_stats.get('total_downloads', 0) * 10
-    
-    # Subject variety (50 points per subject)
-    subjects = len(user_stats.get('study_progress', {}))
-    score += subjects * 50
+    metrics = {
+        'total_time_spent': user_stats.get('total_time_spent', 0),
+        'total_downloads': user_stats.get('total_downloads', 0),
+        'subjects': len(user_stats.get('study_progress', {}))
+    }
+    active = False
     
     # Recent activity bonus (if active in last 7 days)
     if user_stats.get('last_active'):
@@ -170,24 +217,17 @@ def calculate_study_score(user_stats: Dict) -> int:
                 last_active = datetime.now()
         
         if datetime.now() - last_active < timedelta(days=7):
-            score += 100  # Active user bonus
+            active = True  # Active user bonus
     
-    return score
+    return score_from_metrics(metrics, active)
 
 def get_study_level(score: int) -> str:
     """Get study level based on score"""
-    if score < 100:
-        return "🆕 Beginner"
-    elif score < 500:
-        return "📚 Learner"
-    elif score < 1000:
-        return "🎯 Student"
-    elif score < 2000:
-        return "📖 Scholar"
-    elif score < 5000:
-        return "🎓 Graduate"
-    else:
-        return "🏆 Master"
+    level = STUDY_LEVELS[0][1]
+    for minimum, name in STUDY_LEVELS:
+        if score >= minimum:
+            level = name
+    return level
 
 def create_study_summary(user_stats: Dict) -> str:
     """Create a comprehensive study summary"""
@@ -205,6 +245,8 @@ def create_study_summary(user_stats: Dict) -> str:
     
     # Add achievements
     achievements = user_stats.get('achievements', [])
+    if isinstance(achievements, int):
+        achievements = achievement_titles(achievements)
     if achievements:
         summary += f"\n🏅 **Recent Achievements:**\n"
         for achievement in achievements[-3:]:  # Show last 3
@@ -215,7 +257,7 @@ def create_study_summary(user_stats: Dict) -> str:
     if study_progress:
         summary += f"\n📈 **Subject Progress:**\n"
         for subject_key, progress in study_progress.items():
-            batch_name, subject, chapter = subject_key.split('.')
+            batch_name, subject, chapter = split_progress_key(subject_key)
             total_files = sum(progress.values())
             summary += f"📚 {batch_name} - {subject}: {total_files} files\n"
     